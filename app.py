@@ -1,20 +1,72 @@
 """Streamlit Video Downloader - YouTube, Shorts, Facebook, Reels."""
 
 import os
-import tempfile
+import time
+import uuid
 from pathlib import Path
 
-import requests
 import streamlit as st
 
+from services.config import get_work_dir
 from services.downloader import (
+    canonical_video_key,
     detect_platform,
-    download_with_ytdlp,
-    download_audio_mp3,
+    download_media,
     get_video_info,
     normalize_video_url,
-    try_facebook_api,
+    resume_interrupted_downloads,
 )
+from services.api import public_file_url, start_background_server
+from services.audio import AUDIO_MODE_FAST, AUDIO_MODE_MP3
+from services.bandwidth import prefetch_session
+from services.batch import DEFAULT_BATCH_CONCURRENCY, BatchRun, parse_batch_input
+from services.cancel import CancelToken
+from services.clips import format_timestamp, make_clip, url_start_time
+from services.jobs import PRIORITY_BACKGROUND, get_job_queue
+from services.prefetch import get_prefetcher, prefetch_enabled, prefetch_key
+from services.progress import format_eta, format_speed
+from services.thumbnails import get_thumbnail_cache
+
+# Seconds between reruns while a background download job is polled
+JOB_POLL_INTERVAL = 0.5
+# A job not polled for this long (tab closed) is cancelled
+JOB_LEASE = 30.0
+
+
+def cancel_active_job():
+    """Cancel this session's running download, if any; its result would never be used."""
+    job_id = st.session_state.state.get("job_id")
+    if job_id:
+        get_job_queue().cancel(job_id)
+        st.session_state.state["job_id"] = None
+
+
+def release_prefetch():
+    """Drop this session's speculative download; it is cancelled unless another session wants it."""
+    key = st.session_state.state.get("prefetch_key")
+    if key:
+        get_prefetcher().release(key, st.session_state.session_id)
+        st.session_state.state["prefetch_key"] = None
+
+
+def render_footer():
+    st.markdown("---")
+    st.caption("🛡️ Supports: YouTube, YouTube Shorts, Facebook, Instagram Reels, and more! Download as Video or Audio")
+
+
+@st.cache_resource(show_spinner=False)
+def start_services() -> bool:
+    """
+    Start process-wide services once; Streamlit reruns this script on every interaction.
+
+    Finished files are served by a streaming endpoint instead of
+    st.download_button, and downloads cut off by the last restart are queued
+    again. yt-dlp itself is only imported when a video is first extracted.
+    """
+    started = start_background_server()
+    resume_interrupted_downloads()
+    return started
+
 
 # Page config
 st.set_page_config(
@@ -23,6 +75,8 @@ st.set_page_config(
     layout="wide",
 )
 
+start_services()
+
 # Custom styles
 st.markdown(
     """
@@ -69,7 +123,7 @@ st.markdown(
     }
     
     /* Download button styling */
-    .stDownloadButton>button {
+    .stDownloadButton>button, .stLinkButton>a {
         font-size: 1.1rem;
         padding: 0.85rem 2rem;
         min-height: 52px;
@@ -81,7 +135,7 @@ st.markdown(
         box-shadow: 0 4px 14px rgba(255, 107, 53, 0.4);
         transition: all 0.2s;
     }
-    .stDownloadButton>button:hover {
+    .stDownloadButton>button:hover, .stLinkButton>a:hover {
         box-shadow: 0 6px 20px rgba(255, 107, 53, 0.6);
         transform: translateY(-2px);
     }
@@ -94,7 +148,7 @@ st.markdown(
             font-size: 0.95rem;
             margin-bottom: 1rem;
         }
-        .stDownloadButton>button {
+        .stDownloadButton>button, .stLinkButton>a[data-testid="stBaseLinkButton-primary"] {
             position: fixed !important;
             bottom: 16px !important;
             left: 16px !important;
@@ -125,9 +179,9 @@ with st.sidebar:
     )
     format_choice = st.selectbox(
         "📁 Format",
-        options=["Video (MP4)", "Audio (MP3)"],
+        options=["Video (MP4)", "Audio (MP3)", "Audio (original, fast)"],
         index=0,
-        help="Choose download format: video file or audio only",
+        help="Choose download format: video file, MP3 audio, or the original audio track (m4a/opus) without conversion",
     )
     quality = st.selectbox(
         "📐 Quality",
@@ -135,12 +189,21 @@ with st.sidebar:
         index=0,
         help="Higher quality = larger file size",
     )
+    mode = st.radio(
+        "🗂️ Mode",
+        options=["Single video", "Batch / Playlist"],
+        index=0,
+        help="Batch mode downloads a list of links or a whole playlist",
+    )
     st.markdown("---")
     st.caption("💡 **How it works:**")
     st.caption("1. Paste your video URL")
     st.caption("2. Preview loads automatically")
     st.caption("3. Download when ready")
 
+is_audio = format_choice.startswith("Audio")
+audio_mode = AUDIO_MODE_FAST if format_choice == "Audio (original, fast)" else AUDIO_MODE_MP3
+
 # Initialize session state with simpler structure
 if "state" not in st.session_state:
     st.session_state.state = {
@@ -149,8 +212,13 @@ if "state" not in st.session_state:
         "download_status": "idle",  # idle, fetching_info, downloading, ready, error
         "file_path": None,
         "error": None,
+        "job_id": None,
+        "prefetch_key": None,
     }
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 if "reset_flag" not in st.session_state:
     st.session_state.reset_flag = False
 
@@ -159,12 +227,16 @@ if "url_input" not in st.session_state:
 
 # Handle reset
 if st.session_state.reset_flag:
+    cancel_active_job()
+    release_prefetch()
     st.session_state.state = {
         "current_url": None,
         "video_info": None,
         "download_status": "idle",
         "file_path": None,
         "error": None,
+        "job_id": None,
+        "prefetch_key": None,
     }
     st.session_state.url_input = ""
     st.session_state.reset_flag = False
@@ -175,6 +247,85 @@ if st.session_state.reset_flag:
         </script>
     """, unsafe_allow_html=True)
 
+# Batch mode has its own page body
+if mode == "Batch / Playlist":
+    release_prefetch()
+    batch_text = st.text_area(
+        "🔗 Video URLs",
+        placeholder="One link per line: videos or playlists",
+        height=180,
+    )
+    batch_concurrency = st.slider(
+        "⚡ Parallel downloads",
+        min_value=1,
+        max_value=8,
+        value=DEFAULT_BATCH_CONCURRENCY,
+    )
+    batch = st.session_state.get("batch")
+    batch_running = batch is not None and not batch.done
+
+    if st.button("⬇️ Download All", type="primary", disabled=batch_running):
+        batch_urls = parse_batch_input(batch_text)
+        if batch_urls:
+            st.session_state.batch = BatchRun(
+                batch_urls,
+                quality=quality,
+                audio_only=is_audio,
+                audio_mode=audio_mode,
+                output_dir=str(get_work_dir()),
+                facebook_api_url=facebook_api_url or None,
+                concurrency=batch_concurrency,
+                session=st.session_state.session_id,
+            ).start()
+            st.rerun()
+        else:
+            st.warning("⚠️ No valid links found.")
+
+    if batch is not None:
+        rows = [
+            {
+                "Title": item["title"] or item["url"],
+                "Status": item["status"],
+                "Progress": int(item["progress"] * 100),
+                "Error": item["error"] or "",
+            }
+            for item in list(batch.items)
+        ]
+        counts = batch.summary()
+        st.caption(
+            f"{counts.get('done', 0)} done • {counts.get('error', 0)} failed • "
+            f"{len(rows)} total"
+        )
+        st.dataframe(
+            rows,
+            column_config={
+                "Progress": st.column_config.ProgressColumn(
+                    min_value=0, max_value=100, format="%d%%"
+                ),
+            },
+            hide_index=True,
+            use_container_width=True,
+        )
+        for batch_error in batch.errors:
+            st.error(f"❌ {batch_error}")
+
+        if batch_running:
+            time.sleep(JOB_POLL_INTERVAL)
+            st.rerun()
+
+        with st.expander("💾 Save files", expanded=True):
+            for item in batch.items:
+                item_path = item["file_path"]
+                if item["status"] != "done" or not item_path or not os.path.exists(item_path):
+                    continue
+                st.link_button(
+                    f"💾 {item['title'] or Path(item_path).name}",
+                    public_file_url(item_path),
+                )
+
+    render_footer()
+    st.stop()
+
 # Main URL input
 raw_url = st.text_input(
     "🔗 Video URL",
@@ -190,11 +341,14 @@ if raw_url and raw_url != url:
 # Detect if URL changed
 url_changed = url != st.session_state.state["current_url"]
 if url_changed:
+    cancel_active_job()
+    release_prefetch()
     st.session_state.state["current_url"] = url
     st.session_state.state["video_info"] = None
     st.session_state.state["download_status"] = "idle"
     st.session_state.state["file_path"] = None
     st.session_state.state["error"] = None
+    st.session_state.state["job_id"] = None
 
 # Auto-detect platform and show badge
 if url:
@@ -236,7 +390,11 @@ with main_container:
         col1, col2 = st.columns([1, 2])
         with col1:
             if info.get("thumbnail"):
-                st.image(info["thumbnail"], use_container_width=True)
+                # A downsized local copy; the remote image if it cannot be fetched
+                thumbnail = get_thumbnail_cache().get(
+                    canonical_video_key(url), info["thumbnail"]
+                )
+                st.image(thumbnail or info["thumbnail"], use_container_width=True)
         
         with col2:
             st.markdown(f'<div class="preview-title">{info.get("title", "Unknown title")}</div>', unsafe_allow_html=True)
@@ -256,133 +414,201 @@ with main_container:
         
         st.markdown("")  # spacing
 
+        # Clip mode: only the chosen time range is downloaded.
+        # A link with t= opens it preset to start there.
+        url_start = url_start_time(url)
+        clip_locked = st.session_state.state["download_status"] != "idle"
+        clip_start = clip_end = None
+        # Keyed per link: values survive reruns and reset for a new link
+        clip_key = f"clip:{url}"
+        with st.expander("✂️ Clip", expanded=url_start is not None):
+            clip_enabled = st.checkbox(
+                "Download only part of the video",
+                value=url_start is not None,
+                disabled=clip_locked,
+                key=f"{clip_key}:enabled",
+            )
+            clip_col1, clip_col2 = st.columns(2)
+            with clip_col1:
+                start_text = st.text_input(
+                    "Start",
+                    value=format_timestamp(url_start or 0),
+                    placeholder="1:30",
+                    disabled=clip_locked or not clip_enabled,
+                    key=f"{clip_key}:start",
+                )
+            with clip_col2:
+                end_text = st.text_input(
+                    "End",
+                    placeholder="2:00 (empty = until the end)",
+                    disabled=clip_locked or not clip_enabled,
+                    key=f"{clip_key}:end",
+                )
+            exact_cut = st.checkbox(
+                "Exact cut",
+                help="Re-encode the clip so it starts and ends exactly at these times. "
+                "Otherwise it is cut at the nearest keyframes without re-encoding, which is faster.",
+                disabled=clip_locked or not clip_enabled,
+                key=f"{clip_key}:exact",
+            )
+        clip_error = None
+        if clip_enabled:
+            try:
+                clip = make_clip(start_text, end_text, exact_cut)
+            except ValueError as e:
+                clip_error = str(e)
+                st.warning(f"⚠️ {clip_error}. Use times like 90, 1:30 or 1m30s.")
+            else:
+                if clip:
+                    clip_start, clip_end, exact_cut = clip.start, clip.end, clip.exact
+
         # PHASE 3: Download logic
+        download_kwargs = {
+            "url": url,
+            "quality": quality,
+            "audio_only": is_audio,
+            "audio_mode": audio_mode,
+            "output_dir": str(get_work_dir()),
+            "facebook_api_url": facebook_api_url or None,
+            "clip_start": clip_start,
+            "clip_end": clip_end,
+            "exact_cut": bool(clip_start is not None and exact_cut),
+        }
         if st.session_state.state["download_status"] == "idle":
+            if prefetch_enabled() and not clip_error:
+                # Start the likely download now; clicking takes it over.
+                # Changing the URL or settings gives it up.
+                key = prefetch_key(download_kwargs)
+                if st.session_state.state.get("prefetch_key") != key:
+                    release_prefetch()
+                    prefetch_job = get_prefetcher().want(
+                        key,
+                        st.session_state.session_id,
+                        lambda: get_job_queue().submit(
+                            download_media,
+                            platform=platform,
+                            priority=PRIORITY_BACKGROUND,
+                            label=url,
+                            info_handle=info.get("info_handle"),
+                            cancel_token=CancelToken(),
+                            session=prefetch_session(st.session_state.session_id),
+                            **download_kwargs,
+                        ),
+                    )
+                    if prefetch_job is not None:
+                        st.session_state.state["prefetch_key"] = key
+                else:
+                    # Still on the page: keep the prefetch's lease alive
+                    get_prefetcher().touch(key)
+
             # Show download button
-            is_audio = format_choice == "Audio (MP3)"
             button_label = "🎵 Download Audio" if is_audio else "⬇️ Download Video"
             col_center = st.columns([1, 2, 1])[1]
             with col_center:
-                if st.button(button_label, type="primary", use_container_width=True, key="start_download"):
+                if st.button(
+                    button_label,
+                    type="primary",
+                    use_container_width=True,
+                    key="start_download",
+                    disabled=clip_error is not None,
+                ):
+                    key = st.session_state.state.get("prefetch_key")
+                    if key:
+                        st.session_state.state["prefetch_key"] = None
+                        prefetch_job = get_prefetcher().claim(key, lease=JOB_LEASE)
+                        if prefetch_job is not None:
+                            st.session_state.state["job_id"] = prefetch_job.id
                     st.session_state.state["download_status"] = "downloading"
                     st.rerun()
         
         elif st.session_state.state["download_status"] == "downloading":
-            # Show progress
+            # The download runs on the shared worker pool; this rerun only polls it
+            job_queue = get_job_queue()
+            job_id = st.session_state.state.get("job_id")
+            job = job_queue.get(job_id) if job_id else None
+            if job is None:
+                job = job_queue.submit(
+                    download_media,
+                    platform=platform,
+                    label=url,
+                    info_handle=st.session_state.state["video_info"].get("info_handle"),
+                    cancel_token=CancelToken(),
+                    session=st.session_state.session_id,
+                    lease=JOB_LEASE,
+                    **download_kwargs,
+                )
+                st.session_state.state["job_id"] = job.id
+            job.touch()
+
+            if job.done:
+                st.session_state.state["job_id"] = None
+                if job.error:
+                    st.session_state.state["error"] = job.error
+                    st.session_state.state["download_status"] = "error"
+                elif job.result and os.path.exists(job.result):
+                    st.session_state.state["file_path"] = str(job.result)
+                    st.session_state.state["download_status"] = "ready"
+                else:
+                    st.session_state.state["error"] = "Downloaded file not found"
+                    st.session_state.state["download_status"] = "error"
+                st.rerun()
+
             progress_bar = st.progress(0)
             status_text = st.empty()
-            
-            output_dir = Path(tempfile.gettempdir()) / "video_downloader"
-            output_dir.mkdir(exist_ok=True)
-            
-            try:
-                # Try Facebook API first if applicable
-                if platform == "facebook" and facebook_api_url:
-                    download_url = try_facebook_api(url, quality, facebook_api_url)
-                    if download_url:
-                        tmpf = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4", dir=str(output_dir))
-                        try:
-                            with requests.get(download_url, stream=True, timeout=60) as r:
-                                r.raise_for_status()
-                                total = int(r.headers.get("Content-Length", 0) or 0)
-                                written = 0
-                                for chunk in r.iter_content(chunk_size=8192):
-                                    if chunk:
-                                        tmpf.write(chunk)
-                                        written += len(chunk)
-                                        if total:
-                                            pct = min(100, int(100 * written / total))
-                                            progress_bar.progress(pct / 100)
-                                            status_text.text(f"⬇️ Downloading... {pct}%")
-                            tmpf.close()
-                            st.session_state.state["file_path"] = tmpf.name
-                            st.session_state.state["download_status"] = "ready"
-                            st.rerun()
-                        except Exception as e:
-                            try:
-                                tmpf.close()
-                                os.remove(tmpf.name)
-                            except:
-                                pass
-                            raise e
-
-                # Fallback to yt-dlp
-                if st.session_state.state["download_status"] == "downloading":
-                    def progress_hook(d):
-                        if d.get("status") == "downloading":
-                            try:
-                                total = d.get("total_bytes") or d.get("total_bytes_estimate")
-                                downloaded = d.get("downloaded_bytes", 0)
-                                if total and total > 0:
-                                    pct = min(100, int(100 * downloaded / total))
-                                    progress_bar.progress(pct / 100)
-                                    status_text.text(f"⬇️ Downloading... {pct}%")
-                            except:
-                                status_text.text("⬇️ Downloading...")
-                        elif d.get("status") == "finished":
-                            progress_bar.progress(100)
-                            status_text.text("✨ Processing...")
-
-                    is_audio = format_choice == "Audio (MP3)"
-                    
-                    if is_audio:
-                        # Download audio as MP3
-                        file_path, error = download_audio_mp3(
-                            url,
-                            output_dir=str(output_dir),
-                            progress_hook=progress_hook,
-                        )
-                    else:
-                        # Download video
-                        file_path, error = download_with_ytdlp(
-                            url,
-                            quality=quality,
-                            output_dir=str(output_dir),
-                            progress_hook=progress_hook,
-                        )
-
-                    if error:
-                        st.session_state.state["error"] = error
-                        st.session_state.state["download_status"] = "error"
-                    elif file_path and os.path.exists(file_path):
-                        st.session_state.state["file_path"] = str(file_path)
-                        st.session_state.state["download_status"] = "ready"
-                    
-                    st.rerun()
-                    
-            except Exception as e:
-                st.session_state.state["error"] = str(e)
-                st.session_state.state["download_status"] = "error"
+            event = job.progress or {}
+            position = job_queue.position(job.id)
+            if position:
+                status_text.text(f"⏳ Waiting in queue... (position {position})")
+            elif event.get("status") == "downloading":
+                details = ["⬇️ Downloading..."]
+                if event.get("fraction") is not None:
+                    pct = int(100 * event["fraction"])
+                    progress_bar.progress(pct / 100)
+                    details.append(f"{pct}%")
+                if event.get("speed"):
+                    details.append(format_speed(event["speed"]))
+                if event.get("eta") is not None:
+                    details.append(f"ETA {format_eta(event['eta'])}")
+                status_text.text(" · ".join(details))
+            elif event.get("status") == "finished":
+                progress_bar.progress(100)
+                status_text.text("✨ Processing...")
+            else:
+                status_text.text("⬇️ Starting download...")
+            if st.button("✖️ Cancel", key="cancel_download"):
+                cancel_active_job()
+                st.session_state.state["download_status"] = "idle"
                 st.rerun()
+            time.sleep(JOB_POLL_INTERVAL)
+            st.rerun()
         
         elif st.session_state.state["download_status"] == "ready":
             # Show save button
             file_path = st.session_state.state["file_path"]
             if file_path and os.path.exists(file_path):
-                is_audio = format_choice == "Audio (MP3)"
                 success_msg = "✅ Audio ready to save!" if is_audio else "✅ Video ready to save!"
                 st.success(success_msg)
                 
                 col_center = st.columns([1, 2, 1])[1]
                 with col_center:
-                    with open(file_path, "rb") as f:
-                        if is_audio:
-                            file_ext = ".mp3"
-                            mime_type = "audio/mpeg"
-                            button_label = "💾 Save Audio"
-                        else:
-                            file_ext = ".mp4"
-                            mime_type = "video/mp4"
-                            button_label = "💾 Save Video"
-                        
-                        st.download_button(
-                            label=button_label,
-                            data=f,
-                            file_name=f"download_{Path(file_path).stem}{file_ext}",
-                            mime=mime_type,
-                            use_container_width=True,
-                            type="primary",
-                        )
+                    if is_audio:
+                        file_ext = Path(file_path).suffix or ".mp3"
+                        button_label = "💾 Save Audio"
+                    else:
+                        file_ext = Path(file_path).suffix or ".mp4"
+                        button_label = "💾 Save Video"
+
+                    # The file is streamed by the background file server, not
+                    # loaded into Streamlit's memory
+                    st.link_button(
+                        button_label,
+                        public_file_url(
+                            file_path,
+                            f"download_{Path(file_path).stem}{file_ext}",
+                        ),
+                        use_container_width=True,
+                        type="primary",
+                    )
                 
                 # Option to download another
                 if st.button("🔄 Download Another Video", use_container_width=False):
@@ -404,6 +630,4 @@ with main_container:
                 st.session_state.state["error"] = None
                 st.rerun()
 
-# Footer
-st.markdown("---")
-st.caption("🛡️ Supports: YouTube, YouTube Shorts, Facebook, Instagram Reels, and more! Download as Video or Audio")
+render_footer()
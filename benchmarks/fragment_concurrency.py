@@ -0,0 +1,70 @@
+"""
+Compare download time of a fragmented (HLS) stream at several fragment
+concurrency levels.
+
+The local media server (benchmarks.media_server) serves a synthetic HLS
+playlist whose segments each take --latency seconds to start arriving, like
+a distant CDN. The same stream is then downloaded with yt-dlp at each
+--levels value and the results are printed as JSON.
+
+    python -m benchmarks.fragment_concurrency --segments 40 --levels 1,4,8
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import yt_dlp
+
+from benchmarks.media_server import MediaServer
+from services.fragments import fragment_options
+
+
+def run_level(url: str, concurrency: int, output_dir: str) -> dict:
+    opts = {
+        "outtmpl": os.path.join(output_dir, f"c{concurrency}.%(ext)s"),
+        "quiet": True,
+        "no_warnings": True,
+        "noprogress": True,
+        "fixup": "never",
+        **fragment_options("generic", concurrency=concurrency),
+    }
+    started = time.monotonic()
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        path = ydl.prepare_filename(info)
+    seconds = time.monotonic() - started
+    size = os.path.getsize(path)
+    return {
+        "concurrency": concurrency,
+        "seconds": round(seconds, 3),
+        "bytes": size,
+        "mib_per_s": round(size / seconds / (1024 * 1024), 2),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--segments", type=int, default=40)
+    parser.add_argument("--segment-kb", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--levels", default="1,2,4,8,16")
+    args = parser.parse_args(argv)
+
+    results = []
+    server = MediaServer(
+        segments=args.segments,
+        segment_size=args.segment_kb * 1024,
+        latency=args.latency,
+    )
+    with server, tempfile.TemporaryDirectory() as output_dir:
+        url = f"{server.base_url}/hls/stream.m3u8"
+        for level in (int(v) for v in args.levels.split(",") if v.strip()):
+            results.append(run_level(url, level, output_dir))
+    print(json.dumps({"segments": args.segments, "latency": args.latency, "runs": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
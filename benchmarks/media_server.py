@@ -0,0 +1,207 @@
+"""
+Local stand-in for the media hosts and the Facebook download API.
+
+Routes:
+    GET  /progressive.mp4       synthetic progressive file (Range supported)
+    GET  /audio.m4a             audio-only file (Range supported); synthetic
+                                unless real audio bytes are given
+    GET  /hls/stream.m3u8       HLS media playlist, segments at /hls/seg<N>.ts
+    GET  /dash/manifest.mpd     DASH manifest, segments at /dash/seg<N>.m4s
+    POST /download              Facebook API stand-in, answers with the
+                                progressive file as download_url
+
+Synthetic bytes are not decodable media: yt-dlp only moves them. Steps that
+run ffmpeg need real audio, which the caller can generate and pass in as
+`audio_data` (see benchmarks.run). Every fragment and
+range request waits `latency` seconds first, to imitate a distant CDN.
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+# A fixed non-repeating-looking block, tiled to any size
+_BLOCK = bytes((i * 7919 + (i >> 8) * 104729) & 0xFF for i in range(64 * 1024))
+
+DASH_MANIFEST = """<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" profiles="urn:mpeg:dash:profile:isoff-on-demand:2011"
+     mediaPresentationDuration="PT{duration}S" minBufferTime="PT2S">
+  <Period>
+    <AdaptationSet mimeType="video/mp4" segmentAlignment="true">
+      <Representation id="av" bandwidth="{bandwidth}" width="1280" height="720" codecs="avc1.4d401f,mp4a.40.2">
+        <SegmentTemplate timescale="1" duration="2" startNumber="0" initialization="init.mp4" media="seg$Number$.m4s"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+
+def synthetic_bytes(start: int, end: int) -> bytes:
+    """Bytes [start, end) of the synthetic payload."""
+    size = len(_BLOCK)
+    out = bytearray()
+    offset = start
+    while offset < end:
+        index = offset % size
+        take = min(size - index, end - offset)
+        out += _BLOCK[index:index + take]
+        offset += take
+    return bytes(out)
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Overridden per server by MediaServer
+    file_size = 32 * 1024 * 1024
+    segments = 40
+    segment_size = 256 * 1024
+    latency = 0.0
+    audio_data: Optional[bytes] = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers=None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_file(
+        self, size: int, content_type: str, data: Optional[bytes] = None
+    ) -> None:
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if match:
+            time.sleep(self.latency)
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            status = 206
+            headers = {"Content-Range": f"bytes {start}-{end}/{size}"}
+        else:
+            start, end, status, headers = 0, size - 1, 200, {}
+        headers["Accept-Ranges"] = "bytes"
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(length))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        offset = start
+        while offset <= end:
+            chunk_end = min(offset + 1024 * 1024, end + 1)
+            if data is not None:
+                self.wfile.write(data[offset:chunk_end])
+            else:
+                self.wfile.write(synthetic_bytes(offset, chunk_end))
+            offset = chunk_end
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/progressive.mp4":
+            self._send_file(self.file_size, "video/mp4")
+        elif path == "/audio.m4a":
+            if self.audio_data is not None:
+                self._send_file(len(self.audio_data), "audio/mp4", self.audio_data)
+            else:
+                self._send_file(max(1, self.file_size // 8), "audio/mp4")
+        elif path == "/hls/stream.m3u8":
+            lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2"]
+            for i in range(self.segments):
+                lines += ["#EXTINF:2.0,", f"seg{i}.ts"]
+            lines.append("#EXT-X-ENDLIST")
+            self._send(200, ("\n".join(lines) + "\n").encode("utf-8"), "application/vnd.apple.mpegurl")
+        elif path == "/dash/manifest.mpd":
+            body = DASH_MANIFEST.format(
+                duration=2 * self.segments,
+                bandwidth=self.segment_size * 8 // 2,
+            ).encode("utf-8")
+            self._send(200, body, "application/dash+xml")
+        elif re.fullmatch(r"/hls/seg\d+\.ts|/dash/seg\d+\.m4s|/dash/init\.mp4", path):
+            time.sleep(self.latency)
+            size = 1024 if path.endswith("init.mp4") else self.segment_size
+            self._send(200, synthetic_bytes(0, size), "video/mp4")
+        else:
+            self._send(404, b"", "text/plain")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if self.path.split("?", 1)[0] != "/download":
+            self._send(404, b"", "text/plain")
+            return
+        host, port = self.server.server_address[:2]
+        payload = {
+            "status": "success",
+            "download_url": f"http://{host}:{port}/progressive.mp4",
+        }
+        self._send(200, json.dumps(payload).encode("utf-8"), "application/json")
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients (yt-dlp probes) hang up early; that is not worth a traceback
+        pass
+
+
+class MediaServer:
+    """Run MediaHandler on a free local port in a daemon thread."""
+
+    def __init__(
+        self,
+        file_size: int = 32 * 1024 * 1024,
+        segments: int = 40,
+        segment_size: int = 256 * 1024,
+        latency: float = 0.0,
+        audio_data: Optional[bytes] = None,
+    ):
+        handler = type(
+            "ConfiguredMediaHandler",
+            (MediaHandler,),
+            {
+                "file_size": file_size,
+                "segments": segments,
+                "segment_size": segment_size,
+                "latency": latency,
+                "audio_data": audio_data,
+            },
+        )
+        self.server = _QuietServer(("127.0.0.1", 0), handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> "MediaServer":
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="media-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MediaServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,387 @@
+"""
+Offline benchmark suite for the services.downloader entry points.
+
+Starts the local media server (benchmarks.media_server) and runs every case
+in its own subprocess, with an empty work directory, so peak RSS and caches
+are per case. Nothing touches the network. Results are written as JSON;
+with --baseline, metrics that got slower or bigger than the baseline by
+more than --tolerance are reported and the exit status is 1.
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from benchmarks.media_server import MediaServer
+
+# Metrics where a larger value is a regression
+REGRESSION_METRICS = (
+    "seconds",
+    "cold_seconds",
+    "warm_seconds",
+    "rerun_seconds",
+    "postprocess_seconds",
+    "peak_rss_mb",
+    "callback_us",
+)
+# Metrics where a smaller value is a regression
+THROUGHPUT_METRICS = ("mib_per_s",)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+class HookMeter:
+    """Progress hook that forwards to a ProgressChannel and times each call."""
+
+    def __init__(self):
+        from services.progress import ProgressChannel
+
+        self.channel = ProgressChannel()
+        self.calls = 0
+        self.seconds = 0.0
+
+    def __call__(self, event: dict) -> None:
+        started = time.perf_counter()
+        self.channel.publish(event)
+        self.seconds += time.perf_counter() - started
+        self.calls += 1
+
+
+def _measure(download: Callable) -> dict:
+    from services.formats import plan_stats
+
+    meter = HookMeter()
+    started = time.monotonic()
+    file_path, error = download(meter)
+    seconds = time.monotonic() - started
+    if error:
+        raise RuntimeError(error)
+    size = os.path.getsize(file_path)
+    postprocess = sum(
+        entry["postprocess_seconds"] for entry in plan_stats.snapshot().values()
+    )
+    return {
+        "seconds": round(seconds, 4),
+        "bytes": size,
+        "mib_per_s": round(size / seconds / (1024 * 1024), 2),
+        "postprocess_seconds": round(postprocess, 4),
+        "callbacks": meter.calls,
+        "callback_us": round(1e6 * meter.seconds / max(1, meter.calls), 2),
+    }
+
+
+def case_get_video_info(base: str, output_dir: str) -> dict:
+    from services.downloader import get_video_info
+
+    url = f"{base}/progressive.mp4"
+    started = time.monotonic()
+    _, error = get_video_info(url, use_cache=False)
+    cold = time.monotonic() - started
+    if error:
+        raise RuntimeError(error)
+    get_video_info(url)
+    started = time.monotonic()
+    get_video_info(url)
+    warm = time.monotonic() - started
+    return {"cold_seconds": round(cold, 4), "warm_seconds": round(warm, 4)}
+
+
+def _ytdlp_case(path: str) -> Callable[[str, str], dict]:
+    def case(base: str, output_dir: str) -> dict:
+        from services.downloader import download_with_ytdlp
+
+        return _measure(
+            lambda hook: download_with_ytdlp(
+                f"{base}{path}", output_dir=output_dir, progress_hook=hook, use_cache=False
+            )
+        )
+
+    return case
+
+
+def case_download_audio_fast(base: str, output_dir: str) -> dict:
+    from services.audio import AUDIO_MODE_FAST
+    from services.downloader import download_audio
+
+    return _measure(
+        lambda hook: download_audio(
+            f"{base}/audio.m4a",
+            output_dir=output_dir,
+            progress_hook=hook,
+            use_cache=False,
+            mode=AUDIO_MODE_FAST,
+        )
+    )
+
+
+def case_download_audio_mp3(base: str, output_dir: str) -> dict:
+    from services.audio import get_mp3_transcoder
+    from services.downloader import download_audio_mp3
+
+    result = _measure(
+        lambda hook: download_audio_mp3(
+            f"{base}/audio.m4a", output_dir=output_dir, progress_hook=hook, use_cache=False
+        )
+    )
+    result["postprocess_seconds"] = round(get_mp3_transcoder().stats()["seconds"], 4)
+    return result
+
+
+def case_download_direct_url(base: str, output_dir: str) -> dict:
+    from services.downloader import download_direct_url
+
+    return _measure(
+        lambda hook: download_direct_url(
+            f"{base}/progressive.mp4", output_dir=output_dir, progress_hook=hook
+        )
+    )
+
+
+def case_download_media_facebook_api(base: str, output_dir: str) -> dict:
+    from services.downloader import download_media
+
+    # The stand-in /download endpoint resolves this to the local file
+    return _measure(
+        lambda hook: download_media(
+            "https://www.facebook.com/watch/?v=1234567890",
+            output_dir=output_dir,
+            facebook_api_url=base,
+            progress_hook=hook,
+        )
+    )
+
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+APP_RERUNS = 10
+
+
+def case_app_startup(base: str, output_dir: str) -> dict:
+    """
+    First run and reruns of app.py with no URL entered, as Streamlit executes them.
+
+    cold_seconds includes importing the app's modules (but not Streamlit);
+    rerun_seconds is the median of APP_RERUNS reruns of the same session.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    # Any free port for the app's file server
+    os.environ["VIDEO_DOWNLOADER_FILE_PORT"] = "0"
+    started = time.monotonic()
+    app = AppTest.from_file(APP_PATH, default_timeout=60).run()
+    cold = time.monotonic() - started
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    reruns = []
+    for _ in range(APP_RERUNS):
+        started = time.monotonic()
+        app.run()
+        reruns.append(time.monotonic() - started)
+    return {
+        "cold_seconds": round(cold, 4),
+        "rerun_seconds": round(statistics.median(reruns), 4),
+        "yt_dlp_imported": "yt_dlp" in sys.modules,
+    }
+
+
+CASES = {
+    "app_startup": case_app_startup,
+    "get_video_info": case_get_video_info,
+    "download_with_ytdlp_progressive": _ytdlp_case("/progressive.mp4"),
+    "download_with_ytdlp_hls": _ytdlp_case("/hls/stream.m3u8"),
+    "download_with_ytdlp_dash": _ytdlp_case("/dash/manifest.mpd"),
+    "download_audio_fast": case_download_audio_fast,
+    "download_audio_mp3": case_download_audio_mp3,
+    "download_direct_url": case_download_direct_url,
+    "download_media_facebook_api": case_download_media_facebook_api,
+}
+
+# Cases that need ffmpeg on PATH; the server then serves real generated audio
+FFMPEG_CASES = {"download_audio_mp3"}
+
+
+def generate_audio(seconds: int = 120) -> Optional[bytes]:
+    """Encode a sine tone to AAC with ffmpeg, or None without ffmpeg."""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tone.m4a")
+        subprocess.run(
+            [ffmpeg, "-v", "error", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+             "-c:a", "aac", "-b:a", "128k", path],
+            check=True,
+        )
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def run_case_in_process(name: str, base: str, result_file: str) -> None:
+    """Child side: run one case and write its metrics to result_file."""
+    output_dir = tempfile.mkdtemp(prefix="bench-out-")
+    try:
+        result = CASES[name](base, output_dir)
+        result["peak_rss_mb"] = peak_rss_mb()
+    except Exception as e:
+        result = {"error": str(e)}
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    with open(result_file, "w") as f:
+        json.dump(result, f)
+
+
+def run_case(name: str, base: str, verbose: bool) -> dict:
+    """Parent side: run one case in a fresh interpreter and work directory."""
+    with tempfile.TemporaryDirectory(prefix="bench-work-") as work_dir:
+        result_file = os.path.join(work_dir, "result.json")
+        env = dict(os.environ, VIDEO_DOWNLOADER_DIR=work_dir)
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--case", name, "--base-url", base,
+             "--result-file", result_file],
+            env=env,
+            stdout=None if verbose else subprocess.DEVNULL,
+            stderr=None if verbose else subprocess.DEVNULL,
+            check=False,
+        )
+        try:
+            with open(result_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"error": "case crashed"}
+
+
+def _median_runs(runs: list) -> dict:
+    if any("error" in run for run in runs):
+        return next(run for run in runs if "error" in run)
+    merged = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs if run.get(key) is not None]
+        merged[key] = statistics.median_low(values) if values else None
+    merged["runs"] = len(runs)
+    return merged
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return human readable regressions of results against baseline."""
+    regressions = []
+    for name, metrics in results["cases"].items():
+        old = baseline.get("cases", {}).get(name) or {}
+        for metric in REGRESSION_METRICS:
+            new_value, old_value = metrics.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            if new_value > old_value * (1 + tolerance):
+                regressions.append(
+                    f"{name}.{metric}: {old_value} -> {new_value} "
+                    f"(+{100 * (new_value / old_value - 1):.0f}%)"
+                )
+        for metric in THROUGHPUT_METRICS:
+            new_value, old_value = metrics.get(metric), old.get(metric)
+            if new_value is None or not old_value:
+                continue
+            if new_value < old_value / (1 + tolerance):
+                regressions.append(
+                    f"{name}.{metric}: {old_value} -> {new_value} "
+                    f"({100 * (new_value / old_value - 1):.0f}%)"
+                )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case (median kept)")
+    parser.add_argument("--cases", help="comma-separated subset of: " + ", ".join(CASES))
+    parser.add_argument("--file-mb", type=int, default=32)
+    parser.add_argument("--segments", type=int, default=40)
+    parser.add_argument("--segment-kb", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--verbose", action="store_true")
+    # Internal: run a single case in this process
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        run_case_in_process(args.case, args.base_url, args.result_file)
+        return 0
+
+    names = [n.strip() for n in args.cases.split(",")] if args.cases else list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    import yt_dlp
+
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "yt_dlp": yt_dlp.version.__version__,
+        "settings": {
+            "file_mb": args.file_mb,
+            "segments": args.segments,
+            "segment_kb": args.segment_kb,
+            "latency": args.latency,
+            "repeat": args.repeat,
+        },
+        "cases": {},
+    }
+    server = MediaServer(
+        file_size=args.file_mb * 1024 * 1024,
+        segments=args.segments,
+        segment_size=args.segment_kb * 1024,
+        latency=args.latency,
+        audio_data=generate_audio(),
+    )
+    with server:
+        for name in names:
+            if name in FFMPEG_CASES and not shutil.which("ffmpeg"):
+                results["cases"][name] = {"skipped": "ffmpeg not found"}
+                continue
+            runs = [run_case(name, server.base_url, args.verbose) for _ in range(args.repeat)]
+            results["cases"][name] = _median_runs(runs)
+            print(f"{name}: {json.dumps(results['cases'][name])}", file=sys.stderr)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != results["settings"]:
+            print("Note: baseline was run with different settings", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
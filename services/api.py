@@ -0,0 +1,391 @@
+"""Headless JSON HTTP API for the download services (no Streamlit needed)."""
+
+import argparse
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from services.audio import AUDIO_MODE_MP3, AUDIO_MODES
+from services.cancel import CancelToken
+from services.clips import make_clip
+from services.config import env_int, get_work_dir
+from services.downloader import (
+    detect_platform,
+    download_media,
+    get_video_info,
+    normalize_video_url,
+    resume_interrupted_downloads,
+)
+from services.facebook_api import configured_facebook_api_url
+from services.fileserver import send_file, sign_file_token, verify_file_token
+from services.formats import QUALITIES
+from services.jobs import PRIORITY_INTERACTIVE, get_job_queue
+from services.metrics import registry
+
+
+DEFAULT_API_HOST = "127.0.0.1"
+DEFAULT_API_PORT = 8502
+# The UI's file server, kept apart so the app and the API can share a machine
+DEFAULT_FILE_PORT = 8503
+
+registry.gauge(
+    "video_downloader_jobs_queued",
+    lambda: {(): get_job_queue().stats()["queued"]},
+)
+registry.gauge(
+    "video_downloader_jobs_running",
+    lambda: {
+        (("platform", platform),): count
+        for platform, count in get_job_queue().stats()["running"].items()
+    },
+)
+
+
+def submit_download(
+    url: str,
+    quality: str = "best",
+    audio_only: bool = False,
+    facebook_api_url: Optional[str] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    info_handle: Optional[str] = None,
+    audio_mode: str = AUDIO_MODE_MP3,
+    session: Optional[str] = None,
+    clip_start=None,
+    clip_end=None,
+    exact_cut: bool = False,
+):
+    """
+    Queue a download job for url and return it.
+
+    Jobs with the same session share one fair share of the bandwidth.
+    clip_start/clip_end/exact_cut download only part of the video (see
+    download_media).
+    """
+    url = normalize_video_url(url.strip())
+    return get_job_queue().submit(
+        download_media,
+        platform=detect_platform(url),
+        priority=priority,
+        label=url,
+        url=url,
+        quality=quality,
+        audio_only=audio_only,
+        output_dir=str(get_work_dir()),
+        facebook_api_url=facebook_api_url,
+        info_handle=info_handle,
+        audio_mode=audio_mode,
+        cancel_token=CancelToken(),
+        session=session,
+        clip_start=clip_start,
+        clip_end=clip_end,
+        exact_cut=exact_cut,
+    )
+
+
+def _download_request_error(data: dict) -> Optional[str]:
+    """Return why a POST /downloads body is invalid, or None if it is valid."""
+    if data.get("quality") and data["quality"] not in QUALITIES:
+        return f"quality must be one of {', '.join(QUALITIES)}"
+    if data.get("audio_mode") and data["audio_mode"] not in AUDIO_MODES:
+        return f"audio_mode must be one of {', '.join(AUDIO_MODES)}"
+    if "facebook_api_url" in data:
+        # The server would POST to it: only the operator may choose it
+        return "facebook_api_url is set by the server, not per request"
+    for field in ("info_handle", "session"):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"{field} must be a string"
+    try:
+        make_clip(data.get("start"), data.get("end"))
+    except (TypeError, ValueError) as e:
+        return str(e)
+    return None
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """
+    Routes:
+        GET  /health              liveness check
+        GET  /metrics             Prometheus text format counters and histograms
+        GET  /info?url=...        video metadata
+        POST /downloads           queue a download, body {url, quality, audio,
+                                  audio_mode ("mp3" or "fast"),
+                                  info_handle (from /info, optional),
+                                  session (bandwidth share, default: client address),
+                                  start, end (clip times, e.g. 90 or "1:30"),
+                                  exact_cut (re-encode the clip for exact cuts)}
+        GET  /downloads/<job_id>  job state and progress
+        DELETE /downloads/<job_id>
+                                  cancel the job
+        GET  /files/<job_id>      the finished file
+        GET  /stream/<token>      a file named by a signed token (see fileserver)
+
+    File responses support Range requests and are sent with sendfile.
+    """
+
+    server_version = "VideoDownloaderAPI/1.0"
+
+    def log_message(self, format, *args):
+        if os.environ.get("VIDEO_DOWNLOADER_API_LOG"):
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_metrics(self) -> None:
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Optional[dict]:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length < 0:
+                return None
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        parts = [p for p in parsed.path.split("/") if p]
+
+        if parts == ["health"]:
+            self._send_json(200, {"status": "ok", "queue": get_job_queue().stats()})
+        elif parts == ["metrics"]:
+            self._send_metrics()
+        elif parts == ["info"]:
+            url = (parse_qs(parsed.query).get("url") or [""])[0]
+            if not url:
+                self._send_json(400, {"error": "Missing url parameter"})
+                return
+            info, error = get_video_info(normalize_video_url(url.strip()))
+            if error:
+                self._send_json(502, {"error": error})
+            else:
+                self._send_json(200, info)
+        elif len(parts) == 2 and parts[0] == "downloads":
+            # Jobs of other replicas are answered from the state backend
+            snapshot = get_job_queue().lookup(parts[1])
+            if snapshot is None:
+                self._send_json(404, {"error": "Unknown job"})
+            else:
+                self._send_json(200, snapshot)
+        elif len(parts) == 2 and parts[0] == "files":
+            self._send_job_file(parts[1])
+        elif len(parts) == 2 and parts[0] == "stream":
+            self._send_token_file(parts[1])
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_HEAD(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if len(parts) == 2 and parts[0] == "stream":
+            self._send_token_file(parts[1])
+        elif len(parts) == 2 and parts[0] == "files":
+            self._send_job_file(parts[1])
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def do_DELETE(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if len(parts) != 2 or parts[0] != "downloads":
+            self._send_json(404, {"error": "Not found"})
+            return
+        queue = get_job_queue()
+        snapshot = queue.lookup(parts[1])
+        if snapshot is None:
+            self._send_json(404, {"error": "Unknown job"})
+        elif not queue.request_cancel(parts[1]):
+            self._send_json(
+                409, {"error": "Job already finished", "status": snapshot["status"]}
+            )
+        else:
+            self._send_json(202, queue.lookup(parts[1]) or snapshot)
+
+    def do_POST(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if parts != ["downloads"]:
+            self._send_json(404, {"error": "Not found"})
+            return
+        data = self._read_json()
+        if not data or not data.get("url") or not isinstance(data["url"], str):
+            self._send_json(400, {"error": "Body must be JSON with a url field"})
+            return
+        error = _download_request_error(data)
+        if error:
+            self._send_json(400, {"error": error})
+            return
+        job = submit_download(
+            data["url"],
+            quality=data.get("quality") or "best",
+            audio_only=bool(data.get("audio")),
+            facebook_api_url=self.server.facebook_api_url,
+            info_handle=data.get("info_handle"),
+            audio_mode=data.get("audio_mode") or AUDIO_MODE_MP3,
+            # Clients that do not say who they are share by address
+            session=data.get("session") or self.client_address[0],
+            clip_start=data.get("start"),
+            clip_end=data.get("end"),
+            exact_cut=bool(data.get("exact_cut")),
+        )
+        self._send_json(202, job.snapshot())
+
+    def _send_job_file(self, job_id: str) -> None:
+        snapshot = get_job_queue().lookup(job_id)
+        if snapshot is None:
+            self._send_json(404, {"error": "Unknown job"})
+            return
+        if not snapshot.get("finished"):
+            self._send_json(409, {"error": "Job not finished", "status": snapshot["status"]})
+            return
+        # Files are in the shared work directory, whichever replica made them
+        result, error = snapshot.get("result"), snapshot.get("error")
+        if error or not result or not os.path.exists(result):
+            self._send_json(410, {"error": error or "File no longer available"})
+            return
+        send_file(self, result)
+
+    def _send_token_file(self, token: str) -> None:
+        grant = verify_file_token(token)
+        if grant is None:
+            self._send_json(403, {"error": "Invalid or expired link"})
+            return
+        if not os.path.exists(grant["path"]):
+            self._send_json(410, {"error": "File no longer available"})
+            return
+        send_file(self, grant["path"], grant["filename"])
+
+
+class StreamHandler(ApiHandler):
+    """Only /stream/<token> and /metrics, for the server started by the UI."""
+
+    def do_GET(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if len(parts) == 2 and parts[0] == "stream":
+            self._send_token_file(parts[1])
+        elif parts == ["metrics"]:
+            self._send_metrics()
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_HEAD(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if len(parts) == 2 and parts[0] == "stream":
+            self._send_token_file(parts[1])
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def do_POST(self):
+        self._send_json(404, {"error": "Not found"})
+
+    do_DELETE = do_POST
+
+
+def make_server(
+    host: str = DEFAULT_API_HOST,
+    port: int = DEFAULT_API_PORT,
+    handler_class=ApiHandler,
+    facebook_api_url: Optional[str] = None,
+) -> ThreadingHTTPServer:
+    """
+    Create (but do not start) the API server.
+
+    Facebook downloads use facebook_api_url, or VIDEO_DOWNLOADER_FACEBOOK_API_URL;
+    clients cannot choose the URL the server calls.
+    """
+    server = ThreadingHTTPServer((host, port), handler_class)
+    server.daemon_threads = True
+    server.facebook_api_url = facebook_api_url or configured_facebook_api_url()
+    return server
+
+
+def serve(
+    host: str = DEFAULT_API_HOST,
+    port: int = DEFAULT_API_PORT,
+    facebook_api_url: Optional[str] = None,
+) -> None:
+    """Run the API server until interrupted."""
+    server = make_server(host, port, facebook_api_url=facebook_api_url)
+    resume_interrupted_downloads()
+    print(f"Video Downloader API listening on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+_background_server: Optional[ThreadingHTTPServer] = None
+_background_server_lock = threading.Lock()
+
+
+def get_file_server_port() -> int:
+    """Port of the in-process server used to stream files to browsers."""
+    return env_int("VIDEO_DOWNLOADER_FILE_PORT", DEFAULT_FILE_PORT)
+
+
+def start_background_server() -> bool:
+    """
+    Start the file streaming server in a daemon thread, once per process.
+
+    Returns False if the port is already taken, which usually means another
+    app process on this machine is already serving files.
+    """
+    global _background_server
+    with _background_server_lock:
+        if _background_server is not None:
+            return True
+        host = os.environ.get("VIDEO_DOWNLOADER_FILE_HOST", DEFAULT_API_HOST)
+        try:
+            _background_server = make_server(
+                host, get_file_server_port(), StreamHandler
+            )
+        except OSError:
+            return False
+        threading.Thread(
+            target=_background_server.serve_forever, name="file-server", daemon=True
+        ).start()
+        return True
+
+
+def public_file_url(path: str, filename: Optional[str] = None) -> str:
+    """
+    Build a short-lived signed link that streams path from the file server.
+
+    The base URL defaults to http://localhost:<port> and should be set with
+    VIDEO_DOWNLOADER_PUBLIC_URL when the app is reached through another host.
+    """
+    base = os.environ.get(
+        "VIDEO_DOWNLOADER_PUBLIC_URL", f"http://localhost:{get_file_server_port()}"
+    )
+    return f"{base.rstrip('/')}/stream/{sign_file_token(path, filename)}"
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Video Downloader HTTP API")
+    parser.add_argument("--host", default=DEFAULT_API_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_API_PORT)
+    parser.add_argument("--facebook-api-url", help="optional Facebook API fallback")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.facebook_api_url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Audio pipeline: codec-copy fast path and a bounded MP3 transcoding pool."""
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from services.cancel import CancelToken, DownloadCancelled
+from services.config import env_int
+from services.formats import PLAN_PROGRESSIVE, PLAN_TRANSCODE, FormatPlan
+from services.metrics import registry
+
+
+AUDIO_MODE_FAST = "fast"
+AUDIO_MODE_MP3 = "mp3"
+AUDIO_MODES = (AUDIO_MODE_MP3, AUDIO_MODE_FAST)
+
+DEFAULT_MP3_BITRATE = "192k"
+
+# Audio-only containers we hand to the client as-is, best first
+NATIVE_AUDIO_EXTS = ("m4a", "opus", "webm", "ogg", "mp3", "aac")
+
+
+def _is_audio_only(fmt: dict) -> bool:
+    return fmt.get("vcodec") == "none" and fmt.get("acodec") != "none"
+
+
+def plan_audio_formats(info: dict, mode: str = AUDIO_MODE_MP3) -> FormatPlan:
+    """
+    Choose how to produce the audio track.
+
+    Both modes fetch the best audio-only stream. In fast mode it is kept in
+    its native container; without an audio-only stream the best muxed file
+    is fetched and its audio extracted with stream copy. MP3 conversion is
+    done afterwards by the transcoding pool, not by yt-dlp.
+    """
+    formats = info.get("formats") or [info]
+    audio = [f for f in formats if _is_audio_only(f) and f.get("format_id")]
+    if audio:
+        best = max(
+            audio,
+            key=lambda f: (
+                f.get("abr") or f.get("tbr") or 0,
+                f.get("ext") == "m4a",
+            ),
+        )
+        return FormatPlan(
+            PLAN_PROGRESSIVE,
+            best["format_id"],
+            [],
+            f"native {best.get('ext') or 'audio'} stream",
+        )
+    return FormatPlan(
+        PLAN_TRANSCODE if mode == AUDIO_MODE_MP3 else PLAN_PROGRESSIVE,
+        "ba/b",
+        [{"key": "FFmpegExtractAudio", "preferredcodec": "best"}],
+        "audio copied out of a muxed file",
+    )
+
+
+class Mp3Transcoder:
+    """
+    Bounded pool of ffmpeg MP3 encodes.
+
+    LAME encodes on a single core, so at most `workers` ffmpeg processes (one
+    per core by default) run at once and further requests wait in a queue.
+    queued/running/completed/failed counters and cumulative encode time are
+    exposed through stats().
+    """
+
+    def __init__(self, workers: Optional[int] = None, ffmpeg: Optional[str] = None):
+        self.workers = max(
+            1, workers or env_int("VIDEO_DOWNLOADER_MP3_WORKERS", os.cpu_count() or 1)
+        )
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg") or "ffmpeg"
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="mp3-transcode"
+        )
+        self._lock = threading.Lock()
+        self._stats = {
+            "queued": 0,
+            "running": 0,
+            "completed": 0,
+            "failed": 0,
+            "seconds": 0.0,
+        }
+
+    def _bump(self, **changes) -> None:
+        with self._lock:
+            for name, delta in changes.items():
+                self._stats[name] += delta
+
+    def _encode(
+        self, src: str, dst: str, bitrate: str, cancel_token: Optional[CancelToken]
+    ) -> tuple[str, Optional[str]]:
+        self._bump(queued=-1, running=1)
+        if cancel_token is not None and cancel_token.cancelled:
+            self._bump(running=-1, failed=1)
+            return None, str(DownloadCancelled())
+        started = time.monotonic()
+        try:
+            proc = subprocess.Popen(
+                [
+                    self.ffmpeg,
+                    "-y",
+                    "-v",
+                    "error",
+                    "-i",
+                    src,
+                    "-vn",
+                    "-codec:a",
+                    "libmp3lame",
+                    "-b:a",
+                    bitrate,
+                    dst,
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+        except OSError as e:
+            self._bump(running=-1, failed=1)
+            return None, f"Could not run ffmpeg: {e}"
+        remove_callback = (
+            cancel_token.on_cancel(proc.kill) if cancel_token is not None else None
+        )
+        try:
+            _, stderr = proc.communicate()
+        finally:
+            if remove_callback:
+                remove_callback()
+        elapsed = time.monotonic() - started
+        if proc.returncode != 0:
+            self._bump(running=-1, failed=1, seconds=elapsed)
+            try:
+                os.remove(dst)
+            except OSError:
+                pass
+            if cancel_token is not None and cancel_token.cancelled:
+                return None, str(DownloadCancelled())
+            message = stderr.decode("utf-8", "replace").strip()
+            return None, message or f"ffmpeg exited with {proc.returncode}"
+        self._bump(running=-1, completed=1, seconds=elapsed)
+        return dst, None
+
+    def transcode(
+        self,
+        src: str,
+        dst: Optional[str] = None,
+        bitrate: str = DEFAULT_MP3_BITRATE,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> tuple[str, Optional[str]]:
+        """
+        Encode src to MP3 and block until done.
+
+        Cancelling cancel_token kills a running encode, or skips a queued one.
+
+        Returns:
+            Tuple of (output_path, error_message). error_message is None on success.
+        """
+        dst = dst or str(Path(src).with_suffix(".mp3"))
+        self._bump(queued=1)
+        return self._pool.submit(self._encode, src, dst, bitrate, cancel_token).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, workers=self.workers)
+
+
+_transcoder: Optional[Mp3Transcoder] = None
+_transcoder_lock = threading.Lock()
+
+
+def get_mp3_transcoder() -> Mp3Transcoder:
+    """Return the process-wide MP3 transcoding pool."""
+    global _transcoder
+    with _transcoder_lock:
+        if _transcoder is None:
+            _transcoder = Mp3Transcoder()
+        return _transcoder
+
+
+registry.describe(
+    "video_downloader_transcodes_queued", "gauge", "MP3 encodes waiting for a worker"
+)
+registry.describe(
+    "video_downloader_transcodes_running", "gauge", "MP3 encodes in progress"
+)
+registry.gauge(
+    "video_downloader_transcodes_queued",
+    lambda: {(): get_mp3_transcoder().stats()["queued"]},
+)
+registry.gauge(
+    "video_downloader_transcodes_running",
+    lambda: {(): get_mp3_transcoder().stats()["running"]},
+)
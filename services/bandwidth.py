@@ -0,0 +1,441 @@
+"""Per-host request limits and fair sharing of download bandwidth."""
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+import uuid
+import weakref
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+from services.cancel import CancelToken, DownloadCancelled
+from services.config import env_float, env_int
+from services.metrics import registry
+
+
+DEFAULT_RETRY_BACKOFF = 1.0
+MAX_RETRY_BACKOFF = 30.0
+# Longest single sleep while throttled, so cancellation is noticed promptly
+MAX_WAIT_SLICE = 0.25
+# Forget idle sessions' positions once this many are tracked
+MAX_TRACKED_GROUPS = 256
+
+THROTTLE_BANDWIDTH = "bandwidth"
+THROTTLE_JOB = "job"
+THROTTLE_HOST = "host"
+THROTTLE_PREFETCH = "prefetch"
+
+# Fair-share group every unclaimed prefetch is charged to
+PREFETCH_GROUP = "prefetch"
+
+registry.describe(
+    "video_downloader_throttle_seconds_total",
+    "counter",
+    "Time downloads spent waiting on bandwidth, per-job, per-host or prefetch limits",
+)
+
+
+def parse_host_limits(spec: str) -> dict[str, float]:
+    """Parse a `host=rate,host=rate` string into a dict."""
+    limits = {}
+    for item in (spec or "").split(","):
+        name, _, value = item.partition("=")
+        name = name.strip().lower().lstrip(".")
+        if not name:
+            continue
+        try:
+            rate = float(value)
+        except ValueError:
+            continue
+        if rate > 0:
+            limits[name] = rate
+    return limits
+
+
+def prefetch_session(session: Optional[str]) -> str:
+    """Session to download a prefetch for session under (see BandwidthScheduler)."""
+    return f"{PREFETCH_GROUP}:{session or uuid.uuid4().hex}"
+
+
+def _host(url: Optional[str]) -> str:
+    try:
+        return (urlparse(url or "").hostname or "").lower()
+    except ValueError:
+        return ""
+
+
+def _sleep(seconds: float, cancel_token: Optional[CancelToken]) -> None:
+    """Sleep, raising DownloadCancelled as soon as cancel_token is cancelled."""
+    if seconds <= 0:
+        return
+    if cancel_token is None:
+        time.sleep(seconds)
+    elif cancel_token.wait(seconds):
+        raise DownloadCancelled()
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` per second, holding at most `burst`.
+
+    reserve() always succeeds and returns how long the caller must wait
+    before using what it took; the bucket goes into debt meanwhile, which
+    keeps large chunks from starving.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def reserve(self, amount: float = 1) -> float:
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out nothing for the next `seconds`, e.g. after a 429."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+class FairShare:
+    """
+    A global byte rate shared fairly between groups (sessions).
+
+    Waiting requests are served in start-time fair queuing order: each
+    group's next request is tagged after its previous one, so a session
+    running three downloads gets the same share as a session running one.
+    Idle groups do not bank credit. Bandwidth a group does not use goes
+    to the others.
+    """
+
+    def __init__(self, rate: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        # A short burst: whatever the bucket holds is handed out first come, first served
+        self.burst = rate / 10
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._updated = clock()
+        self._vtime = 0.0
+        self._finish: dict[str, float] = {}
+        self._waiting: list = []
+        self._seq = itertools.count()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(
+        self, group: str, amount: float, cancel_token: Optional[CancelToken] = None
+    ) -> float:
+        """Block until group may use `amount` bytes; return the seconds waited."""
+        started = self._clock()
+        with self._cond:
+            start = max(self._vtime, self._finish.get(group, 0.0))
+            self._finish[group] = start + amount
+            if len(self._finish) > MAX_TRACKED_GROUPS:
+                for name, finish in list(self._finish.items()):
+                    if finish <= self._vtime:
+                        del self._finish[name]
+            entry = (start, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    if cancel_token is not None and cancel_token.cancelled:
+                        raise DownloadCancelled()
+                    timeout = MAX_WAIT_SLICE
+                    if self._waiting[0] == entry:
+                        self._refill()
+                        if self._tokens > 0:
+                            self._tokens -= amount
+                            self._vtime = start
+                            heapq.heappop(self._waiting)
+                            self._cond.notify_all()
+                            return self._clock() - started
+                        timeout = min(timeout, -self._tokens / self.rate)
+                    self._cond.wait(timeout)
+            except BaseException:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+
+class BandwidthScheduler:
+    """
+    Shared limits every download goes through.
+
+    - `rate`: bytes per second for all downloads together, shared fairly
+      between sessions (FairShare); 0 for no limit.
+    - `job_rate`: bytes per second for any single download; 0 for none.
+    - `host_rates`: requests per second per host, matched by domain suffix
+      (`googlevideo.com` covers every `*.googlevideo.com`), with
+      `default_host_rate` for other hosts; 0 for no limit.
+    - `prefetch_rate`: bytes per second for all prefetches together; 0
+      for no limit beyond their share.
+
+    Prefetches (sessions from prefetch_session()) share one fair-share
+    group, so together they never take more than one session's share of
+    `rate`. Once claim()ed, a prefetch is charged to its own session again
+    and no longer counts against `prefetch_rate`.
+
+    A download that retries against a limited host pauses that host's
+    bucket for the backoff, so every download to it slows down instead of
+    each one retrying at once.
+    """
+
+    def __init__(
+        self,
+        rate: float = 0,
+        job_rate: float = 0,
+        host_rates: Optional[dict[str, float]] = None,
+        default_host_rate: float = 0,
+        retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+        prefetch_rate: float = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.job_rate = job_rate
+        self.host_rates = dict(host_rates or {})
+        self.default_host_rate = default_host_rate
+        self.retry_backoff = retry_backoff
+        self._clock = clock
+        self.prefetch_rate = prefetch_rate
+        self._share = FairShare(rate, clock) if rate > 0 else None
+        self._prefetch = (
+            TokenBucket(prefetch_rate, clock=clock) if prefetch_rate > 0 else None
+        )
+        self._lock = threading.Lock()
+        self._hosts: dict[str, TokenBucket] = {}
+        self._claimed: "weakref.WeakSet[CancelToken]" = weakref.WeakSet()
+        self._waited = {
+            THROTTLE_BANDWIDTH: 0.0,
+            THROTTLE_JOB: 0.0,
+            THROTTLE_HOST: 0.0,
+            THROTTLE_PREFETCH: 0.0,
+        }
+
+    def _record_wait(self, reason: str, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._waited[reason] += seconds
+        registry.inc("video_downloader_throttle_seconds_total", seconds, reason=reason)
+
+    def _host_bucket(self, host: str) -> Optional[TokenBucket]:
+        if not host:
+            return None
+        key, rate = None, 0.0
+        for suffix, suffix_rate in self.host_rates.items():
+            if (host == suffix or host.endswith("." + suffix)) and (
+                key is None or len(suffix) > len(key)
+            ):
+                key, rate = suffix, suffix_rate
+        if key is None and self.default_host_rate > 0:
+            key, rate = host, self.default_host_rate
+        if key is None:
+            return None
+        with self._lock:
+            bucket = self._hosts.get(key)
+            if bucket is None:
+                bucket = self._hosts[key] = TokenBucket(rate, clock=self._clock)
+            return bucket
+
+    def request(self, url: str, cancel_token: Optional[CancelToken] = None) -> None:
+        """Wait for the host's request limit before fetching url."""
+        bucket = self._host_bucket(_host(url))
+        if bucket is not None:
+            wait = bucket.reserve()
+            _sleep(wait, cancel_token)
+            self._record_wait(THROTTLE_HOST, wait)
+
+    def penalize(self, url: str, seconds: float) -> None:
+        """Pause requests to url's host, if it is rate limited."""
+        bucket = self._host_bucket(_host(url))
+        if bucket is not None:
+            bucket.pause(seconds)
+
+    def transfer(
+        self, group: str, amount: float, cancel_token: Optional[CancelToken] = None
+    ) -> None:
+        """Wait for group's fair share of the global rate to cover `amount` bytes."""
+        if self._share is not None and amount > 0:
+            self._record_wait(
+                THROTTLE_BANDWIDTH, self._share.acquire(group, amount, cancel_token)
+            )
+
+    def claim(self, cancel_token: Optional[CancelToken]) -> None:
+        """Charge the prefetch running with cancel_token as a normal download."""
+        if cancel_token is not None:
+            with self._lock:
+                self._claimed.add(cancel_token)
+
+    def _is_claimed(self, cancel_token: Optional[CancelToken]) -> bool:
+        if cancel_token is None:
+            return False
+        with self._lock:
+            return cancel_token in self._claimed
+
+    def flow(
+        self,
+        url: str,
+        session: Optional[str] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> "Flow":
+        """Return the throttle for one download of url on behalf of session."""
+        return Flow(self, url, session or uuid.uuid4().hex, cancel_token)
+
+    def stats(self) -> dict:
+        """Return the seconds downloads waited, by reason."""
+        with self._lock:
+            return {"waited": dict(self._waited), "hosts": len(self._hosts)}
+
+
+class Flow:
+    """
+    One download's view of the scheduler.
+
+    Progress hooks report cumulative bytes per file; the delta since the
+    last event is charged to the per-job bucket and the session's fair
+    share (for an unclaimed prefetch, the prefetch bucket and group), blocking the downloading thread as needed. For yt-dlp, a new
+    file or fragment counts as one request to its host, and retries back
+    off exponentially (with jitter) through retry_sleep_functions.
+    """
+
+    def __init__(
+        self,
+        scheduler: BandwidthScheduler,
+        url: str,
+        group: str,
+        cancel_token: Optional[CancelToken],
+    ):
+        self.scheduler = scheduler
+        self.url = url
+        prefix, _, session = group.partition(":")
+        self.prefetch = prefix == PREFETCH_GROUP and bool(session)
+        self.group = session if self.prefetch else group
+        self.cancel_token = cancel_token
+        self._bucket = (
+            TokenBucket(scheduler.job_rate, clock=scheduler._clock)
+            if scheduler.job_rate > 0
+            else None
+        )
+        self._lock = threading.Lock()
+        self._seen: dict[str, int] = {}
+        self._fragments: dict[str, object] = {}
+        self._media_url = url
+
+    def before_request(self, url: str) -> None:
+        self._media_url = url
+        self.scheduler.request(url, self.cancel_token)
+
+    def consume(self, amount: int) -> None:
+        """Wait until `amount` more bytes may be transferred."""
+        if amount <= 0:
+            return
+        if self._bucket is not None:
+            wait = self._bucket.reserve(amount)
+            _sleep(wait, self.cancel_token)
+            self.scheduler._record_wait(THROTTLE_JOB, wait)
+        group = self.group
+        if self.prefetch and not self.scheduler._is_claimed(self.cancel_token):
+            group = PREFETCH_GROUP
+            if self.scheduler._prefetch is not None:
+                wait = self.scheduler._prefetch.reserve(amount)
+                _sleep(wait, self.cancel_token)
+                self.scheduler._record_wait(THROTTLE_PREFETCH, wait)
+        self.scheduler.transfer(group, amount, self.cancel_token)
+
+    def track_bytes(self, event: dict) -> None:
+        """Progress hook charging the bytes downloaded since the last event."""
+        if event.get("status") != "downloading":
+            return
+        name = event.get("filename") or ""
+        downloaded = event.get("downloaded_bytes") or 0
+        with self._lock:
+            # Threads may report out of order; never charge bytes twice
+            delta = downloaded - self._seen.get(name, 0)
+            self._seen[name] = max(downloaded, self._seen.get(name, 0))
+        self.consume(delta)
+
+    def ytdlp_hook(self, event: dict) -> None:
+        """yt-dlp progress hook: request accounting plus track_bytes."""
+        if event.get("status") == "downloading":
+            name = event.get("filename") or ""
+            fragment = event.get("fragment_index")
+            with self._lock:
+                new_request = name not in self._fragments or (
+                    fragment is not None and self._fragments[name] != fragment
+                )
+                self._fragments[name] = fragment
+            if new_request:
+                info = event.get("info_dict") or {}
+                self.before_request(info.get("url") or self.url)
+        self.track_bytes(event)
+
+    def retry_sleep(self, n: int) -> float:
+        """Seconds yt-dlp waits before retry number n (0-based; called as n=...)."""
+        delay = min(MAX_RETRY_BACKOFF, self.scheduler.retry_backoff * 2 ** n)
+        delay *= random.uniform(0.5, 1.0)
+        self.scheduler.penalize(self._media_url, delay)
+        return delay
+
+    def ydl_options(self) -> dict:
+        """yt-dlp options applying this flow's limits."""
+        opts = {
+            "retry_sleep_functions": {
+                "http": self.retry_sleep,
+                "fragment": self.retry_sleep,
+            },
+        }
+        if self.scheduler.job_rate > 0:
+            # yt-dlp paces itself smoothly; track_bytes enforces the same cap
+            opts["ratelimit"] = int(self.scheduler.job_rate)
+        return opts
+
+
+_scheduler: Optional[BandwidthScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_bandwidth_scheduler() -> BandwidthScheduler:
+    """Return the process-wide bandwidth scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = BandwidthScheduler(
+                rate=env_int("VIDEO_DOWNLOADER_BANDWIDTH_KB", 0) * 1024,
+                job_rate=env_int("VIDEO_DOWNLOADER_JOB_BANDWIDTH_KB", 0) * 1024,
+                host_rates=parse_host_limits(
+                    os.environ.get("VIDEO_DOWNLOADER_HOST_REQUEST_LIMITS", "")
+                ),
+                default_host_rate=env_float("VIDEO_DOWNLOADER_HOST_REQUEST_RATE", 0),
+                retry_backoff=env_float(
+                    "VIDEO_DOWNLOADER_RETRY_BACKOFF", DEFAULT_RETRY_BACKOFF
+                ),
+                prefetch_rate=env_int("VIDEO_DOWNLOADER_PREFETCH_BANDWIDTH_KB", 0)
+                * 1024,
+            )
+        return _scheduler
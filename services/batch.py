@@ -0,0 +1,242 @@
+"""Batch and playlist downloads with parallel metadata and downloads."""
+
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qsl, urlparse
+
+from services.audio import AUDIO_MODE_MP3
+from services.config import env_int
+from services.downloader import (
+    detect_platform,
+    download_media,
+    get_video_info,
+    normalize_video_url,
+)
+from services.jobs import PRIORITY_BATCH, get_job_queue
+
+
+DEFAULT_BATCH_CONCURRENCY = 4
+MAX_BATCH_ITEMS = 500
+
+ITEM_PENDING = "pending"
+ITEM_QUEUED = "queued"
+ITEM_DOWNLOADING = "downloading"
+ITEM_DONE = "done"
+ITEM_ERROR = "error"
+
+
+def parse_batch_input(text: str) -> list[str]:
+    """Split pasted text into normalized, de-duplicated URLs, keeping order."""
+    urls = []
+    seen = set()
+    for token in re.split(r"[\s,;]+", text or ""):
+        token = token.strip()
+        if not token.lower().startswith(("http://", "https://")):
+            continue
+        url = normalize_video_url(token)
+        if url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+def is_playlist_url(url: str) -> bool:
+    """Return True for YouTube playlist pages (a `list=` without a video id)."""
+    parsed = urlparse(url)
+    if detect_platform(url) != "youtube":
+        return False
+    query = dict(parse_qsl(parsed.query))
+    if parsed.path.rstrip("/") == "/playlist":
+        return "list" in query
+    return "list" in query and "v" not in query
+
+
+def expand_playlist(url: str) -> tuple[list[dict], Optional[str]]:
+    """
+    Enumerate playlist entries with flat extraction (no per-video requests).
+
+    Returns:
+        Tuple of (entries, error_message). Each entry has url and title.
+    """
+    import yt_dlp
+
+    ydl_opts = {
+        "quiet": True,
+        "no_warnings": True,
+        "skip_download": True,
+        "extract_flat": "in_playlist",
+    }
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        return [], str(e)
+    if not info:
+        return [], "Could not extract playlist information"
+
+    entries = []
+    for entry in info.get("entries") or []:
+        if not entry:
+            continue
+        entry_url = entry.get("url") or entry.get("webpage_url")
+        if entry_url and not entry_url.startswith("http") and entry.get("id"):
+            entry_url = f"https://www.youtube.com/watch?v={entry['id']}"
+        if entry_url:
+            entries.append({"url": entry_url, "title": entry.get("title")})
+    return entries, None
+
+
+class BatchRun:
+    """
+    A batch of URLs downloaded through the shared job queue.
+
+    Playlists are expanded with flat extraction, then metadata for every item
+    is fetched in parallel while at most `concurrency` items of this batch
+    are queued or downloading at any time. `items` holds one status dict per
+    video and is safe to read from the UI thread.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        quality: str = "best",
+        audio_only: bool = False,
+        output_dir: Optional[str] = None,
+        facebook_api_url: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        audio_mode: str = AUDIO_MODE_MP3,
+        session: Optional[str] = None,
+    ):
+        self.urls = list(urls)
+        # All items of a batch share one fair share of the bandwidth
+        self.session = session or uuid.uuid4().hex
+        self.quality = quality
+        self.audio_only = audio_only
+        self.audio_mode = audio_mode
+        self.output_dir = output_dir
+        self.facebook_api_url = facebook_api_url
+        self.concurrency = max(
+            1,
+            concurrency
+            or env_int("VIDEO_DOWNLOADER_BATCH_CONCURRENCY", DEFAULT_BATCH_CONCURRENCY),
+        )
+        self.items: list[dict] = []
+        self.errors: list[str] = []
+        self.finished = threading.Event()
+        self._slots = threading.Semaphore(self.concurrency)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "BatchRun":
+        """Start expanding and downloading in the background."""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def done(self) -> bool:
+        return self.finished.is_set()
+
+    def summary(self) -> dict:
+        """Count items per status."""
+        counts: dict[str, int] = {}
+        for item in list(self.items):
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        return counts
+
+    def _expand(self) -> None:
+        seen = set()
+        for url in self.urls:
+            if is_playlist_url(url):
+                entries, error = expand_playlist(url)
+                if error:
+                    self.errors.append(f"{url}: {error}")
+            else:
+                entries = [{"url": url, "title": None}]
+            for entry in entries:
+                if entry["url"] in seen or len(self.items) >= MAX_BATCH_ITEMS:
+                    continue
+                seen.add(entry["url"])
+                self.items.append(
+                    {
+                        "url": entry["url"],
+                        "title": entry.get("title"),
+                        "status": ITEM_PENDING,
+                        "progress": 0.0,
+                        "file_path": None,
+                        "error": None,
+                    }
+                )
+
+    def _fetch_title(self, item: dict) -> None:
+        if item["title"]:
+            return
+        info, _ = get_video_info(item["url"])
+        if info:
+            item["title"] = info.get("title")
+
+    def _job_done(self, item: dict, job) -> None:
+        # Also runs for jobs cancelled while queued, which never reach _download
+        if item["status"] in (ITEM_QUEUED, ITEM_DOWNLOADING):
+            item["status"] = ITEM_ERROR
+            item["error"] = job.error or "Download produced no file"
+        self._slots.release()
+
+    def _download(self, item: dict, progress_hook=None) -> tuple[str, Optional[str]]:
+        item["status"] = ITEM_DOWNLOADING
+
+        def hook(event: dict) -> None:
+            total = event.get("total_bytes") or event.get("total_bytes_estimate")
+            if event.get("status") == "downloading" and total:
+                item["progress"] = min(1.0, event.get("downloaded_bytes", 0) / total)
+            if progress_hook:
+                progress_hook(event)
+
+        try:
+            file_path, error = download_media(
+                item["url"],
+                quality=self.quality,
+                audio_only=self.audio_only,
+                audio_mode=self.audio_mode,
+                output_dir=self.output_dir,
+                facebook_api_url=self.facebook_api_url,
+                progress_hook=hook,
+                session=self.session,
+            )
+        except Exception as e:
+            file_path, error = None, str(e)
+
+        if error or not file_path:
+            item["status"] = ITEM_ERROR
+            item["error"] = error or "Download produced no file"
+        else:
+            item["status"] = ITEM_DONE
+            item["progress"] = 1.0
+            item["file_path"] = file_path
+        return file_path, error
+
+    def _run(self) -> None:
+        try:
+            self._expand()
+            job_queue = get_job_queue()
+            with ThreadPoolExecutor(max_workers=self.concurrency) as info_pool:
+                for item in self.items:
+                    info_pool.submit(self._fetch_title, item)
+                for item in self.items:
+                    self._slots.acquire()
+                    item["status"] = ITEM_QUEUED
+                    job_queue.submit(
+                        self._download,
+                        platform=detect_platform(item["url"]),
+                        priority=PRIORITY_BATCH,
+                        label=item["url"],
+                        on_done=lambda job, item=item: self._job_done(item, job),
+                        item=item,
+                    )
+                # Wait for the last downloads before reporting completion
+                for _ in range(self.concurrency):
+                    self._slots.acquire()
+        finally:
+            self.finished.set()
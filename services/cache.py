@@ -0,0 +1,117 @@
+"""Shared on-disk cache for video metadata, backed by SQLite."""
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from services.config import env_float, env_int
+from services.state import StateBackend, get_state_backend
+
+
+DEFAULT_INFO_TTL = 3600.0
+DEFAULT_INFO_MAX_ENTRIES = 5000
+
+
+class MetadataCache:
+    """
+    Key/value store for extracted video metadata with TTL and LRU eviction.
+
+    Entries expire `ttl` seconds after they were stored. When more than
+    `max_entries` rows exist, the least recently read ones are dropped.
+    Every call opens its own connection so the cache can be shared between
+    Streamlit sessions, threads, processes and replicas (services.state).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = DEFAULT_INFO_TTL,
+        max_entries: int = DEFAULT_INFO_MAX_ENTRIES,
+        backend: Optional[StateBackend] = None,
+    ):
+        self.backend = backend or get_state_backend()
+        self.path = str(path or self.backend.database("metadata"))
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed)"
+            )
+
+    def _connect(self):
+        return self.backend.connect(self.path)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached value for key, or None if missing or expired."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created FROM metadata WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    conn.execute("DELETE FROM metadata WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE metadata SET accessed = ? WHERE key = ?", (now, key)
+            )
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict) -> None:
+        """Store value under key and evict old entries if over capacity."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO metadata (key, value, created, accessed)"
+                " VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            conn.execute(
+                "DELETE FROM metadata WHERE created < ?", (now - self.ttl,)
+            )
+            conn.execute(
+                "DELETE FROM metadata WHERE key IN ("
+                " SELECT key FROM metadata ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key: str) -> None:
+        """Remove key from the cache."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM metadata WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+
+
+_metadata_cache: Optional[MetadataCache] = None
+_metadata_cache_lock = threading.Lock()
+
+
+def get_metadata_cache() -> MetadataCache:
+    """Return the process-wide metadata cache, creating it on first use."""
+    global _metadata_cache
+    with _metadata_cache_lock:
+        if _metadata_cache is None:
+            _metadata_cache = MetadataCache(
+                ttl=env_float("VIDEO_DOWNLOADER_INFO_TTL", DEFAULT_INFO_TTL),
+                max_entries=env_int(
+                    "VIDEO_DOWNLOADER_INFO_MAX_ENTRIES", DEFAULT_INFO_MAX_ENTRIES
+                ),
+            )
+        return _metadata_cache
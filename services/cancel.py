@@ -0,0 +1,159 @@
+"""Cooperative cancellation for downloads and their ffmpeg steps."""
+
+import os
+import signal
+import subprocess
+import threading
+from typing import Callable, Iterator, Optional
+
+
+class DownloadCancelled(Exception):
+    """Raised inside a download once its cancel token has been cancelled."""
+
+    def __init__(self, message: str = "Download cancelled"):
+        super().__init__(message)
+
+
+class CancelToken:
+    """
+    Flag shared between whoever may abandon a download and the code running it.
+
+    Download code checks it (raise_if_cancelled) at safe points such as
+    progress callbacks, and registers callbacks with on_cancel for work that
+    cannot check, e.g. killing an ffmpeg process.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: list[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """Cancel once; registered callbacks run in the calling thread."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise DownloadCancelled()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until cancelled or timeout; return True if cancelled."""
+        return self._event.wait(timeout)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Call callback when the token is cancelled (now, if it already is).
+
+        Returns a function that unregisters the callback.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                registered = True
+            else:
+                registered = False
+        if not registered:
+            callback()
+            return lambda: None
+
+        def remove() -> None:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+        return remove
+
+
+def _proc_children(parent: int) -> Iterator[tuple[int, str]]:
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                # The command name may contain spaces; the ppid follows its ")"
+                ppid = int(f.read().rsplit(b")", 1)[1].split()[1])
+            if ppid != parent:
+                continue
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode("utf-8", "replace")
+        except (OSError, ValueError, IndexError):
+            continue
+        yield int(entry), cmdline
+
+
+def _listed_children(parent: int) -> Iterator[tuple[int, str]]:
+    if os.name == "nt":
+        command = [
+            "powershell",
+            "-NoProfile",
+            "-Command",
+            f"Get-CimInstance Win32_Process -Filter 'ParentProcessId={parent}' |"
+            ' ForEach-Object { "$($_.ProcessId) $($_.ParentProcessId) $($_.CommandLine)" }',
+        ]
+    else:
+        # -ww: never cut command lines to the terminal width (COLUMNS)
+        command = ["ps", "-ww", "-A", "-o", "pid=,ppid=,args="]
+    try:
+        output = subprocess.run(
+            command, capture_output=True, text=True, errors="replace", timeout=10
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return
+    for line in output.splitlines():
+        fields = line.split(None, 2)
+        try:
+            pid, ppid = int(fields[0]), int(fields[1])
+        except (IndexError, ValueError):
+            continue
+        if ppid == parent:
+            yield pid, fields[2] if len(fields) > 2 else ""
+
+
+def child_processes() -> Iterator[tuple[int, str]]:
+    """
+    Yield (pid, command line) of this process's children.
+
+    Read from /proc where it exists (Linux), else from `ps` (macOS, BSD)
+    or CIM (Windows).
+    """
+    parent = os.getpid()
+    if os.path.isdir("/proc"):
+        return _proc_children(parent)
+    return _listed_children(parent)
+
+
+def kill_child_processes(match: str) -> int:
+    """
+    Kill child processes of this process whose command line contains match.
+
+    Used to stop the ffmpeg runs yt-dlp starts for a download (merges,
+    conversions, clip sections), which are identified by the download's
+    output path in their arguments. Returns the number of processes killed.
+    """
+    if not match:
+        return 0
+    killed = 0
+    for pid, cmdline in child_processes():
+        if match not in cmdline:
+            continue
+        try:
+            # On Windows, os.kill terminates the process whatever the signal
+            os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+        except OSError:
+            continue
+        killed += 1
+    return killed
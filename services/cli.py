@@ -0,0 +1,174 @@
+"""Command-line entry point for scripted downloads without a browser.
+
+Examples:
+    python -m services.cli info "https://youtu.be/..."
+    python -m services.cli download "https://youtu.be/..." --quality 720p
+    python -m services.cli batch links.txt --audio --concurrency 8
+    python -m services.cli serve --port 8502
+"""
+
+import argparse
+import json
+import sys
+
+from services.api import DEFAULT_API_HOST, DEFAULT_API_PORT, serve
+from services.audio import AUDIO_MODE_FAST, AUDIO_MODE_MP3
+from services.batch import BatchRun, parse_batch_input
+from services.config import get_work_dir
+from services.downloader import download_media, get_video_info, normalize_video_url
+from services.formats import QUALITIES
+from services.progress import ProgressChannel, format_eta, format_speed
+
+
+def _print_json(payload) -> None:
+    print(json.dumps(payload, indent=2))
+
+
+def _progress_printer(label: str):
+    """Return a progress hook that prints to stderr a few times per second."""
+    channel = ProgressChannel()
+
+    def show(progress: dict) -> None:
+        if progress["status"] == "downloading" and progress["fraction"] is not None:
+            line = f"{label}: {int(100 * progress['fraction'])}%"
+            if progress["speed"]:
+                line += f" {format_speed(progress['speed'])}"
+            if progress["eta"] is not None:
+                line += f" ETA {format_eta(progress['eta'])}"
+            print(f"\r{line}\033[K", end="", file=sys.stderr, flush=True)
+        elif progress["status"] == "finished":
+            print(f"\r{label}: processing...\033[K", file=sys.stderr, flush=True)
+
+    channel.subscribe(show)
+    return channel.publish
+
+
+def cmd_info(args) -> int:
+    info, error = get_video_info(normalize_video_url(args.url.strip()))
+    if error:
+        _print_json({"error": error})
+        return 1
+    _print_json(info)
+    return 0
+
+
+def cmd_download(args) -> int:
+    url = normalize_video_url(args.url.strip())
+    file_path, error = download_media(
+        url,
+        quality=args.quality,
+        audio_only=args.audio or args.audio_fast,
+        audio_mode=AUDIO_MODE_FAST if args.audio_fast else AUDIO_MODE_MP3,
+        output_dir=args.output_dir or str(get_work_dir()),
+        facebook_api_url=args.facebook_api_url,
+        progress_hook=None if args.quiet else _progress_printer(url),
+        clip_start=args.start,
+        clip_end=args.end,
+        exact_cut=args.exact_cut,
+    )
+    if error:
+        _print_json({"url": url, "error": error})
+        return 1
+    _print_json({"url": url, "file_path": file_path})
+    return 0
+
+
+def cmd_batch(args) -> int:
+    if args.file == "-":
+        text = sys.stdin.read()
+    else:
+        with open(args.file, encoding="utf-8") as f:
+            text = f.read()
+    urls = parse_batch_input(text)
+    if not urls:
+        _print_json({"error": "No valid links found"})
+        return 1
+
+    batch = BatchRun(
+        urls,
+        quality=args.quality,
+        audio_only=args.audio or args.audio_fast,
+        audio_mode=AUDIO_MODE_FAST if args.audio_fast else AUDIO_MODE_MP3,
+        output_dir=args.output_dir or str(get_work_dir()),
+        facebook_api_url=args.facebook_api_url,
+        concurrency=args.concurrency,
+    ).start()
+    while not batch.finished.wait(1.0):
+        if not args.quiet:
+            counts = batch.summary()
+            print(
+                f"\r{counts.get('done', 0)} done, {counts.get('error', 0)} failed, "
+                f"{len(batch.items)} total",
+                end="",
+                file=sys.stderr,
+                flush=True,
+            )
+    if not args.quiet:
+        print(file=sys.stderr)
+    _print_json({"items": batch.items, "errors": batch.errors})
+    return 0 if all(item["status"] == "done" for item in batch.items) else 1
+
+
+def cmd_serve(args) -> int:
+    serve(args.host, args.port, args.facebook_api_url)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="video-downloader", description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    info = sub.add_parser("info", help="print video metadata as JSON")
+    info.add_argument("url")
+    info.set_defaults(func=cmd_info)
+
+    def add_download_options(p):
+        p.add_argument("--quality", choices=QUALITIES, default="best")
+        p.add_argument("--audio", action="store_true", help="download audio as MP3")
+        p.add_argument(
+            "--audio-fast",
+            action="store_true",
+            help="download the original audio track (m4a/opus) without converting",
+        )
+        p.add_argument("--output-dir", help="where to save files (default: work dir)")
+        p.add_argument("--facebook-api-url", help="optional Facebook API fallback")
+        p.add_argument("--quiet", action="store_true", help="no progress on stderr")
+
+    download = sub.add_parser("download", help="download one video")
+    download.add_argument("url")
+    add_download_options(download)
+    download.add_argument("--start", help="download a clip starting here, e.g. 90 or 1:30")
+    download.add_argument(
+        "--end", help="download a clip ending here (starts at the link's t= if no --start)"
+    )
+    download.add_argument(
+        "--exact-cut",
+        action="store_true",
+        help="re-encode the clip to cut exactly, instead of at keyframes",
+    )
+    download.set_defaults(func=cmd_download)
+
+    batch = sub.add_parser("batch", help="download every link in a file ('-' for stdin)")
+    batch.add_argument("file")
+    batch.add_argument("--concurrency", type=int, default=None)
+    add_download_options(batch)
+    batch.set_defaults(func=cmd_batch)
+
+    server = sub.add_parser("serve", help="run the HTTP API")
+    server.add_argument("--host", default=DEFAULT_API_HOST)
+    server.add_argument("--port", type=int, default=DEFAULT_API_PORT)
+    server.add_argument(
+        "--facebook-api-url", help="optional Facebook API fallback for every request"
+    )
+    server.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""Time-range clips: download only part of a video."""
+
+import re
+import shutil
+from typing import Optional, Union
+from urllib.parse import parse_qsl, urlparse
+
+
+# Query (or fragment) parameters that give a start time in a video link
+TIME_PARAMS = ("t", "start", "time_continue")
+
+_UNITS_RE = re.compile(r"^(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m)?(?:(\d+(?:\.\d+)?)s?)?$")
+
+
+def parse_timestamp(value: Union[str, float, int, None]) -> Optional[float]:
+    """
+    Parse a time into seconds, or return None if it is not one.
+
+    Accepts numbers and strings like "90", "90.5", "90s", "1m30s",
+    "1h2m3s", "1:30" and "01:02:03.5".
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value >= 0 else None
+    if not isinstance(value, str):
+        return None
+    text = value.strip().lower()
+    if not text:
+        return None
+    if ":" in text:
+        parts = text.split(":")
+        if len(parts) > 3 or not all(re.fullmatch(r"\d+(?:\.\d+)?", p) for p in parts):
+            return None
+        seconds = 0.0
+        for part in parts:
+            seconds = seconds * 60 + float(part)
+        return seconds
+    match = _UNITS_RE.match(text)
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds = (float(g) if g else 0.0 for g in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def format_timestamp(seconds: float) -> str:
+    """Format seconds as "m:ss" or "h:mm:ss", keeping fractions."""
+    whole, fraction = divmod(seconds, 1)
+    hours, rest = divmod(int(whole), 3600)
+    minutes, secs = divmod(rest, 60)
+    text = f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+    if fraction:
+        text += f"{fraction:.3f}".rstrip("0")[1:]
+    return text
+
+
+def url_start_time(url: str) -> Optional[float]:
+    """Return the start time given in a link (`?t=1m30s`, `#t=90`), if any."""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    for part in (parsed.query, parsed.fragment):
+        for key, value in parse_qsl(part):
+            if key.lower() in TIME_PARAMS:
+                seconds = parse_timestamp(value)
+                if seconds:
+                    return seconds
+    return None
+
+
+def clips_supported() -> bool:
+    """Clips are cut by ffmpeg; without it yt-dlp would fetch whole videos."""
+    return shutil.which("ffmpeg") is not None
+
+
+class Clip:
+    """
+    The part of a video from `start` to `end` seconds (None: to the end).
+
+    yt-dlp hands sections to ffmpeg, which seeks in the stream: progressive
+    files are read with HTTP Range requests and HLS/DASH only from the
+    fragments covering the range, so a 30 second clip of a 3 hour stream
+    costs about 30 seconds of bandwidth and disk.
+
+    By default the clip is stream-copied, which cuts at keyframes: it may
+    start slightly before `start`. With exact=True it is re-encoded so it
+    starts and ends at the requested times; this is slower.
+    """
+
+    def __init__(self, start: float = 0.0, end: Optional[float] = None, exact: bool = False):
+        if start < 0:
+            raise ValueError("Clip start cannot be negative")
+        if end is not None and end <= start:
+            raise ValueError("Clip end must be after its start")
+        self.start = start
+        self.end = end
+        self.exact = exact
+
+    def key(self) -> str:
+        """Identify the clip in result cache keys."""
+        end = "end" if self.end is None else f"{self.end:g}"
+        return f"clip={self.start:g}-{end}{':exact' if self.exact else ''}"
+
+    def suffix(self) -> str:
+        """Filename part that keeps clips apart from each other and the full video."""
+        end = "end" if self.end is None else f"{self.end:g}"
+        suffix = f"{self.start:g}-{end}s{'-exact' if self.exact else ''}"
+        return suffix.replace(".", "_")
+
+    def ydl_options(self) -> dict:
+        """yt-dlp options that download only this section."""
+        from yt_dlp.utils import download_range_func
+
+        end = float("inf") if self.end is None else self.end
+        return {
+            "download_ranges": download_range_func(None, [(self.start, end)]),
+            "force_keyframes_at_cuts": self.exact,
+        }
+
+
+def make_clip(
+    start: Union[str, float, None] = None,
+    end: Union[str, float, None] = None,
+    exact: bool = False,
+) -> Optional[Clip]:
+    """
+    Build a Clip from user input, or return None for the whole video.
+
+    Raises ValueError for times that cannot be parsed or an empty range.
+    """
+    start_seconds = parse_timestamp(start) if start not in (None, "") else 0.0
+    end_seconds = parse_timestamp(end) if end not in (None, "") else None
+    if start_seconds is None:
+        raise ValueError(f"Invalid clip start: {start}")
+    if end not in (None, "") and end_seconds is None:
+        raise ValueError(f"Invalid clip end: {end}")
+    if not start_seconds and end_seconds is None:
+        return None
+    return Clip(start_seconds, end_seconds, exact)
@@ -0,0 +1,36 @@
+"""Shared paths and tunables for the download services."""
+
+import os
+import tempfile
+from pathlib import Path
+
+
+def get_work_dir() -> Path:
+    """
+    Return the directory where downloads, caches and indexes are kept.
+
+    Defaults to `<tempdir>/video_downloader` and can be overridden with the
+    VIDEO_DOWNLOADER_DIR environment variable.
+    """
+    base = os.environ.get("VIDEO_DOWNLOADER_DIR") or os.path.join(
+        tempfile.gettempdir(), "video_downloader"
+    )
+    path = Path(base)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment, falling back to default."""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment, falling back to default."""
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
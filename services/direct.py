@@ -0,0 +1,282 @@
+"""Multi-connection downloader for direct media URLs using HTTP Range requests."""
+
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional
+
+from services.config import env_int
+
+if TYPE_CHECKING:
+    import requests
+
+
+DEFAULT_CONNECTIONS = 4
+DEFAULT_BUFFER_KB = 1024
+DEFAULT_MIN_SEGMENT_MB = 4
+DEFAULT_TIMEOUT = (10, 60)
+
+RANGE_STATE_SUFFIX = ".ranges"
+# Seconds between checkpoints of range offsets while downloading
+RANGE_STATE_INTERVAL = 1.0
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> "requests.Session":
+    """
+    Return the process-wide pooled HTTP session.
+
+    requests is imported on first use, keeping it out of app start-up.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+
+def _parse_total_size(content_range: str) -> Optional[int]:
+    """Extract the full size from a `bytes 0-0/12345` Content-Range header."""
+    match = re.match(r"bytes\s+\d+-\d+/(\d+)", content_range or "")
+    return int(match.group(1)) if match else None
+
+
+def split_ranges(total: int, parts: int, min_size: int) -> list[tuple[int, int]]:
+    """Split [0, total) into at most `parts` inclusive byte ranges of >= min_size."""
+    if total <= 0:
+        return []
+    parts = max(1, min(parts, total // max(1, min_size) or 1))
+    size = -(-total // parts)
+    return [(start, min(start + size, total) - 1) for start in range(0, total, size)]
+
+
+class RangedDownloader:
+    """
+    Fetch a URL with several parallel Range requests into one preallocated file.
+
+    Segments are written with positional writes so workers never share a file
+    offset. Servers that do not answer a probe range with 206 Partial Content
+    are downloaded as a single stream instead.
+
+    before_request(url), if given, is called before every HTTP request, e.g.
+    to wait for a per-host rate limit.
+    """
+
+    def __init__(
+        self,
+        session: Optional["requests.Session"] = None,
+        connections: Optional[int] = None,
+        buffer_size: Optional[int] = None,
+        min_segment_size: Optional[int] = None,
+        timeout=DEFAULT_TIMEOUT,
+        before_request: Optional[Callable[[str], None]] = None,
+    ):
+        self.session = session or get_http_session()
+        self.connections = max(
+            1,
+            connections
+            or env_int("VIDEO_DOWNLOADER_DIRECT_CONNECTIONS", DEFAULT_CONNECTIONS),
+        )
+        self.buffer_size = buffer_size or (
+            env_int("VIDEO_DOWNLOADER_DIRECT_BUFFER_KB", DEFAULT_BUFFER_KB) * 1024
+        )
+        self.min_segment_size = min_segment_size or (
+            env_int("VIDEO_DOWNLOADER_DIRECT_MIN_SEGMENT_MB", DEFAULT_MIN_SEGMENT_MB)
+            * 1024
+            * 1024
+        )
+        self.timeout = timeout
+        self.before_request = before_request
+
+    def _get(self, url: str, **kwargs):
+        if self.before_request:
+            self.before_request(url)
+        return self.session.get(url, stream=True, timeout=self.timeout, **kwargs)
+
+    def probe(self, url: str) -> tuple[Optional[int], bool]:
+        """Return (total_size, supports_ranges) for url."""
+        with self._get(url, headers={"Range": "bytes=0-0"}) as r:
+            r.raise_for_status()
+            if r.status_code == 206:
+                total = _parse_total_size(r.headers.get("Content-Range"))
+                return total, total is not None
+            length = r.headers.get("Content-Length")
+            return (int(length) if length else None), False
+
+    def download(self, url: str, dest_path: str, progress_hook=None) -> int:
+        """
+        Download url to dest_path and return the number of bytes written.
+
+        progress_hook receives yt-dlp style dicts. Raises on HTTP errors or
+        short reads; the caller owns cleanup of dest_path.
+
+        Ranged downloads keep their per-range offsets in `<dest_path>.ranges`
+        while running. If that file is present and the size still matches,
+        an interrupted download continues where it stopped, even from a
+        freshly signed URL for the same media.
+        """
+        total, ranged = self.probe(url)
+        if not ranged:
+            return self._download_single(url, dest_path, total, progress_hook)
+        state_path = dest_path + RANGE_STATE_SUFFIX
+        ranges = _load_range_state(state_path, dest_path, total)
+        if ranges is None:
+            parts = split_ranges(total or 0, self.connections, self.min_segment_size)
+            if len(parts) < 2:
+                return self._download_single(url, dest_path, total, progress_hook)
+            ranges = [[start, end, start] for start, end in parts]
+            with open(dest_path, "wb") as f:
+                f.truncate(total)
+        return self._download_ranges(
+            url, dest_path, total, ranges, progress_hook, state_path
+        )
+
+    def _report(self, progress_hook, downloaded: int, total: Optional[int]) -> None:
+        if progress_hook:
+            progress_hook(
+                {
+                    "status": "downloading",
+                    "downloaded_bytes": downloaded,
+                    "total_bytes": total or None,
+                }
+            )
+
+    def _download_single(self, url, dest_path, total, progress_hook) -> int:
+        written = 0
+        with self._get(url) as r:
+            r.raise_for_status()
+            total = total or int(r.headers.get("Content-Length", 0) or 0)
+            with open(dest_path, "wb", buffering=self.buffer_size) as f:
+                for chunk in r.iter_content(chunk_size=self.buffer_size):
+                    if chunk:
+                        f.write(chunk)
+                        written += len(chunk)
+                        self._report(progress_hook, written, total)
+        return written
+
+    def _download_ranges(
+        self, url, dest_path, total, ranges, progress_hook, state_path
+    ) -> int:
+        lock = threading.Lock()
+        progress = {
+            "bytes": sum(offset - start for start, _, offset in ranges),
+            "saved": time.monotonic(),
+        }
+        # Set when any range fails (or the hook raises), so the others stop too
+        failed = threading.Event()
+
+        def fetch(byte_range: list) -> None:
+            try:
+                fetch_range(byte_range)
+            except BaseException:
+                failed.set()
+                raise
+
+        def fetch_range(byte_range: list) -> None:
+            start, end, offset = byte_range
+            if offset > end:
+                return
+            headers = {"Range": f"bytes={offset}-{end}"}
+            with self._get(url, headers=headers) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise IOError(f"Server ignored range {offset}-{end}")
+                fd = os.open(dest_path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+                try:
+                    for chunk in r.iter_content(chunk_size=self.buffer_size):
+                        if failed.is_set():
+                            raise IOError("Download stopped")
+                        if not chunk:
+                            continue
+                        if offset + len(chunk) > end + 1:
+                            raise IOError(f"Server sent too much data for {start}-{end}")
+                        _pwrite(fd, chunk, offset)
+                        offset += len(chunk)
+                        with lock:
+                            byte_range[2] = offset
+                            progress["bytes"] += len(chunk)
+                            downloaded = progress["bytes"]
+                            now = time.monotonic()
+                            if now - progress["saved"] >= RANGE_STATE_INTERVAL:
+                                progress["saved"] = now
+                                _save_range_state(state_path, total, ranges)
+                        self._report(progress_hook, downloaded, total)
+                finally:
+                    os.close(fd)
+            if offset != end + 1:
+                raise IOError(f"Incomplete range {start}-{end}: got {offset - start} bytes")
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                for future in [pool.submit(fetch, r) for r in ranges]:
+                    future.result()
+        except BaseException:
+            with lock:
+                _save_range_state(state_path, total, ranges)
+            raise
+        try:
+            os.remove(state_path)
+        except OSError:
+            pass
+        return total
+
+
+def _save_range_state(state_path: str, total: int, ranges: list) -> None:
+    """Atomically write the offsets reached in each range."""
+    tmp_path = state_path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"total": total, "ranges": ranges}, f)
+        os.replace(tmp_path, state_path)
+    except OSError:
+        pass
+
+
+def _load_range_state(state_path: str, dest_path: str, total: int) -> Optional[list]:
+    """Return the saved [start, end, offset] ranges if they fit this download."""
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        if state.get("total") != total or os.path.getsize(dest_path) != total:
+            return None
+        ranges = [[int(start), int(end), int(offset)] for start, end, offset in state["ranges"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    covered = 0
+    for start, end, offset in sorted(ranges):
+        if start != covered or not start <= offset <= end + 1:
+            return None
+        covered = end + 1
+    return ranges if covered == total else None
+
+
+def _pwrite(fd: int, data: bytes, offset: int) -> None:
+    """Write all of data at offset without moving a shared file position."""
+    if hasattr(os, "pwrite"):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    else:
+        # Windows: each worker has its own descriptor, so seeking is safe
+        os.lseek(fd, offset, os.SEEK_SET)
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
@@ -1,15 +1,69 @@
 """Video download service using yt-dlp and optional Facebook API fallback."""
 
+import copy
+import hashlib
 import os
 import re
 import tempfile
+import threading
+import time
 from pathlib import Path
 from typing import Optional
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
-import yt_dlp
-import requests
+from services.audio import (
+    AUDIO_MODE_MP3,
+    DEFAULT_MP3_BITRATE,
+    get_mp3_transcoder,
+    plan_audio_formats,
+)
+from services.bandwidth import get_bandwidth_scheduler
+from services.cache import get_metadata_cache
+from services.cancel import (
+    CancelToken,
+    DownloadCancelled,
+    kill_child_processes,
+)
+from services.clips import Clip, clips_supported, make_clip, url_start_time
+from services.config import env_float
+from services.direct import RANGE_STATE_SUFFIX, RangedDownloader
+from services.facebook_api import configured_facebook_api_url, get_facebook_api_client
+from services.formats import plan_stats, plan_video_formats
+from services.fragments import fragment_options
+from services.infostore import get_info_store
+from services.jobs import PRIORITY_BACKGROUND, get_job_queue
+from services.metrics import (
+    MERGE_POSTPROCESSORS,
+    OUTCOME_CACHED,
+    OUTCOME_CANCELLED,
+    OUTCOME_ERROR,
+    OUTCOME_OK,
+    PHASE_EXTRACT,
+    PHASE_MERGE,
+    PHASE_POSTPROCESS,
+    PHASE_SELECT_FORMAT,
+    PHASE_TRANSFER,
+    JobTrace,
+)
+from services.journal import (
+    DEFAULT_PARTIAL_MAX_AGE,
+    JOURNAL_HEARTBEAT_INTERVAL,
+    collect_partial_files,
+    get_download_journal,
+)
+from services.resolve import Backend, get_resolver
+from services.results import get_result_store, result_key
+from services.singleflight import get_single_flight
 
+# Intermediate files yt-dlp leaves next to `<stem>.<ext>`: .part files and
+# their fragments, .ytdl resume state, .temp merges and per-format .f<id> files
+_PARTIAL_FILE_RE = re.compile(r"\.(part(-Frag\d+)?|ytdl|temp\.\w+)$|^\.f[\w-]+\.\w+$")
+
+# Resolution backends for Facebook videos (see services.resolve)
+BACKEND_FACEBOOK_API = "facebook_api"
+BACKEND_YTDLP = "yt-dlp"
+
+CLIP_NEEDS_FFMPEG = "Clip downloads need ffmpeg, which is not installed"
 
 # Supported platform URL patterns
 YOUTUBE_PATTERNS = [
@@ -73,39 +127,46 @@ def normalize_video_url(url: str) -> str:
     )
 
 
-def normalize_video_url(url: str) -> str:
+def canonical_video_key(url: str) -> str:
     """
-    Normalize supported video URLs before processing.
+    Build a stable cache key of the form `<platform>:<video id>`.
 
-    For YouTube watch URLs containing a playlist index, remove only the
-    `index` parameter so single-video extraction stays stable.
+    Different URL spellings of the same video (watch, youtu.be, shorts,
+    tracking params) map to the same key. Playlist ids are kept in the key
+    because they change what extraction returns. Unknown URL shapes fall back
+    to a hash of the normalized URL.
     """
-    if not url:
-        return url
-
-    parsed = urlparse(url)
+    normalized = normalize_video_url(url.strip())
+    parsed = urlparse(normalized)
     host = parsed.netloc.lower()
+    path = parsed.path
+    query = dict(parse_qsl(parsed.query))
+    platform = detect_platform(normalized)
 
-    if "youtube.com" not in host:
-        return url
-
-    query_items = parse_qsl(parsed.query, keep_blank_values=True)
-    filtered_items = [(k, v) for k, v in query_items if k.lower() != "index"]
-
-    if len(filtered_items) == len(query_items):
-        return url
+    video_id = None
+    if platform == "youtube":
+        if "youtu.be" in host:
+            video_id = path.strip("/").split("/")[0] or None
+        elif query.get("v"):
+            video_id = query["v"]
+        else:
+            match = re.match(r"^/(?:shorts|embed|live|v)/([\w-]+)", path)
+            if match:
+                video_id = match.group(1)
+        if video_id and query.get("list"):
+            video_id = f"{video_id}:list={query['list']}"
+    elif platform == "facebook":
+        if query.get("v"):
+            video_id = query["v"]
+        else:
+            match = re.search(r"/(?:videos|reel|reels)/(?:[^/]+/)?(\d+)", path)
+            if match:
+                video_id = match.group(1)
 
-    normalized_query = urlencode(filtered_items, doseq=True)
-    return urlunparse(
-        (
-            parsed.scheme,
-            parsed.netloc,
-            parsed.path,
-            parsed.params,
-            normalized_query,
-            parsed.fragment,
-        )
-    )
+    if not video_id:
+        digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:20]
+        return f"{platform}:url-{digest}"
+    return f"{platform}:{video_id}"
 
 
 def detect_platform(url: str) -> str:
@@ -124,168 +185,576 @@ def get_yt_dlp_format(quality: str) -> str:
     """Get yt-dlp format selector string for the given quality."""
     quality = quality.lower()
     formats = {
-        "best": "best[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
-        "worst": "worst[ext=mp4]+bestaudio[ext=m4a]/worst[ext=mp4]/worst",
-        "360p": "best[height<=360][ext=mp4]+bestaudio[ext=m4a]/best[height<=360][ext=mp4]/best[height<=360]",
-        "480p": "best[height<=480][ext=mp4]+bestaudio[ext=m4a]/best[height<=480][ext=mp4]/best[height<=480]",
-        "720p": "best[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]/best[height<=720]",
-        "1080p": "best[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[height<=1080][ext=mp4]/best[height<=1080]",
+        "best": "bv[ext=mp4]+ba[ext=m4a]/b[ext=mp4]/bv+ba/b",
+        "worst": "wv[ext=mp4]+wa[ext=m4a]/w[ext=mp4]/wv+wa/w",
+        "360p": "bv[height<=360][ext=mp4]+ba[ext=m4a]/b[height<=360][ext=mp4]/bv[height<=360]+ba/b[height<=360]",
+        "480p": "bv[height<=480][ext=mp4]+ba[ext=m4a]/b[height<=480][ext=mp4]/bv[height<=480]+ba/b[height<=480]",
+        "720p": "bv[height<=720][ext=mp4]+ba[ext=m4a]/b[height<=720][ext=mp4]/bv[height<=720]+ba/b[height<=720]",
+        "1080p": "bv[height<=1080][ext=mp4]+ba[ext=m4a]/b[height<=1080][ext=mp4]/bv[height<=1080]+ba/b[height<=1080]",
     }
     return formats.get(quality, formats["best"])
 
 
+def _find_video_file(filename: str, output_dir: str) -> str:
+    """Locate the merged/converted video, which may have a different extension."""
+    if os.path.exists(filename):
+        return filename
+    base = Path(filename).stem
+    for ext in [".mp4", ".mkv", ".webm"]:
+        alt_path = os.path.join(output_dir, base + ext)
+        if os.path.exists(alt_path):
+            return alt_path
+    return filename
+
+
+def _find_audio_file(filename: str, output_dir: str) -> str:
+    """Locate the extracted audio file, preferring the .mp3 produced by ffmpeg."""
+    # The audio will have .mp3 extension after post-processing
+    base = Path(filename).stem
+    mp3_path = os.path.join(output_dir, base + ".mp3")
+    if os.path.exists(mp3_path):
+        return mp3_path
+    # Fallback: check if file exists with original extension
+    if os.path.exists(filename):
+        return filename
+    return mp3_path
+
+
+def _final_filepath(info: Optional[dict]) -> Optional[str]:
+    """Return the path yt-dlp reports after post-processing, if it exists."""
+    for download in (info or {}).get("requested_downloads") or []:
+        path = download.get("filepath")
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def _lookup_result(cache_key: Optional[str], progress_hook=None) -> Optional[str]:
+    """Return a previously produced file for cache_key, if one is still on disk."""
+    if not cache_key:
+        return None
+    try:
+        cached_path = get_result_store().lookup(cache_key)
+    except Exception:
+        return None
+    if cached_path and progress_hook:
+        progress_hook({"status": "finished", "filename": cached_path})
+    return cached_path
+
+
+def _remember_result(cache_key: Optional[str], video_key: str, file_path: str) -> None:
+    """Index a finished file so identical requests can reuse it."""
+    if not cache_key:
+        return
+    try:
+        get_result_store().add(cache_key, video_key, file_path)
+    except Exception:
+        pass
+
+
+def _record_output(trace: JobTrace, file_path: str) -> None:
+    """Add the size of a produced file to the trace."""
+    try:
+        trace.add_bytes(os.path.getsize(file_path))
+    except OSError:
+        pass
+
+
+def _load_info(
+    url: str, info_handle: Optional[str], ydl_opts: dict
+) -> tuple[Optional[dict], bool]:
+    """
+    Return (info, reused) for url without downloading anything.
+
+    The preview's stored extraction is used when info_handle is still
+    valid and was stored for this video; otherwise the URL is extracted
+    once here.
+    """
+    info = get_info_store().get(info_handle, canonical_video_key(url))
+    if info:
+        return copy.deepcopy(info), True
+    import yt_dlp
+
+    extract_opts = {
+        k: v for k, v in ydl_opts.items() if k not in ("format", "postprocessors")
+    }
+    with yt_dlp.YoutubeDL(extract_opts) as ydl:
+        return ydl.extract_info(url, download=False), False
+
+
+def _remove_partial_files(stem: str) -> None:
+    """Delete the intermediate files yt-dlp writes next to `<stem>.<ext>`."""
+    directory = os.path.dirname(stem) or "."
+    prefix = os.path.basename(stem) + "."
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(prefix) and _PARTIAL_FILE_RE.search(name[len(prefix) - 1:]):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def _start_trace(
+    trace: Optional[JobTrace], kind: str, url: str, quality: str
+) -> tuple[JobTrace, bool]:
+    """Return (trace, owned); a trace created here is finished by the caller."""
+    if trace is not None:
+        return trace, False
+    return JobTrace(kind, detect_platform(url), quality, url), True
+
+
+def _finish_trace(
+    trace: JobTrace,
+    result: tuple[Optional[str], Optional[str]],
+    cancel_token: Optional[CancelToken],
+) -> tuple[Optional[str], Optional[str]]:
+    """Count a finished download by outcome and pass its result through."""
+    file_path, error = result
+    if cancel_token is not None and cancel_token.cancelled:
+        trace.finish(OUTCOME_CANCELLED, error)
+    elif error:
+        trace.finish(OUTCOME_ERROR, error)
+    else:
+        trace.finish(OUTCOME_CACHED if trace.cached else OUTCOME_OK)
+    return result
+
+
+def _output_template(
+    output_dir: str, flight_key: str, clip: Optional[Clip] = None
+) -> str:
+    """
+    yt-dlp output template for a download, or for a clip of it.
+
+    The name includes a digest of the download's result key, so different
+    formats, qualities and post-processing of one video never share files.
+    """
+    # Truncate title to 80 bytes + id; restrictfilenames handles invalid chars
+    name = f"%(title).80B - %(id)s - {flight_key[:12]}"
+    if clip:
+        name += f" - {clip.suffix()}"
+    return os.path.join(output_dir, name + ".%(ext)s")
+
+
+def _download_planned(
+    url: str,
+    info_handle: Optional[str],
+    ydl_opts: dict,
+    make_plan,
+    trace: JobTrace,
+    cancel_token: Optional[CancelToken] = None,
+    session: Optional[str] = None,
+) -> tuple[Optional[str], Optional[dict]]:
+    """
+    Extract (or reuse) info, plan formats with make_plan(info), then download.
+
+    The download goes straight to format selection via process_ie_result, so
+    the site is extracted at most once. If a reused extraction fails (e.g.
+    its signed URLs were rejected early), it is dropped and the URL is
+    extracted again. Returns (yt-dlp filename, final info).
+
+    Extraction, format selection, transfer, merge and other post-processing
+    are recorded as spans on trace.
+
+    When cancel_token is cancelled, the progress hook stops the transfer,
+    ffmpeg runs for this file are killed, intermediate files are deleted and
+    DownloadCancelled is raised.
+
+    The transfer is governed by the bandwidth scheduler, sharing the global
+    rate fairly with other downloads of the same session.
+    """
+    import yt_dlp
+
+    cancel_token = cancel_token or CancelToken()
+    flow = get_bandwidth_scheduler().flow(url, session, cancel_token)
+    for attempt in range(2):
+        cancel_token.raise_if_cancelled()
+        handle = info_handle if attempt == 0 else None
+        started = time.monotonic()
+        info, reused = _load_info(url, handle, ydl_opts)
+        if not reused:
+            trace.record(PHASE_EXTRACT, time.monotonic() - started)
+        if not info:
+            return None, None
+
+        with trace.span(PHASE_SELECT_FORMAT):
+            plan = make_plan(info)
+        postprocess_started: dict[str, float] = {}
+        postprocess_seconds = 0.0
+
+        def postprocessor_hook(d: dict) -> None:
+            nonlocal postprocess_seconds
+            name = d.get("postprocessor")
+            if d.get("status") == "started":
+                postprocess_started[name] = time.monotonic()
+            elif d.get("status") == "finished" and name in postprocess_started:
+                seconds = time.monotonic() - postprocess_started.pop(name)
+                postprocess_seconds += seconds
+                trace.record(
+                    PHASE_MERGE if name in MERGE_POSTPROCESSORS else PHASE_POSTPROCESS,
+                    seconds,
+                )
+
+        opts = dict(ydl_opts, **plan.ydl_options(), **flow.ydl_options())
+        opts["progress_hooks"] = [*ydl_opts.get("progress_hooks", []), flow.ytdlp_hook]
+        opts["postprocessor_hooks"] = [postprocessor_hook]
+        started = time.monotonic()
+        stem = None
+        remove_killer = None
+        try:
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                # Unique to this run: the name carries the result key digest
+                # and single-flight runs each key at most once at a time
+                stem = os.path.splitext(ydl.prepare_filename(info))[0]
+                # ffmpeg never reports progress; kill it by its output path
+                remove_killer = cancel_token.on_cancel(
+                    lambda: kill_child_processes(stem)
+                )
+                info = ydl.process_ie_result(info, download=True)
+                filename = ydl.prepare_filename(info)
+        except Exception as e:
+            if cancel_token.cancelled:
+                if stem:
+                    _remove_partial_files(stem)
+                raise DownloadCancelled() from e
+            if reused and isinstance(e, yt_dlp.utils.DownloadError):
+                get_info_store().discard(handle)
+                continue
+            raise
+        finally:
+            if remove_killer:
+                remove_killer()
+            # process_ie_result covers transfer plus post-processing
+            trace.record(
+                PHASE_TRANSFER,
+                max(0.0, time.monotonic() - started - postprocess_seconds),
+            )
+        plan_stats.record(plan, time.monotonic() - started, postprocess_seconds)
+        return filename, info
+    return None, None
+
+
 def download_with_ytdlp(
     url: str,
     quality: str = "best",
     output_dir: Optional[str] = None,
     progress_hook=None,
+    use_cache: bool = True,
+    info_handle: Optional[str] = None,
+    cancel_token: Optional[CancelToken] = None,
+    trace: Optional[JobTrace] = None,
+    session: Optional[str] = None,
+    clip: Optional[Clip] = None,
 ) -> tuple[str, Optional[str]]:
     """
     Download video using yt-dlp.
 
+    info_handle is the `info_handle` returned by get_video_info; when it is
+    still valid the site is not extracted a second time.
+
+    Formats are chosen by services.formats.plan_video_formats, which prefers
+    a ready mp4, then an mp4+m4a pair merged by stream copy, and only
+    converts when neither exists.
+
+    If the same video was already produced with the same format and
+    post-processing settings, the existing file is returned without
+    downloading. Pass use_cache=False to always download.
+
+    Cancelling cancel_token abandons the download for this caller; the work
+    stops (and partial files are removed) once no other caller shares it.
+
+    Phase timings are recorded on trace (services.metrics.JobTrace); without
+    one, a trace is created and finished here.
+
+    Bandwidth and request limits apply (services.bandwidth); downloads with
+    the same session share one fair share of the global bandwidth.
+
+    With a clip (services.clips.Clip), only that time range is fetched and
+    cut by ffmpeg; it is cached separately from the full video.
+
     Returns:
         Tuple of (output_path, error_message). error_message is None on success.
     """
     output_dir = output_dir or tempfile.gettempdir()
-    # Truncate title to 80 bytes + id for uniqueness; restrictfilenames handles invalid chars
-    output_template = os.path.join(output_dir, "%(title).80B - %(id)s.%(ext)s")
-
     format_selector = get_yt_dlp_format(quality)
+    video_key = canonical_video_key(url)
+    postprocessing = ["mp4", "planned"]
+    if clip:
+        postprocessing.append(clip.key())
+    flight_key = result_key(video_key, "video", format_selector, postprocessing)
 
+    # format/postprocessors are replaced by the plan chosen after extraction
     ydl_opts = {
         "format": format_selector,
-        "outtmpl": output_template,
+        "outtmpl": _output_template(output_dir, flight_key, clip),
         "restrictfilenames": True,
         "merge_output_format": "mp4",
         "quiet": False,
         "no_warnings": False,
         "retries": 5,
         "fragment_retries": 5,
+        # Pick up .part files and fragment state left by an interrupted run
+        "continuedl": True,
         "extract_flat": False,
-        "postprocessors": [{"key": "FFmpegVideoConvertor", "preferedformat": "mp4"}],
         "http_headers": {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         },
+        # DASH/HLS fragments are fetched in parallel
+        **fragment_options(detect_platform(url)),
+        **(clip.ydl_options() if clip else {}),
     }
 
-    if progress_hook:
-        ydl_opts["progress_hooks"] = [progress_hook]
+    cache_key = flight_key if use_cache else None
+    trace, owns_trace = _start_trace(trace, "video", url, quality)
 
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            if not info:
+    def run(hook, token) -> tuple[str, Optional[str]]:
+        import yt_dlp
+
+        if clip and not clips_supported():
+            return None, CLIP_NEEDS_FFMPEG
+        cached_path = _lookup_result(cache_key, hook)
+        if cached_path:
+            trace.cached = True
+            return cached_path, None
+
+        ydl_opts["progress_hooks"] = [hook]
+        try:
+            filename, _ = _download_planned(
+                url,
+                info_handle,
+                ydl_opts,
+                lambda info: plan_video_formats(info, quality),
+                trace,
+                token,
+                session,
+            )
+            if not filename:
                 return None, "Could not extract video information"
 
-            filename = ydl.prepare_filename(info)
-            if os.path.exists(filename):
-                return filename, None
-            # yt-dlp might use different extension
-            base = Path(filename).stem
-            for ext in [".mp4", ".mkv", ".webm"]:
-                alt_path = os.path.join(output_dir, base + ext)
-                if os.path.exists(alt_path):
-                    return alt_path, None
-
-            return filename, None
-    except yt_dlp.utils.DownloadError as e:
-        return None, str(e)
-    except Exception as e:
-        return None, str(e)
+            file_path = _find_video_file(filename, output_dir)
+        except yt_dlp.utils.DownloadError as e:
+            return None, str(e)
+        except Exception as e:
+            return None, str(e)
 
+        _record_output(trace, file_path)
+        _remember_result(cache_key, video_key, file_path)
+        return file_path, None
 
-def download_audio_mp3(
+    # Concurrent identical requests share one download and its progress
+    try:
+        result = get_single_flight().do(flight_key, run, progress_hook, cancel_token)
+    except DownloadCancelled as e:
+        result = None, str(e)
+    return _finish_trace(trace, result, cancel_token) if owns_trace else result
+
+
+def download_audio(
     url: str,
     output_dir: Optional[str] = None,
     progress_hook=None,
+    use_cache: bool = True,
+    info_handle: Optional[str] = None,
+    mode: str = AUDIO_MODE_MP3,
+    cancel_token: Optional[CancelToken] = None,
+    trace: Optional[JobTrace] = None,
+    session: Optional[str] = None,
+    clip: Optional[Clip] = None,
 ) -> tuple[str, Optional[str]]:
     """
-    Download audio from video and convert to MP3 using yt-dlp.
+    Download the audio track of a video.
+
+    In "fast" mode the best audio stream is kept in its native container
+    (m4a, opus, ...) with no re-encoding. In "mp3" mode it is then encoded
+    to MP3 on the shared, core-bounded transcoding pool.
+
+    info_handle, cancel_token, trace and clip work as in download_with_ytdlp;
+    the MP3 encode is recorded as post-processing. Previously
+    produced audio for the same video and mode is reused unless
+    use_cache=False.
 
     Returns:
         Tuple of (output_path, error_message). error_message is None on success.
     """
     output_dir = output_dir or tempfile.gettempdir()
-    # Truncate title to 80 bytes + id for uniqueness; restrictfilenames handles invalid chars
-    output_template = os.path.join(output_dir, "%(title).80B - %(id)s.%(ext)s")
+    video_key = canonical_video_key(url)
+    postprocessing = [DEFAULT_MP3_BITRATE if mode == AUDIO_MODE_MP3 else None]
+    if clip:
+        postprocessing.append(clip.key())
+    flight_key = result_key(video_key, "audio", mode, postprocessing)
 
+    # format/postprocessors are replaced by the plan chosen after extraction
     ydl_opts = {
         "format": "bestaudio/best",
-        "outtmpl": output_template,
+        "outtmpl": _output_template(output_dir, flight_key, clip),
         "restrictfilenames": True,
         "quiet": False,
         "no_warnings": False,
         "retries": 5,
         "fragment_retries": 5,
+        # Pick up .part files and fragment state left by an interrupted run
+        "continuedl": True,
         "extract_flat": False,
-        "postprocessors": [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }
-        ],
         "http_headers": {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         },
+        # DASH/HLS fragments are fetched in parallel
+        **fragment_options(detect_platform(url)),
+        **(clip.ydl_options() if clip else {}),
     }
 
-    if progress_hook:
-        ydl_opts["progress_hooks"] = [progress_hook]
+    cache_key = flight_key if use_cache else None
+    trace, owns_trace = _start_trace(trace, "audio", url, mode)
 
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            if not info:
+    def run(hook, token) -> tuple[str, Optional[str]]:
+        import yt_dlp
+
+        if clip and not clips_supported():
+            return None, CLIP_NEEDS_FFMPEG
+        cached_path = _lookup_result(cache_key, hook)
+        if cached_path:
+            trace.cached = True
+            return cached_path, None
+
+        ydl_opts["progress_hooks"] = [hook]
+        try:
+            filename, info = _download_planned(
+                url,
+                info_handle,
+                ydl_opts,
+                lambda info: plan_audio_formats(info, mode),
+                trace,
+                token,
+                session,
+            )
+            if not filename:
                 return None, "Could not extract video information"
 
-            filename = ydl.prepare_filename(info)
-            # The audio will have .mp3 extension after post-processing
-            base = Path(filename).stem
-            mp3_path = os.path.join(output_dir, base + ".mp3")
-            
-            if os.path.exists(mp3_path):
-                return mp3_path, None
-            
-            # Fallback: check if file exists with original extension
-            if os.path.exists(filename):
-                return filename, None
-
-            return mp3_path, None
-    except yt_dlp.utils.DownloadError as e:
-        return None, str(e)
-    except Exception as e:
-        return None, str(e)
+            file_path = _final_filepath(info) or _find_audio_file(filename, output_dir)
+        except yt_dlp.utils.DownloadError as e:
+            return None, str(e)
+        except Exception as e:
+            return None, str(e)
+
+        if mode == AUDIO_MODE_MP3 and Path(file_path).suffix.lower() != ".mp3":
+            source_path = file_path
+            with trace.span(PHASE_POSTPROCESS):
+                file_path, error = get_mp3_transcoder().transcode(
+                    source_path, bitrate=DEFAULT_MP3_BITRATE, cancel_token=token
+                )
+            if error:
+                if token.cancelled:
+                    try:
+                        os.remove(source_path)
+                    except OSError:
+                        pass
+                return None, error
+            try:
+                os.remove(source_path)
+            except OSError:
+                pass
+
+        _record_output(trace, file_path)
+        _remember_result(cache_key, video_key, file_path)
+        return file_path, None
+
+    # Concurrent identical requests share one download and its progress
+    try:
+        result = get_single_flight().do(flight_key, run, progress_hook, cancel_token)
+    except DownloadCancelled as e:
+        result = None, str(e)
+    return _finish_trace(trace, result, cancel_token) if owns_trace else result
+
+
+def download_audio_mp3(
+    url: str,
+    output_dir: Optional[str] = None,
+    progress_hook=None,
+    use_cache: bool = True,
+    info_handle: Optional[str] = None,
+    cancel_token: Optional[CancelToken] = None,
+) -> tuple[str, Optional[str]]:
+    """
+    Download audio from video and convert to MP3.
+
+    Returns:
+        Tuple of (output_path, error_message). error_message is None on success.
+    """
+    return download_audio(
+        url,
+        output_dir=output_dir,
+        progress_hook=progress_hook,
+        use_cache=use_cache,
+        info_handle=info_handle,
+        mode=AUDIO_MODE_MP3,
+        cancel_token=cancel_token,
+    )
 
 
 def try_facebook_api(url: str, quality: str, facebook_api_url: str) -> Optional[str]:
     """
     Try to get download URL from Facebook Video Download API.
     Returns direct download URL or None if failed.
+
+    Goes through the shared client for facebook_api_url, which pools
+    connections, caches resolved URLs briefly and stops calling an API
+    that keeps failing (see services.facebook_api).
     """
-    try:
-        response = requests.post(
-            f"{facebook_api_url.rstrip('/')}/download",
-            json={"url": url, "quality": quality},
-            headers={"Content-Type": "application/json"},
-            timeout=30,
-        )
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("status") == "success" and data.get("download_url"):
-                return data["download_url"]
-    except Exception:
-        pass
-    return None
+    return get_facebook_api_client(facebook_api_url).resolve(url, quality)
+
+
+def _extract_info_handle(
+    url: str, info_handle: Optional[str], cancel_token: CancelToken
+) -> Optional[str]:
+    """
+    Return an info handle for url, extracting it with yt-dlp unless
+    info_handle is still valid. This is yt-dlp's resolution backend.
+    """
+    video_key = canonical_video_key(url)
+    if get_info_store().get(info_handle, video_key):
+        return info_handle
+    cancel_token.raise_if_cancelled()
+    import yt_dlp
 
+    with yt_dlp.YoutubeDL(
+        {"quiet": True, "no_warnings": True, "skip_download": True}
+    ) as ydl:
+        info = ydl.extract_info(url, download=False)
+        if not info or not info.get("formats") or cancel_token.cancelled:
+            return None
+        return get_info_store().put(ydl.sanitize_info(info), video_key)
 
-def get_video_info(url: str) -> tuple[Optional[dict], Optional[str]]:
+
+def get_video_info(
+    url: str, use_cache: bool = True
+) -> tuple[Optional[dict], Optional[str]]:
     """
     Get video metadata without downloading.
 
+    Results are shared across sessions through the on-disk metadata cache,
+    keyed by `canonical_video_key`. Pass use_cache=False to force extraction.
+
+    A fresh extraction also returns `info_handle`, which the download
+    functions accept to skip extracting the same video again.
+
     Returns:
         Tuple of (info_dict, error_message). info_dict contains title, thumbnail, duration, etc.
     """
+    cache_key = canonical_video_key(url) if use_cache else None
+    if cache_key:
+        try:
+            cached = get_metadata_cache().get(cache_key)
+        except Exception:
+            cached = None
+        if cached:
+            return cached, None
+
+    # Imported here: loading yt-dlp's extractors dominates app start-up
+    import yt_dlp
+
     ydl_opts = {
         "quiet": True,
         "extract_flat": False,
@@ -299,14 +768,371 @@ def get_video_info(url: str) -> tuple[Optional[dict], Optional[str]]:
             if not info:
                 return None, "Could not extract video information"
 
-            return {
+            result = {
                 "title": info.get("title", "Unknown"),
                 "thumbnail": info.get("thumbnail"),
                 "duration": info.get("duration"),
                 "uploader": info.get("uploader"),
                 "view_count": info.get("view_count"),
-            }, None
+            }
+            if cache_key:
+                try:
+                    get_metadata_cache().put(cache_key, result)
+                except Exception:
+                    pass
+            if info.get("formats"):
+                handle = get_info_store().put(
+                    ydl.sanitize_info(info), canonical_video_key(url)
+                )
+                result = dict(result, info_handle=handle)
+            return result, None
     except yt_dlp.utils.DownloadError as e:
         return None, str(e)
     except Exception as e:
         return None, str(e)
+
+
+def download_direct_url(
+    download_url: str,
+    output_dir: Optional[str] = None,
+    progress_hook=None,
+    resume_key: Optional[str] = None,
+    cancel_token: Optional[CancelToken] = None,
+    trace: Optional[JobTrace] = None,
+    session: Optional[str] = None,
+) -> tuple[str, Optional[str]]:
+    """
+    Download a direct media URL (e.g. one returned by the Facebook API).
+
+    Uses parallel Range requests over pooled connections when the server
+    supports them. Progress is reported with the same dict shape as yt-dlp
+    progress hooks.
+
+    The file is written to a `.part` path named after resume_key (default:
+    the URL). A download interrupted by an error or a restart continues from
+    its partial file the next time the same key is downloaded; pass a key
+    that survives URL re-signing, such as the page URL and quality. A
+    cancelled download stops all connections and deletes its partial file.
+
+    The transfer is recorded on trace, as in download_with_ytdlp.
+
+    Concurrent calls for the same key share one download (single-flight),
+    so they never write the same partial file; a process that waited for
+    another to finish reuses its file.
+
+    Returns:
+        Tuple of (output_path, error_message). error_message is None on success.
+    """
+    output_dir = output_dir or tempfile.gettempdir()
+    digest = hashlib.sha256((resume_key or download_url).encode("utf-8")).hexdigest()
+    file_path = os.path.join(output_dir, f"direct-{digest[:16]}.mp4")
+    part_path = file_path + ".part"
+    trace, owns_trace = _start_trace(trace, "video", download_url, "")
+
+    def run(hook, token) -> tuple[Optional[str], Optional[str]]:
+        if os.path.exists(file_path) and not os.path.exists(part_path):
+            # Finished by another process while this one waited for the lease
+            trace.cached = True
+            hook({"status": "finished", "filename": file_path})
+            return file_path, None
+        return _download_direct(
+            download_url, file_path, part_path, hook, token, trace, session
+        )
+
+    try:
+        result = get_single_flight().do(
+            f"direct:{file_path}", run, progress_hook, cancel_token
+        )
+    except DownloadCancelled as e:
+        result = None, str(e)
+    return _finish_trace(trace, result, cancel_token) if owns_trace else result
+
+
+def _download_direct(
+    download_url: str,
+    file_path: str,
+    part_path: str,
+    progress_hook,
+    cancel_token: CancelToken,
+    trace: JobTrace,
+    session: Optional[str] = None,
+) -> tuple[Optional[str], Optional[str]]:
+    flow = get_bandwidth_scheduler().flow(download_url, session, cancel_token)
+
+    def hook(event: dict) -> None:
+        cancel_token.raise_if_cancelled()
+        if progress_hook:
+            progress_hook(event)
+        flow.track_bytes(event)
+
+    try:
+        with trace.span(PHASE_TRANSFER):
+            RangedDownloader(before_request=flow.before_request).download(
+                download_url, part_path, hook
+            )
+        os.replace(part_path, file_path)
+    except Exception as e:
+        if cancel_token.cancelled:
+            for path in (part_path, part_path + RANGE_STATE_SUFFIX):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return None, str(DownloadCancelled())
+        # The .part file and its range offsets are kept for a later resume
+        return None, str(e)
+
+    _record_output(trace, file_path)
+    if progress_hook:
+        progress_hook({"status": "finished", "filename": file_path})
+    return file_path, None
+
+
+def _journal_heartbeat(journal, entry_id: str, progress_hook=None):
+    """Wrap progress_hook to refresh the journal entry while the download runs."""
+    last = time.monotonic()
+
+    def hook(event: dict) -> None:
+        nonlocal last
+        if time.monotonic() - last >= JOURNAL_HEARTBEAT_INTERVAL:
+            last = time.monotonic()
+            try:
+                journal.heartbeat(entry_id)
+            except Exception:
+                pass
+        if progress_hook:
+            progress_hook(event)
+
+    return hook
+
+
+def download_media(
+    url: str,
+    quality: str = "best",
+    audio_only: bool = False,
+    output_dir: Optional[str] = None,
+    facebook_api_url: Optional[str] = None,
+    progress_hook=None,
+    info_handle: Optional[str] = None,
+    audio_mode: str = AUDIO_MODE_MP3,
+    cancel_token: Optional[CancelToken] = None,
+    session: Optional[str] = None,
+    clip_start=None,
+    clip_end=None,
+    exact_cut: bool = False,
+    journal_entry: Optional[str] = None,
+) -> tuple[str, Optional[str]]:
+    """
+    Download a video or its audio, choosing the right backend for the URL.
+
+    audio_mode is "mp3" or "fast" (original audio stream, no re-encoding).
+
+    clip_start and clip_end (seconds or strings like "1:30") download only
+    that part of the video, cut at keyframes by stream copy, or exactly
+    (re-encoding the clip) with exact_cut. See services.clips. A clip given
+    only an end starts at the link's `t=` time, if it has one.
+
+    Facebook videos go through the Facebook API first when facebook_api_url
+    is set, falling back to yt-dlp if it cannot resolve or fetch the video.
+    Under the platform's resolution policy (services.resolve), yt-dlp's
+    extraction may also start while the API call is still pending; the
+    first backend to resolve the video is used.
+
+    While it runs, the download is recorded in the download journal so that
+    resume_interrupted_downloads can restart it after a crash or deploy.
+    Its progress events keep the entry fresh, and a resumed run passes the
+    claimed entry's id as journal_entry. A download stopped through
+    cancel_token is not resumed.
+
+    Each call is traced (services.metrics): its phases feed the
+    /metrics histograms and, with VIDEO_DOWNLOADER_JOB_LOG set, one JSON
+    log line summarises the job.
+
+    session identifies who the download is for (e.g. a browser session);
+    the global bandwidth limit is shared fairly between sessions.
+
+    Returns:
+        Tuple of (output_path, error_message). error_message is None on success.
+    """
+    if clip_start is None and clip_end is not None:
+        clip_start = url_start_time(url)
+    try:
+        clip = make_clip(clip_start, clip_end, exact_cut)
+    except ValueError as e:
+        return None, str(e)
+    journal = get_download_journal()
+    try:
+        entry_id = journal_entry or journal.begin(
+            {
+                "url": url,
+                "quality": quality,
+                "audio_only": audio_only,
+                "output_dir": output_dir,
+                "audio_mode": audio_mode,
+                "clip_start": clip.start if clip else None,
+                "clip_end": clip.end if clip else None,
+                "exact_cut": clip.exact if clip else False,
+            }
+        )
+    except Exception:
+        # The journal only enables resuming; never fail a download over it
+        entry_id = None
+    if entry_id:
+        progress_hook = _journal_heartbeat(journal, entry_id, progress_hook)
+    trace = JobTrace(
+        "audio" if audio_only else "video",
+        detect_platform(url),
+        audio_mode if audio_only else quality,
+        url,
+    )
+    result = None, "Download failed"
+    try:
+        result = _download_media(
+            url,
+            quality,
+            audio_only,
+            output_dir,
+            facebook_api_url,
+            progress_hook,
+            info_handle,
+            audio_mode,
+            cancel_token,
+            trace,
+            session,
+            clip,
+        )
+        return result
+    finally:
+        _finish_trace(trace, result, cancel_token)
+        if entry_id:
+            try:
+                journal.finish(entry_id)
+            except Exception:
+                pass
+
+
+def _download_media(
+    url: str,
+    quality: str,
+    audio_only: bool,
+    output_dir: Optional[str],
+    facebook_api_url: Optional[str],
+    progress_hook,
+    info_handle: Optional[str],
+    audio_mode: str,
+    cancel_token: Optional[CancelToken],
+    trace: JobTrace,
+    session: Optional[str],
+    clip: Optional[Clip] = None,
+) -> tuple[str, Optional[str]]:
+    # The API only resolves whole files; clips go through yt-dlp
+    if (
+        not audio_only
+        and not clip
+        and facebook_api_url
+        and detect_platform(url) == "facebook"
+    ):
+        backends = [
+            Backend(
+                BACKEND_FACEBOOK_API,
+                lambda token: try_facebook_api(url, quality, facebook_api_url),
+            ),
+            Backend(
+                BACKEND_YTDLP, lambda token: _extract_info_handle(url, info_handle, token)
+            ),
+        ]
+        # Resolving the media URL is this path's extraction
+        with trace.span(PHASE_EXTRACT):
+            backend, resolved = get_resolver().resolve("facebook", backends, cancel_token)
+        if cancel_token is not None and cancel_token.cancelled:
+            return None, str(DownloadCancelled())
+        if backend == BACKEND_YTDLP:
+            info_handle = resolved
+        elif backend == BACKEND_FACEBOOK_API:
+            file_path, error = download_direct_url(
+                resolved,
+                output_dir=output_dir,
+                progress_hook=progress_hook,
+                resume_key=f"{canonical_video_key(url)}|{quality}",
+                cancel_token=cancel_token,
+                trace=trace,
+                session=session,
+            )
+            if not error:
+                return file_path, None
+            if cancel_token is not None and cancel_token.cancelled:
+                return None, error
+            # The resolved URL may have expired; resolve afresh next time
+            get_facebook_api_client(facebook_api_url).forget(url, quality)
+
+    if audio_only:
+        return download_audio(
+            url,
+            output_dir=output_dir,
+            progress_hook=progress_hook,
+            info_handle=info_handle,
+            mode=audio_mode,
+            cancel_token=cancel_token,
+            trace=trace,
+            session=session,
+            clip=clip,
+        )
+    return download_with_ytdlp(
+        url,
+        quality=quality,
+        output_dir=output_dir,
+        progress_hook=progress_hook,
+        info_handle=info_handle,
+        cancel_token=cancel_token,
+        trace=trace,
+        session=session,
+        clip=clip,
+    )
+
+
+_resumed = False
+_resumed_lock = threading.Lock()
+
+
+def resume_interrupted_downloads() -> list:
+    """
+    Queue again the downloads a previous process left unfinished, once per process.
+
+    Orphaned journal entries are claimed (so only one replica resumes each)
+    and submitted as background jobs; yt-dlp continues from its `.part` and
+    fragment files and direct URLs from their saved range offsets. Partial
+    files older than VIDEO_DOWNLOADER_PARTIAL_MAX_AGE are deleted. Resumed
+    Facebook downloads use the configured VIDEO_DOWNLOADER_FACEBOOK_API_URL.
+    Returns the resumed jobs.
+    """
+    global _resumed
+    with _resumed_lock:
+        if _resumed:
+            return []
+        _resumed = True
+
+    journal = get_download_journal()
+    jobs = []
+    for entry in journal.orphaned():
+        if not journal.claim(entry["id"]):
+            continue
+        params = entry["params"]
+        # Entries of older versions named an API URL; use the configured one
+        params.pop("facebook_api_url", None)
+        jobs.append(
+            get_job_queue().submit(
+                download_media,
+                platform=detect_platform(params["url"]),
+                priority=PRIORITY_BACKGROUND,
+                label=params["url"],
+                journal_entry=entry["id"],
+                facebook_api_url=configured_facebook_api_url(),
+                # So cancelling the resumed job stops the download
+                cancel_token=CancelToken(),
+                **params,
+            )
+        )
+    collect_partial_files(
+        max_age=env_float("VIDEO_DOWNLOADER_PARTIAL_MAX_AGE", DEFAULT_PARTIAL_MAX_AGE)
+    )
+    return jobs
@@ -0,0 +1,248 @@
+"""Client for the optional Facebook Video Download API."""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from services.config import env_float, env_int
+from services.direct import get_http_session
+from services.metrics import registry
+
+
+DEFAULT_CONNECT_TIMEOUT = 3.0
+DEFAULT_READ_TIMEOUT = 20.0
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_COOLDOWN = 60.0
+DEFAULT_URL_TTL = 300.0
+# Clients kept for different base URLs (e.g. typed into the app's sidebar)
+MAX_API_CLIENTS = 16
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+registry.describe(
+    "video_downloader_facebook_api_requests_total",
+    "counter",
+    "Facebook API resolutions by outcome (ok, miss, failure, skipped, cached)",
+)
+registry.describe(
+    "video_downloader_facebook_api_seconds", "histogram", "Facebook API request latency"
+)
+
+
+class CircuitBreaker:
+    """
+    Stop calling a backend after `failure_threshold` consecutive failures.
+
+    While open, allow() is False for `cooldown` seconds. Then a single
+    trial call is let through (half-open): success closes the circuit,
+    failure opens it for another cooldown.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown: float = DEFAULT_COOLDOWN,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return CIRCUIT_CLOSED
+            if self._clock() - self._opened_at < self.cooldown:
+                return CIRCUIT_OPEN
+            return CIRCUIT_HALF_OPEN
+
+    def allow(self) -> bool:
+        """Return True if a call may be made now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._clock() - self._opened_at < self.cooldown or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+
+
+class FacebookApiClient:
+    """
+    Resolve Facebook video pages to direct media URLs through the API.
+
+    Requests go over the pooled HTTP session with separate connect and read
+    timeouts. Connection errors, timeouts and 5xx answers count as
+    failures for the circuit breaker; while it is open, resolve() returns
+    None at once so the caller falls back to yt-dlp. Resolved URLs are
+    cached per (url, quality) for `url_ttl` seconds. Latency and outcomes
+    are counted in stats() and in the /metrics registry.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown: float = DEFAULT_COOLDOWN,
+        url_ttl: float = DEFAULT_URL_TTL,
+        session=None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.url_ttl = url_ttl
+        self.session = session
+        self.breaker = CircuitBreaker(failure_threshold, cooldown, clock)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._cache: dict[tuple[str, str], tuple[str, float]] = {}
+        self._counts = {"ok": 0, "miss": 0, "failure": 0, "skipped": 0, "cached": 0}
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def _count(self, outcome: str) -> None:
+        with self._lock:
+            self._counts[outcome] += 1
+        registry.inc("video_downloader_facebook_api_requests_total", outcome=outcome)
+
+    def _cached(self, key: tuple[str, str]) -> Optional[str]:
+        now = self._clock()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+            self._cache.pop(key, None)
+            # Drop other expired entries while here
+            for other, (_, expires) in list(self._cache.items()):
+                if expires <= now:
+                    del self._cache[other]
+        return None
+
+    def resolve(self, url: str, quality: str) -> Optional[str]:
+        """Return the direct download URL for url, or None to fall back."""
+        key = (url, quality)
+        cached = self._cached(key)
+        if cached:
+            self._count("cached")
+            return cached
+        if not self.breaker.allow():
+            self._count("skipped")
+            return None
+
+        started = self._clock()
+        try:
+            response = (self.session or get_http_session()).post(
+                f"{self.base_url}/download",
+                json={"url": url, "quality": quality},
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
+            )
+            failed = response.status_code >= 500
+            data = response.json() if response.status_code == 200 else {}
+        except Exception:
+            # Includes timeouts and a 200 whose body is not JSON
+            failed, data = True, {}
+        self._observe(self._clock() - started)
+
+        if failed:
+            self.breaker.record_failure()
+            self._count("failure")
+            return None
+        self.breaker.record_success()
+        download_url = data.get("download_url") if data.get("status") == "success" else None
+        if not download_url:
+            self._count("miss")
+            return None
+        with self._lock:
+            self._cache[key] = (download_url, self._clock() + self.url_ttl)
+        self._count("ok")
+        return download_url
+
+    def forget(self, url: str, quality: str) -> None:
+        """Drop a cached URL, e.g. after downloading it failed."""
+        with self._lock:
+            self._cache.pop((url, quality), None)
+
+    def _observe(self, seconds: float) -> None:
+        with self._lock:
+            self._latency_total += seconds
+            self._latency_max = max(self._latency_max, seconds)
+        registry.observe("video_downloader_facebook_api_seconds", seconds)
+
+    def stats(self) -> dict:
+        """Return outcome counts, latency of the requests made and the circuit state."""
+        with self._lock:
+            counts = dict(self._counts)
+            requests = counts["ok"] + counts["miss"] + counts["failure"]
+            latency = {
+                "mean": self._latency_total / requests if requests else None,
+                "max": self._latency_max if requests else None,
+            }
+        return dict(counts, latency=latency, circuit=self.breaker.state)
+
+
+_clients: "OrderedDict[str, FacebookApiClient]" = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def configured_facebook_api_url() -> Optional[str]:
+    """The Facebook API set by the server's operator, if any."""
+    return os.environ.get("VIDEO_DOWNLOADER_FACEBOOK_API_URL") or None
+
+
+def get_facebook_api_client(base_url: str) -> FacebookApiClient:
+    """
+    Return the process-wide client for base_url, creating it on first use.
+
+    At most MAX_API_CLIENTS are kept; the least recently used is dropped.
+    """
+    key = base_url.rstrip("/")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+        else:
+            client = FacebookApiClient(
+                key,
+                connect_timeout=env_float(
+                    "VIDEO_DOWNLOADER_FACEBOOK_API_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT
+                ),
+                read_timeout=env_float(
+                    "VIDEO_DOWNLOADER_FACEBOOK_API_READ_TIMEOUT", DEFAULT_READ_TIMEOUT
+                ),
+                failure_threshold=env_int(
+                    "VIDEO_DOWNLOADER_FACEBOOK_API_FAILURES", DEFAULT_FAILURE_THRESHOLD
+                ),
+                cooldown=env_float(
+                    "VIDEO_DOWNLOADER_FACEBOOK_API_COOLDOWN", DEFAULT_COOLDOWN
+                ),
+                url_ttl=env_float("VIDEO_DOWNLOADER_FACEBOOK_API_URL_TTL", DEFAULT_URL_TTL),
+            )
+            _clients[key] = client
+            while len(_clients) > MAX_API_CLIENTS:
+                _clients.popitem(last=False)
+        return client
@@ -0,0 +1,193 @@
+"""Signed, range-aware streaming of finished files over HTTP."""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import time
+from pathlib import Path
+from typing import Optional
+
+from services.config import env_int, get_work_dir
+from services.metrics import record_serve
+
+
+DEFAULT_TOKEN_TTL = 900
+
+MIME_TYPES = {
+    ".mp4": "video/mp4",
+    ".mkv": "video/x-matroska",
+    ".webm": "video/webm",
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+    ".opus": "audio/ogg",
+}
+
+_secret: Optional[bytes] = None
+
+
+def _get_secret() -> bytes:
+    """
+    Return the token signing key.
+
+    Uses VIDEO_DOWNLOADER_SECRET when set, otherwise a random key stored in
+    the work dir so every process on this machine signs with the same key.
+    The key file is written in full before it appears under its name, so
+    processes starting together never read it half-written; an empty key
+    is refused.
+    """
+    global _secret
+    if _secret is None:
+        configured = os.environ.get("VIDEO_DOWNLOADER_SECRET")
+        if configured:
+            _secret = configured.encode("utf-8")
+        else:
+            key_path = get_work_dir() / "file_token.key"
+            if not key_path.exists():
+                _create_key_file(key_path)
+            key = key_path.read_text().strip()
+            if not key:
+                raise RuntimeError(f"Empty file token key in {key_path}; delete it to regenerate")
+            _secret = key.encode("utf-8")
+    return _secret
+
+
+def _create_key_file(key_path: Path) -> None:
+    """Write a random key to key_path unless another process did first."""
+    tmp_path = key_path.with_name(f"{key_path.name}.{secrets.token_hex(8)}.tmp")
+    fd = os.open(str(tmp_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(secrets.token_hex(32))
+    try:
+        # Unlike os.replace, os.link fails if the key already exists
+        os.link(tmp_path, key_path)
+    except FileExistsError:
+        pass
+    finally:
+        tmp_path.unlink()
+
+
+def is_servable(path: str) -> bool:
+    """Only files inside the work dir are ever served."""
+    try:
+        Path(path).resolve().relative_to(get_work_dir().resolve())
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def sign_file_token(
+    path: str, filename: Optional[str] = None, ttl: Optional[int] = None
+) -> str:
+    """Create a URL-safe token granting access to path until it expires."""
+    ttl = ttl or env_int("VIDEO_DOWNLOADER_TOKEN_TTL", DEFAULT_TOKEN_TTL)
+    payload = _b64encode(
+        json.dumps(
+            {"p": str(path), "n": filename or Path(path).name, "e": int(time.time() + ttl)}
+        ).encode("utf-8")
+    )
+    signature = _b64encode(
+        hmac.new(_get_secret(), payload.encode("ascii"), hashlib.sha256).digest()
+    )
+    return f"{payload}.{signature}"
+
+
+def verify_file_token(token: str) -> Optional[dict]:
+    """Return {"path", "filename"} for a valid, unexpired token, else None."""
+    payload, _, signature = (token or "").partition(".")
+    if not payload or not signature:
+        return None
+    expected = _b64encode(
+        hmac.new(_get_secret(), payload.encode("ascii"), hashlib.sha256).digest()
+    )
+    if not hmac.compare_digest(expected, signature):
+        return None
+    try:
+        data = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if data.get("e", 0) < time.time() or not is_servable(data.get("p", "")):
+        return None
+    return {"path": data["p"], "filename": data.get("n")}
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Parse a single `bytes=` Range header into an inclusive (start, end).
+
+    Returns None when there is no usable range (serve the whole file) and
+    raises ValueError when the range cannot be satisfied.
+    """
+    match = re.match(r"^\s*bytes=(\d*)-(\d*)\s*$", header or "")
+    if not match or not any(match.groups()):
+        return None
+    start_text, end_text = match.groups()
+    if start_text:
+        start = int(start_text)
+        end = min(int(end_text), size - 1) if end_text else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(0, size - int(end_text))
+        end = size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def send_file(handler, path: str, filename: Optional[str] = None) -> None:
+    """
+    Stream path on a BaseHTTPRequestHandler with Range support.
+
+    The body is sent with socket.sendfile, which uses the zero-copy
+    sendfile(2) syscall where available, so memory use stays flat whatever
+    the file size. The time and bytes sent are recorded as the "serve" phase.
+    Paths outside the work dir are answered with 403.
+    """
+    started = time.monotonic()
+    if not is_servable(path):
+        handler.send_response(403)
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+        return
+    file_path = Path(path)
+    size = file_path.stat().st_size
+    try:
+        byte_range = parse_range(handler.headers.get("Range"), size)
+    except ValueError:
+        handler.send_response(416)
+        handler.send_header("Content-Range", f"bytes */{size}")
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+        return
+
+    start, end = byte_range or (0, size - 1)
+    length = max(0, end - start + 1)
+    handler.send_response(206 if byte_range else 200)
+    handler.send_header(
+        "Content-Type", MIME_TYPES.get(file_path.suffix.lower(), "application/octet-stream")
+    )
+    handler.send_header("Accept-Ranges", "bytes")
+    handler.send_header("Content-Length", str(length))
+    if byte_range:
+        handler.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+    safe_name = (filename or file_path.name).replace('"', "")
+    handler.send_header("Content-Disposition", f'attachment; filename="{safe_name}"')
+    handler.end_headers()
+    if handler.command == "HEAD" or not length:
+        return
+    with open(file_path, "rb") as f:
+        handler.wfile.flush()
+        sent = handler.connection.sendfile(f, offset=start, count=length)
+    mime_type = MIME_TYPES.get(file_path.suffix.lower(), "")
+    record_serve(time.monotonic() - started, sent, mime_type.split("/")[0] or "other")
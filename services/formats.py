@@ -0,0 +1,218 @@
+"""Format planning that prefers ready mp4 files and stream-copy remuxes over transcodes."""
+
+import logging
+import threading
+from typing import Optional
+
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+PLAN_PROGRESSIVE = "progressive"
+PLAN_REMUX = "remux"
+PLAN_TRANSCODE = "transcode"
+
+# Quality choices offered by the UI, CLI and API
+QUALITIES = ["best", "1080p", "720p", "480p", "360p", "worst"]
+
+QUALITY_HEIGHTS = {
+    "1080p": 1080,
+    "720p": 720,
+    "480p": 480,
+    "360p": 360,
+}
+
+# Containers whose streams can be copied into mp4 without re-encoding
+MP4_VIDEO_EXTS = {"mp4"}
+MP4_AUDIO_EXTS = {"m4a", "mp4"}
+
+
+class FormatPlan:
+    """How a video will be produced: which formats to fetch and what ffmpeg does."""
+
+    def __init__(
+        self,
+        kind: str,
+        format_selector: str,
+        postprocessors: list,
+        description: str = "",
+    ):
+        self.kind = kind
+        self.format_selector = format_selector
+        self.postprocessors = postprocessors
+        self.description = description
+
+    def ydl_options(self) -> dict:
+        """yt-dlp options implementing this plan."""
+        return {
+            "format": self.format_selector,
+            "merge_output_format": "mp4",
+            "postprocessors": list(self.postprocessors),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "format": self.format_selector,
+            "description": self.description,
+        }
+
+
+# yt-dlp uses "none" for an absent stream and None for "unknown"; unknown
+# codecs are assumed present, as yt-dlp's own format selection does.
+def _has_video(fmt: dict) -> bool:
+    return fmt.get("vcodec") != "none"
+
+
+def _has_audio(fmt: dict) -> bool:
+    return fmt.get("acodec") != "none"
+
+
+def _within(fmt: dict, max_height: Optional[int]) -> bool:
+    return max_height is None or (fmt.get("height") or 0) <= max_height
+
+
+def _video_rank(fmt: dict) -> tuple:
+    return (fmt.get("height") or 0, fmt.get("tbr") or 0)
+
+
+def _audio_rank(fmt: dict) -> tuple:
+    return (fmt.get("abr") or fmt.get("tbr") or 0,)
+
+
+def plan_video_formats(info: dict, quality: str = "best") -> FormatPlan:
+    """
+    Pick the cheapest way to produce an mp4 for the requested quality.
+
+    In order of preference for the highest resolution available:
+    a progressive mp4 that needs no ffmpeg at all, an mp4 video + m4a audio
+    pair that is merged with stream copy, or, when neither exists, the best
+    streams at that quality transcoded to mp4 as a last resort.
+    """
+    quality = (quality or "best").lower()
+    worst = quality == "worst"
+    max_height = QUALITY_HEIGHTS.get(quality)
+    formats = [f for f in (info.get("formats") or [info]) if f.get("format_id") or f.get("url")]
+    pick = min if worst else max
+
+    progressive = [
+        f
+        for f in formats
+        if f.get("ext") in MP4_VIDEO_EXTS
+        and _has_video(f)
+        and _has_audio(f)
+        and _within(f, max_height)
+    ]
+    video_only = [
+        f
+        for f in formats
+        if f.get("ext") in MP4_VIDEO_EXTS
+        and _has_video(f)
+        and not _has_audio(f)
+        and _within(f, max_height)
+    ]
+    audio_only = [
+        f
+        for f in formats
+        if f.get("ext") in MP4_AUDIO_EXTS and _has_audio(f) and not _has_video(f)
+    ]
+
+    best_progressive = pick(progressive, key=_video_rank) if progressive else None
+    best_pair = None
+    if video_only and audio_only:
+        best_pair = (pick(video_only, key=_video_rank), max(audio_only, key=_audio_rank))
+
+    use_pair = best_pair is not None and (
+        best_progressive is None
+        or (
+            _video_rank(best_pair[0]) < _video_rank(best_progressive)
+            if worst
+            else _video_rank(best_pair[0]) > _video_rank(best_progressive)
+        )
+    )
+
+    if use_pair:
+        video, audio = best_pair
+        return FormatPlan(
+            PLAN_REMUX,
+            f"{video['format_id']}+{audio['format_id']}",
+            [],
+            f"stream-copy merge of {video.get('height') or '?'}p mp4 video and m4a audio",
+        )
+    if best_progressive is not None and best_progressive.get("format_id"):
+        return FormatPlan(
+            PLAN_PROGRESSIVE,
+            best_progressive["format_id"],
+            [],
+            f"ready {best_progressive.get('height') or '?'}p mp4",
+        )
+
+    # Nothing mp4-compatible: fetch the best streams and convert
+    if worst:
+        selector = "wv+wa/w"
+    elif max_height:
+        selector = f"bv[height<={max_height}]+ba/b[height<={max_height}]/b"
+    else:
+        selector = "bv+ba/b"
+    return FormatPlan(
+        PLAN_TRANSCODE,
+        selector,
+        [{"key": "FFmpegVideoConvertor", "preferedformat": "mp4"}],
+        "no mp4/m4a streams, merging or converting to mp4",
+    )
+
+
+registry.describe(
+    "video_downloader_format_plans_total", "counter", "Downloads by format plan kind"
+)
+registry.describe(
+    "video_downloader_format_plan_seconds", "histogram", "Download time by format plan kind"
+)
+registry.describe(
+    "video_downloader_format_plan_postprocess_seconds",
+    "histogram",
+    "Time spent in ffmpeg post-processing by format plan kind",
+)
+
+
+class PlanStats:
+    """
+    Counts and cumulative time per plan kind, and time spent in ffmpeg.
+
+    Each plan is also counted in the /metrics registry, labelled by kind.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+
+    def record(self, plan: FormatPlan, seconds: float, postprocess_seconds: float) -> None:
+        with self._lock:
+            entry = self._stats.setdefault(
+                plan.kind, {"count": 0, "seconds": 0.0, "postprocess_seconds": 0.0}
+            )
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["postprocess_seconds"] += postprocess_seconds
+        registry.inc("video_downloader_format_plans_total", kind=plan.kind)
+        registry.observe("video_downloader_format_plan_seconds", seconds, kind=plan.kind)
+        registry.observe(
+            "video_downloader_format_plan_postprocess_seconds",
+            postprocess_seconds,
+            kind=plan.kind,
+        )
+        logger.info(
+            "format plan %s (%s) took %.2fs, %.2fs in post-processing",
+            plan.kind,
+            plan.format_selector,
+            seconds,
+            postprocess_seconds,
+        )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {kind: dict(entry) for kind, entry in self._stats.items()}
+
+
+plan_stats = PlanStats()
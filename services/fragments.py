@@ -0,0 +1,66 @@
+"""Fragment download concurrency for DASH/HLS sources."""
+
+import os
+import shutil
+from typing import Optional
+
+from services.config import env_int
+from services.jobs import parse_platform_limits
+
+
+DEFAULT_FRAGMENT_CONCURRENCY = {
+    "youtube": 4,
+    "facebook": 8,
+    "generic": 4,
+}
+
+EXTERNAL_DOWNLOADER_ARGS = {
+    "aria2c": ["-x", "8", "-s", "8", "-k", "1M", "--summary-interval=1"],
+}
+
+
+def get_fragment_concurrency(platform: str) -> int:
+    """
+    Number of fragments fetched in parallel for platform.
+
+    VIDEO_DOWNLOADER_FRAGMENT_CONCURRENCY sets a value for every platform and
+    VIDEO_DOWNLOADER_FRAGMENT_LIMITS (e.g. `youtube=4,facebook=16`) overrides
+    single platforms.
+    """
+    overrides = parse_platform_limits(
+        os.environ.get("VIDEO_DOWNLOADER_FRAGMENT_LIMITS", "")
+    )
+    if platform in overrides:
+        return overrides[platform]
+    default = DEFAULT_FRAGMENT_CONCURRENCY.get(
+        platform, DEFAULT_FRAGMENT_CONCURRENCY["generic"]
+    )
+    return max(1, env_int("VIDEO_DOWNLOADER_FRAGMENT_CONCURRENCY", default))
+
+
+def get_external_downloader() -> Optional[str]:
+    """
+    Return the external downloader to use, or None for yt-dlp's own.
+
+    VIDEO_DOWNLOADER_EXTERNAL_DOWNLOADER may be "none" (default), "auto"
+    (aria2c if installed) or a program name, which is used only if found
+    on PATH.
+    """
+    choice = os.environ.get("VIDEO_DOWNLOADER_EXTERNAL_DOWNLOADER", "none").lower()
+    if choice in ("", "none"):
+        return None
+    name = "aria2c" if choice == "auto" else choice
+    return name if shutil.which(name) else None
+
+
+def fragment_options(platform: str, concurrency: Optional[int] = None) -> dict:
+    """yt-dlp options for fetching fragmented streams of platform."""
+    opts = {
+        "concurrent_fragment_downloads": concurrency or get_fragment_concurrency(platform),
+    }
+    external = get_external_downloader()
+    if external:
+        opts["external_downloader"] = {"default": external}
+        if external in EXTERNAL_DOWNLOADER_ARGS:
+            opts["external_downloader_args"] = {external: EXTERNAL_DOWNLOADER_ARGS[external]}
+    return opts
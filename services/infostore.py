@@ -0,0 +1,122 @@
+"""In-memory store of full extraction results, handed from preview to download."""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qsl, urlparse
+
+from services.config import env_float, env_int
+
+
+DEFAULT_HANDLE_TTL = 1800.0
+DEFAULT_HANDLE_MAX_ENTRIES = 200
+# Treat signed media URLs as expired this many seconds early
+EXPIRY_MARGIN = 120
+
+# Query parameters carrying a signed URL's expiry as a unix timestamp
+_EXPIRY_PARAMS = ("expire", "expires", "Expires")
+
+
+def format_urls_expire_at(info: dict) -> Optional[float]:
+    """
+    Return the earliest expiry time found in the info's signed format URLs.
+
+    YouTube uses `expire=<unix time>`, CloudFront style CDNs `Expires=` and
+    Facebook's CDN `oe=<hex unix time>`. Returns None if no URL says.
+    """
+    earliest = None
+    for fmt in info.get("formats") or [info]:
+        url = fmt.get("url") if isinstance(fmt, dict) else None
+        if not url:
+            continue
+        query = dict(parse_qsl(urlparse(url).query))
+        value = None
+        for name in _EXPIRY_PARAMS:
+            if query.get(name, "").isdigit():
+                value = float(query[name])
+                break
+        if value is None and query.get("oe"):
+            try:
+                value = float(int(query["oe"], 16))
+            except ValueError:
+                pass
+        if value is not None and (earliest is None or value < earliest):
+            earliest = value
+    return earliest
+
+
+class InfoStore:
+    """
+    Bounded, TTL'd map of handle -> sanitized yt-dlp info dict.
+
+    get_video_info stores the full extraction here so the download step can
+    go straight to format selection instead of extracting a second time.
+    Entries are only returned while their signed media URLs are still valid,
+    and only for the video (canonical_video_key) they were stored for, since
+    handles come back from clients.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_HANDLE_TTL,
+        max_entries: int = DEFAULT_HANDLE_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple[float, str, dict]]" = OrderedDict()
+
+    def put(self, info: dict, video_key: str) -> str:
+        """Store the info of video_key and return its handle."""
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self._entries[handle] = (time.time(), video_key, info)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return handle
+
+    def get(self, handle: Optional[str], video_key: str) -> Optional[dict]:
+        """Return the info for handle if it is video_key's, recent and not expired."""
+        if not handle:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None:
+                return None
+            stored, stored_key, info = entry
+            if stored_key != video_key:
+                return None
+            expires_at = format_urls_expire_at(info)
+            if now - stored > self.ttl or (
+                expires_at is not None and expires_at - EXPIRY_MARGIN < now
+            ):
+                del self._entries[handle]
+                return None
+            self._entries.move_to_end(handle)
+            return info
+
+    def discard(self, handle: Optional[str]) -> None:
+        """Forget handle, e.g. after its URLs turned out to be stale."""
+        with self._lock:
+            self._entries.pop(handle, None)
+
+
+_info_store: Optional[InfoStore] = None
+_info_store_lock = threading.Lock()
+
+
+def get_info_store() -> InfoStore:
+    """Return the process-wide info store."""
+    global _info_store
+    with _info_store_lock:
+        if _info_store is None:
+            _info_store = InfoStore(
+                ttl=env_float("VIDEO_DOWNLOADER_INFO_HANDLE_TTL", DEFAULT_HANDLE_TTL),
+                max_entries=env_int(
+                    "VIDEO_DOWNLOADER_INFO_HANDLE_MAX_ENTRIES", DEFAULT_HANDLE_MAX_ENTRIES
+                ),
+            )
+        return _info_store
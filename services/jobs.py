@@ -0,0 +1,408 @@
+"""Background download jobs run by a bounded worker pool."""
+
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+from services.cancel import CancelToken, DownloadCancelled
+from services.config import env_int
+from services.progress import ProgressChannel
+from services.state import StateBackend, get_state_backend
+
+logger = logging.getLogger(__name__)
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+PRIORITY_BACKGROUND = 20
+
+DEFAULT_JOB_RETENTION = 3600.0
+# Seconds between checks for jobs whose lease ran out
+LEASE_CHECK_INTERVAL = 2.0
+# Seconds between progress updates written to the state backend per job
+JOB_PUBLISH_INTERVAL = 1.0
+# Seconds between removals of old job records from the state backend
+JOB_PRUNE_INTERVAL = 60.0
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+JOB_CANCELLED = "cancelled"
+
+
+def parse_platform_limits(spec: str) -> dict[str, int]:
+    """Parse a `platform=limit,platform=limit` string into a dict."""
+    limits = {}
+    for item in (spec or "").split(","):
+        name, _, value = item.partition("=")
+        name = name.strip().lower()
+        if not name:
+            continue
+        try:
+            limits[name] = max(1, int(value))
+        except ValueError:
+            continue
+    return limits
+
+
+class Job:
+    """A unit of work tracked by the queue, with its progress channel."""
+
+    def __init__(
+        self,
+        fn: Callable,
+        kwargs: dict,
+        platform: str,
+        priority: int,
+        label: str,
+        lease: Optional[float] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.kwargs = kwargs
+        self.platform = platform
+        self.priority = priority
+        self.label = label
+        self.status = JOB_QUEUED
+        self.channel = ProgressChannel()
+        self.result: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        # Functions taking a cancel_token get the job's own token
+        self.cancel_token: CancelToken = kwargs.get("cancel_token") or CancelToken()
+        self.lease = lease
+        self.last_seen = time.time()
+        # Called after each progress event, e.g. to share the job's state
+        self.on_progress: Optional[Callable[[], None]] = None
+        # Called once with the job when it finishes, however it ends
+        self.on_done: Optional[Callable[["Job"], None]] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_DONE, JOB_ERROR, JOB_CANCELLED)
+
+    def touch(self) -> None:
+        """Renew the job's lease; call this while someone still wants the result."""
+        self.last_seen = time.time()
+
+    def _progress_hook(self, event: dict) -> None:
+        # Raising here stops functions that do not take a cancel_token too
+        self.cancel_token.raise_if_cancelled()
+        self.channel.publish(event)
+        if self.on_progress:
+            self.on_progress()
+
+    @property
+    def progress(self) -> Optional[dict]:
+        """Latest progress with speed and ETA, or None before the first event."""
+        return self.channel.snapshot()
+
+    def snapshot(self) -> dict:
+        """Return a JSON-friendly view of the job's state."""
+        return {
+            "id": self.id,
+            "label": self.label,
+            "platform": self.platform,
+            "priority": self.priority,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobQueue:
+    """
+    Priority queue of jobs executed by a fixed number of worker threads.
+
+    Lower priority values run first, FIFO within a priority. A platform
+    listed in `platform_limits` never has more than that many jobs running at
+    once; workers skip over its queued jobs until a slot frees up. Job
+    functions must accept a `progress_hook` keyword argument and return a
+    `(path, error)` tuple like the functions in services.downloader.
+
+    With a state backend, every job's snapshot is saved there as it
+    changes (progress at most every JOB_PUBLISH_INTERVAL seconds), so other
+    replicas can look it up and ask for it to be cancelled.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        platform_limits: Optional[dict[str, int]] = None,
+        retention: float = DEFAULT_JOB_RETENTION,
+        backend: Optional[StateBackend] = None,
+    ):
+        self.workers = max(1, workers)
+        self.platform_limits = dict(platform_limits or {})
+        self.retention = retention
+        self.backend = backend
+        self._cond = threading.Condition()
+        self._queued: list[tuple[int, int, Job]] = []
+        self._jobs: dict[str, Job] = {}
+        self._running: dict[str, int] = {}
+        self._seq = itertools.count()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"download-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        self._threads.append(
+            threading.Thread(target=self._expire_leases, name="job-leases", daemon=True)
+        )
+        for thread in self._threads:
+            thread.start()
+
+    def submit(
+        self,
+        fn: Callable,
+        platform: str = "generic",
+        priority: int = PRIORITY_INTERACTIVE,
+        label: str = "",
+        lease: Optional[float] = None,
+        on_done: Optional[Callable[[Job], None]] = None,
+        **kwargs,
+    ) -> Job:
+        """
+        Queue fn(**kwargs, progress_hook=...) and return its Job.
+
+        With a lease, the job is cancelled unless Job.touch() is called at
+        least every `lease` seconds, e.g. by the page polling it. on_done(job)
+        is called once the job has finished, including when it is cancelled
+        before a worker picked it up.
+        """
+        job = Job(fn, kwargs, platform, priority, label, lease)
+        job.on_progress = lambda: self._publish(job, force=False)
+        job.on_done = on_done
+        # Before a worker can pick it up, so this never overwrites a later state
+        self._publish(job)
+        with self._cond:
+            self._prune()
+            self._jobs[job.id] = job
+            self._queued.append((priority, next(self._seq), job))
+            self._queued.sort(key=lambda item: item[:2])
+            self._cond.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return the job with this id, or None if unknown or pruned."""
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def lookup(self, job_id: str) -> Optional[dict]:
+        """
+        Return a snapshot of the job, wherever it runs.
+
+        Jobs of this process are answered from memory; others from the
+        state backend, as last saved by the replica running them.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.load_job(job_id)
+        except Exception:
+            return None
+
+    def request_cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job of this process, or ask the replica running it to.
+
+        Returns False if the job is unknown or already finished.
+        """
+        if self.get(job_id) is not None:
+            return self.cancel(job_id)
+        if self.backend is None:
+            return False
+        try:
+            return self.backend.request_cancel(job_id)
+        except Exception:
+            return False
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job: drop it if queued, else cancel its token.
+
+        A running job stops at its next progress event or cancellation
+        check. Returns False if the job is unknown or already finished.
+        """
+        dropped = False
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            for index, (_, _, queued) in enumerate(self._queued):
+                if queued is job:
+                    del self._queued[index]
+                    job.status = JOB_CANCELLED
+                    job.error = str(DownloadCancelled())
+                    job.finished = time.time()
+                    dropped = True
+                    break
+        job.cancel_token.cancel()
+        if dropped:
+            self._finished(job)
+        return True
+
+    def promote(self, job_id: str, priority: int) -> bool:
+        """
+        Raise a queued job to `priority` (lower runs first).
+
+        Returns False if the job is not waiting in the queue.
+        """
+        with self._cond:
+            for index, (current, seq, job) in enumerate(self._queued):
+                if job.id == job_id:
+                    job.priority = min(current, priority)
+                    self._queued[index] = (job.priority, seq, job)
+                    self._queued.sort(key=lambda item: item[:2])
+                    return True
+        return False
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Return the 1-based queue position of a waiting job, else None."""
+        with self._cond:
+            for index, (_, _, job) in enumerate(self._queued):
+                if job.id == job_id:
+                    return index + 1
+        return None
+
+    def stats(self) -> dict:
+        """Return queue depth and running counts per platform."""
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "queued": len(self._queued),
+                "running": dict(self._running),
+            }
+
+    def _publish(self, job: Job, force: bool = True) -> None:
+        """Save the job's snapshot to the state backend, if there is one."""
+        if self.backend is None:
+            return
+        now = time.monotonic()
+        if not force and now - getattr(job, "_published", 0.0) < JOB_PUBLISH_INTERVAL:
+            return
+        job._published = now
+        try:
+            self.backend.save_job(job.snapshot())
+        except Exception:
+            # Sharing job state is best effort; never fail the job over it
+            pass
+
+    def _finished(self, job: Job) -> None:
+        self._publish(job)
+        if job.on_done is None:
+            return
+        try:
+            job.on_done(job)
+        except Exception:
+            logger.exception("Completion callback of job %s failed", job.id)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.done and job.finished and job.finished < cutoff:
+                del self._jobs[job_id]
+
+    def _has_capacity(self, platform: str) -> bool:
+        limit = self.platform_limits.get(platform)
+        return limit is None or self._running.get(platform, 0) < limit
+
+    def _next_job(self) -> Job:
+        with self._cond:
+            while True:
+                for index, (_, _, job) in enumerate(self._queued):
+                    if self._has_capacity(job.platform):
+                        del self._queued[index]
+                        self._running[job.platform] = (
+                            self._running.get(job.platform, 0) + 1
+                        )
+                        return job
+                self._cond.wait()
+
+    def _work(self) -> None:
+        while True:
+            job = self._next_job()
+            job.status = JOB_RUNNING
+            job.started = time.time()
+            self._publish(job)
+            try:
+                job.cancel_token.raise_if_cancelled()
+                result, error = job.fn(progress_hook=job._progress_hook, **job.kwargs)
+            except Exception as e:
+                result, error = None, str(e)
+            job.result = result
+            job.error = error
+            if job.cancel_token.cancelled:
+                job.result = None
+                job.error = str(DownloadCancelled())
+            elif not error and not result:
+                job.error = "Download produced no file"
+            job.finished = time.time()
+            if job.cancel_token.cancelled:
+                job.status = JOB_CANCELLED
+            else:
+                job.status = JOB_ERROR if job.error else JOB_DONE
+            with self._cond:
+                self._running[job.platform] -= 1
+                self._cond.notify_all()
+            self._finished(job)
+
+    def _expire_leases(self) -> None:
+        pruned = time.monotonic()
+        while True:
+            time.sleep(LEASE_CHECK_INTERVAL)
+            now = time.time()
+            with self._cond:
+                expired = [
+                    job.id
+                    for job in self._jobs.values()
+                    if job.lease and not job.done and now - job.last_seen > job.lease
+                ]
+                unfinished = [job.id for job in self._jobs.values() if not job.done]
+            for job_id in expired:
+                self.cancel(job_id)
+            if self.backend is None:
+                continue
+            try:
+                # Cancellations asked for through other replicas
+                for job_id in self.backend.cancel_requests(unfinished):
+                    self.cancel(job_id)
+                if time.monotonic() - pruned > JOB_PRUNE_INTERVAL:
+                    pruned = time.monotonic()
+                    self.backend.prune_jobs(now - self.retention)
+            except Exception:
+                pass
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue, starting its workers on first use."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                workers=env_int(
+                    "VIDEO_DOWNLOADER_WORKERS", min(4, os.cpu_count() or 1)
+                ),
+                platform_limits=parse_platform_limits(
+                    os.environ.get("VIDEO_DOWNLOADER_PLATFORM_LIMITS", "")
+                ),
+                backend=get_state_backend(),
+            )
+        return _job_queue
@@ -0,0 +1,205 @@
+"""Journal of in-flight downloads so they can be resumed after a restart."""
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from services.config import env_float, get_work_dir
+from services.state import StateBackend, get_state_backend
+
+
+DEFAULT_JOURNAL_STALE_AFTER = 6 * 3600.0
+DEFAULT_PARTIAL_MAX_AGE = 24 * 3600.0
+# Seconds between refreshes of a running download's `updated` time
+JOURNAL_HEARTBEAT_INTERVAL = 60.0
+
+# Leftovers of interrupted downloads: yt-dlp's .part/.ytdl/fragment files,
+# the ranged downloader's .ranges state, and yt-dlp's intermediate merges
+PARTIAL_PATTERNS = ("*.part", "*.part-Frag*", "*.ytdl", "*.ranges", "*.temp.*")
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        import ctypes
+
+        # PROCESS_QUERY_LIMITED_INFORMATION; os.kill(pid, 0) would kill on Windows
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def journal_entry_id(params: dict) -> str:
+    """
+    Id for one run of a download.
+
+    Runs with the same arguments (e.g. two users fetching one video) get
+    their own entries, so one finishing never drops the other's.
+    """
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return f"{digest.hexdigest()[:16]}-{uuid.uuid4().hex}"
+
+
+class DownloadJournal:
+    """
+    SQLite record of downloads that have started but not finished.
+
+    download_media adds an entry with its arguments before downloading and
+    removes it when the download ends, successfully or not. Entries left
+    behind belong to a process that died mid-download; orphaned() lists them
+    so they can be queued again, continuing from their partial files. Each
+    entry names its owner (host and pid). Running downloads call heartbeat()
+    as they make progress; entries of dead processes on this host, and
+    entries of any host not updated for `stale_after` seconds, are orphaned.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        stale_after: float = DEFAULT_JOURNAL_STALE_AFTER,
+        backend: Optional[StateBackend] = None,
+    ):
+        self.backend = backend or get_state_backend()
+        self.path = str(path or self.backend.database("journal"))
+        self.stale_after = stale_after
+        self.host = socket.gethostname()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS journal ("
+                " id TEXT PRIMARY KEY,"
+                " params TEXT NOT NULL,"
+                " host TEXT NOT NULL,"
+                " pid INTEGER NOT NULL,"
+                " started REAL NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return self.backend.connect(self.path)
+
+    def begin(self, params: dict) -> str:
+        """Record that a download with these arguments is running here."""
+        entry_id = journal_entry_id(params)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO journal (id, params, host, pid, started, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (entry_id, json.dumps(params), self.host, os.getpid(), now, now),
+            )
+        return entry_id
+
+    def heartbeat(self, entry_id: str) -> None:
+        """Mark a download of this process as still running."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE journal SET updated = ? WHERE id = ? AND host = ? AND pid = ?",
+                (time.time(), entry_id, self.host, os.getpid()),
+            )
+
+    def finish(self, entry_id: str) -> None:
+        """Forget a download that completed or failed for good."""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM journal WHERE id = ? AND host = ? AND pid = ?",
+                (entry_id, self.host, os.getpid()),
+            )
+
+    def _is_orphaned(self, host: str, pid: int, updated: float, now: float) -> bool:
+        if host == self.host and pid == os.getpid():
+            return False
+        if host == self.host and not _pid_alive(pid):
+            return True
+        return now - updated > self.stale_after
+
+    def orphaned(self) -> list[dict]:
+        """Return [{"id", "params", "started"}] of downloads whose process is gone."""
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, params, host, pid, started, updated FROM journal"
+            ).fetchall()
+        return [
+            {"id": entry_id, "params": json.loads(params), "started": started}
+            for entry_id, params, host, pid, started, updated in rows
+            if self._is_orphaned(host, pid, updated, now)
+        ]
+
+    def claim(self, entry_id: str) -> bool:
+        """
+        Take over an orphaned entry; False if another process got it first.
+
+        The claimed entry stays in the journal under this process until the
+        resumed download finishes, so a second crash leaves it orphaned again.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT host, pid, updated FROM journal WHERE id = ?", (entry_id,)
+            ).fetchone()
+            if row is None or not self._is_orphaned(*row, time.time()):
+                return False
+            cursor = conn.execute(
+                "UPDATE journal SET host = ?, pid = ?, updated = ?"
+                " WHERE id = ? AND host = ? AND pid = ?",
+                (self.host, os.getpid(), time.time(), entry_id, row[0], row[1]),
+            )
+            return cursor.rowcount == 1
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+
+def collect_partial_files(
+    directory: Optional[str] = None, max_age: float = DEFAULT_PARTIAL_MAX_AGE
+) -> list[str]:
+    """
+    Delete leftovers of interrupted downloads not touched for max_age seconds.
+
+    Partial files of downloads that are being resumed are rewritten and so
+    stay younger than max_age. Returns the removed paths.
+    """
+    directory = Path(directory or get_work_dir())
+    cutoff = time.time() - max_age
+    removed = []
+    for pattern in PARTIAL_PATTERNS:
+        for path in directory.glob(pattern):
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed.append(str(path))
+            except OSError:
+                continue
+    return removed
+
+
+_journal: Optional[DownloadJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_download_journal() -> DownloadJournal:
+    """Return the process-wide download journal."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = DownloadJournal(
+                stale_after=env_float(
+                    "VIDEO_DOWNLOADER_JOURNAL_STALE_AFTER", DEFAULT_JOURNAL_STALE_AFTER
+                ),
+            )
+        return _journal
@@ -0,0 +1,261 @@
+"""Per-phase download timings exported as Prometheus-style metrics."""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+_job_log_handler: Optional[logging.Handler] = None
+_job_log_lock = threading.Lock()
+
+
+PHASE_EXTRACT = "extract"
+PHASE_SELECT_FORMAT = "select_format"
+PHASE_TRANSFER = "transfer"
+PHASE_MERGE = "merge"
+PHASE_POSTPROCESS = "postprocess"
+PHASE_SERVE = "serve"
+
+OUTCOME_OK = "ok"
+OUTCOME_CACHED = "cached"
+OUTCOME_ERROR = "error"
+OUTCOME_CANCELLED = "cancelled"
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# yt-dlp post-processors that merge separate streams (stream copy)
+MERGE_POSTPROCESSORS = {"Merger", "FFmpegMerger"}
+
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and histograms rendered in the Prometheus text format.
+
+    Metrics are identified by name and a sorted tuple of label pairs.
+    Gauges are callbacks evaluated when rendering, for values that already
+    live elsewhere (e.g. the job queue depth).
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help: dict[str, tuple[str, str]] = {}
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, list]] = {}
+        self._gauges: dict[str, Callable[[], dict]] = {}
+
+    def describe(self, name: str, kind: str, text: str) -> None:
+        self._help[name] = (kind, text)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # Per-bucket counts (non-cumulative), then sum and count
+            state = series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def gauge(self, name: str, read: Callable[[], dict]) -> None:
+        """Register read() -> {label pairs tuple: value}, called at render time."""
+        self._gauges[name] = read
+
+    def value(self, name: str, **labels) -> float:
+        """Current value of a counter series (0 if never incremented)."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            return self._counters.get(name, {}).get(key, 0)
+
+    def histogram(self, name: str, **labels) -> Optional[dict]:
+        """Return {"count", "sum"} of a histogram series, or None."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self._histograms.get(name, {}).get(key)
+            return None if state is None else {"count": state[2], "sum": state[1]}
+
+    def _header(self, lines: list, name: str, default_kind: str) -> None:
+        kind, text = self._help.get(name, (default_kind, ""))
+        if text:
+            lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            counters = {n: dict(s) for n, s in self._counters.items()}
+            histograms = {
+                n: {k: (list(v[0]), v[1], v[2]) for k, v in s.items()}
+                for n, s in self._histograms.items()
+            }
+        for name in sorted(counters):
+            self._header(lines, name, "counter")
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{name}{_label_text(key)} {_number(value)}")
+        for name in sorted(histograms):
+            self._header(lines, name, "histogram")
+            for key, (counts, total, count) in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = key + (("le", _number(bound)),)
+                    lines.append(f"{name}_bucket{_label_text(le)} {cumulative}")
+                lines.append(f"{name}_bucket{_label_text(key + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_label_text(key)} {_number(total)}")
+                lines.append(f"{name}_count{_label_text(key)} {count}")
+        for name in sorted(self._gauges):
+            try:
+                values = self._gauges[name]()
+            except Exception:
+                continue
+            self._header(lines, name, "gauge")
+            for key, value in sorted(values.items()):
+                lines.append(f"{name}{_label_text(key)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.describe(
+    "video_downloader_phase_seconds", "histogram", "Time spent per download phase"
+)
+registry.describe(
+    "video_downloader_downloads_total", "counter", "Finished downloads by outcome"
+)
+registry.describe(
+    "video_downloader_bytes_total", "counter", "Bytes of media produced by downloads"
+)
+registry.describe(
+    "video_downloader_served_bytes_total", "counter", "Bytes sent to clients by the file server"
+)
+
+
+class JobTrace:
+    """
+    Timed spans of one download, labelled with platform, kind and quality.
+
+    Each span is observed in the phase histogram as soon as it ends. finish()
+    counts the download by outcome and, when VIDEO_DOWNLOADER_JOB_LOG is set,
+    logs one JSON line with every span, the byte count and the error.
+    """
+
+    def __init__(self, kind: str, platform: str, quality: str, url: str = ""):
+        self.labels = {"kind": kind, "platform": platform, "quality": quality}
+        self.url = url
+        self.started = time.monotonic()
+        self.spans: list[tuple[str, float]] = []
+        self.bytes = 0
+        # Set when an existing file was reused instead of downloading
+        self.cached = False
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.spans.append((phase, seconds))
+        registry.observe(
+            "video_downloader_phase_seconds", seconds, phase=phase, **self.labels
+        )
+
+    @contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(phase, time.monotonic() - started)
+
+    def add_bytes(self, count: int) -> None:
+        with self._lock:
+            self.bytes += count
+        registry.inc("video_downloader_bytes_total", count, **self.labels)
+
+    def phase_totals(self) -> dict:
+        totals: dict[str, float] = {}
+        with self._lock:
+            for phase, seconds in self.spans:
+                totals[phase] = totals.get(phase, 0.0) + seconds
+        return totals
+
+    def finish(self, outcome: str, error: Optional[str] = None) -> None:
+        """Count the download once and emit the optional job log line."""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+        registry.inc("video_downloader_downloads_total", outcome=outcome, **self.labels)
+        if os.environ.get("VIDEO_DOWNLOADER_JOB_LOG"):
+            _enable_job_log()
+            logger.info(
+                json.dumps(
+                    {
+                        "event": "download",
+                        "url": self.url,
+                        **self.labels,
+                        "outcome": outcome,
+                        "seconds": round(time.monotonic() - self.started, 3),
+                        "phases": {
+                            phase: round(seconds, 3)
+                            for phase, seconds in self.phase_totals().items()
+                        },
+                        "bytes": self.bytes,
+                        "error": error,
+                    }
+                )
+            )
+
+
+def _enable_job_log() -> None:
+    """
+    Make the job log lines visible.
+
+    They are logged at INFO, which Python drops unless logging is
+    configured; when nothing is, they are printed on stderr.
+    """
+    global _job_log_handler
+    with _job_log_lock:
+        if logger.getEffectiveLevel() > logging.INFO:
+            logger.setLevel(logging.INFO)
+        if _job_log_handler is None and not logging.getLogger().handlers:
+            _job_log_handler = logging.StreamHandler()
+            _job_log_handler.setLevel(logging.INFO)
+            logger.addHandler(_job_log_handler)
+
+
+def record_serve(seconds: float, sent_bytes: int, kind: str) -> None:
+    """Record one file served to a client (platform and quality are unknown there)."""
+    registry.observe(
+        "video_downloader_phase_seconds",
+        seconds,
+        phase=PHASE_SERVE,
+        kind=kind,
+        platform="",
+        quality="",
+    )
+    registry.inc("video_downloader_served_bytes_total", sent_bytes, kind=kind)
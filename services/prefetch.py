@@ -0,0 +1,207 @@
+"""Speculative background downloads started when a preview is shown."""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from services.bandwidth import get_bandwidth_scheduler
+from services.config import env_float, env_int
+from services.jobs import PRIORITY_INTERACTIVE, Job, JobQueue, get_job_queue
+
+
+DEFAULT_PREFETCH_MAX_ACTIVE = 2
+DEFAULT_PREFETCH_DISK_MB = 1024
+DEFAULT_PREFETCH_TTL = 1800.0
+# The preview page reruns only on interaction, so this is longer than JOB_LEASE
+DEFAULT_PREFETCH_LEASE = 300.0
+
+
+def prefetch_enabled() -> bool:
+    """Prefetching is opt-in: VIDEO_DOWNLOADER_PREFETCH=1."""
+    return os.environ.get("VIDEO_DOWNLOADER_PREFETCH", "").lower() in ("1", "true", "yes")
+
+
+def prefetch_key(params: dict) -> str:
+    """Identify a prefetch by the download arguments that shape its result."""
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class _Prefetch:
+    def __init__(self, job: Job):
+        self.job = job
+        self.owners: set[str] = set()
+
+
+class Prefetcher:
+    """
+    Budgeted background downloads that a later click can take over.
+
+    Pages call want() once a preview is shown, with the download the user
+    would get by clicking now. The job is queued at background priority
+    (submit() decides how), unless `max_active` prefetches are already
+    running or unclaimed prefetched bytes exceed `disk_budget_bytes`.
+    Pages that change URL or settings release() their key; a prefetch
+    nobody wants any more is cancelled if still running. claim() hands the
+    job to the click, raising it to interactive priority. Prefetches that
+    finished more than `ttl` seconds ago no longer count against the
+    budgets; their files stay in the result store, under its disk budget.
+
+    submit() should download under bandwidth.prefetch_session(), so running
+    prefetches share the scheduler's prefetch group and rate cap.
+
+    Prefetch jobs hold a `lease` like foreground jobs: pages renew it with
+    touch() (or want()) while they show the preview, so a prefetch whose
+    tabs were all closed is cancelled by the job queue.
+    """
+
+    def __init__(
+        self,
+        queue: Optional[JobQueue] = None,
+        max_active: int = DEFAULT_PREFETCH_MAX_ACTIVE,
+        disk_budget_bytes: int = DEFAULT_PREFETCH_DISK_MB * 1024 * 1024,
+        ttl: float = DEFAULT_PREFETCH_TTL,
+        lease: Optional[float] = DEFAULT_PREFETCH_LEASE,
+    ):
+        self.queue = queue
+        self.max_active = max(0, max_active)
+        self.disk_budget_bytes = disk_budget_bytes
+        self.ttl = ttl
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._prefetches: dict[str, _Prefetch] = {}
+        self.started = 0
+        self.claimed = 0
+        self.skipped = 0
+
+    def _queue(self) -> JobQueue:
+        return self.queue or get_job_queue()
+
+    def _job_bytes(self, job: Job) -> int:
+        if job.done:
+            if job.result and os.path.exists(job.result):
+                return os.path.getsize(job.result)
+            return 0
+        return (job.progress or {}).get("downloaded_bytes") or 0
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl
+        for key, prefetch in list(self._prefetches.items()):
+            job = prefetch.job
+            if job.done and (job.error or (job.finished or 0) < cutoff):
+                del self._prefetches[key]
+
+    def _has_budget(self) -> bool:
+        prefetches = list(self._prefetches.values())
+        active = sum(1 for p in prefetches if not p.job.done)
+        if active >= self.max_active:
+            return False
+        used = sum(self._job_bytes(p.job) for p in prefetches)
+        return used < self.disk_budget_bytes
+
+    def want(self, key: str, owner: str, submit: Callable[[], Job]) -> Optional[Job]:
+        """
+        Register owner's interest in key and return its prefetch job.
+
+        submit() must queue the download and return its Job; it is only
+        called when no prefetch exists for key and the budgets allow one.
+        Returns None when the prefetch was skipped.
+        """
+        with self._lock:
+            self._prune()
+            prefetch = self._prefetches.get(key)
+            if prefetch is None:
+                if not self._has_budget():
+                    self.skipped += 1
+                    return None
+                prefetch = _Prefetch(submit())
+                prefetch.job.lease = self.lease
+                self._prefetches[key] = prefetch
+                self.started += 1
+            prefetch.owners.add(owner)
+            prefetch.job.touch()
+            return prefetch.job
+
+    def touch(self, key: str) -> None:
+        """Renew the lease of key's prefetch; call this while its page is open."""
+        with self._lock:
+            prefetch = self._prefetches.get(key)
+        if prefetch is not None:
+            prefetch.job.touch()
+
+    def release(self, key: str, owner: str) -> None:
+        """Drop owner's interest; cancel the prefetch once nobody wants it."""
+        with self._lock:
+            prefetch = self._prefetches.get(key)
+            if prefetch is None:
+                return
+            prefetch.owners.discard(owner)
+            if prefetch.owners or prefetch.job.done:
+                return
+            del self._prefetches[key]
+        self._queue().cancel(prefetch.job.id)
+
+    def claim(self, key: str, lease: Optional[float] = None) -> Optional[Job]:
+        """
+        Take over the prefetch for key as an interactive download.
+
+        Returns its job (running, queued or finished), or None if there is
+        no usable prefetch. With a lease, the job from now on is cancelled
+        unless polled, like any job submitted with one.
+        """
+        with self._lock:
+            prefetch = self._prefetches.pop(key, None)
+        if prefetch is None or prefetch.job.error:
+            return None
+        job = prefetch.job
+        if job.done and not (job.result and os.path.exists(job.result)):
+            # Evicted from the result store since
+            return None
+        self._queue().promote(job.id, PRIORITY_INTERACTIVE)
+        # Off the prefetch bandwidth group, if it is still downloading
+        get_bandwidth_scheduler().claim(job.kwargs.get("cancel_token"))
+        if lease is not None:
+            job.touch()
+            job.lease = lease
+        self.claimed += 1
+        return job
+
+    def stats(self) -> dict:
+        """Return started/claimed/skipped counts and current usage."""
+        with self._lock:
+            self._prune()
+            prefetches = list(self._prefetches.values())
+            return {
+                "started": self.started,
+                "claimed": self.claimed,
+                "skipped": self.skipped,
+                "active": sum(1 for p in prefetches if not p.job.done),
+                "bytes": sum(self._job_bytes(p.job) for p in prefetches),
+            }
+
+
+_prefetcher: Optional[Prefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> Prefetcher:
+    """Return the process-wide prefetcher."""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher(
+                max_active=env_int(
+                    "VIDEO_DOWNLOADER_PREFETCH_MAX_ACTIVE", DEFAULT_PREFETCH_MAX_ACTIVE
+                ),
+                disk_budget_bytes=env_int(
+                    "VIDEO_DOWNLOADER_PREFETCH_DISK_MB", DEFAULT_PREFETCH_DISK_MB
+                )
+                * 1024
+                * 1024,
+                ttl=env_float("VIDEO_DOWNLOADER_PREFETCH_TTL", DEFAULT_PREFETCH_TTL),
+                lease=env_float(
+                    "VIDEO_DOWNLOADER_PREFETCH_LEASE", DEFAULT_PREFETCH_LEASE
+                ),
+            )
+        return _prefetcher
@@ -0,0 +1,144 @@
+"""Per-download progress channel with speed/ETA and rate-limited subscribers."""
+
+import threading
+import time
+from typing import Callable, Optional
+
+
+DEFAULT_PROGRESS_INTERVAL = 0.25
+# Weight of the newest sample in the smoothed speed
+SPEED_SMOOTHING = 0.3
+# Shortest span a speed sample is taken over
+SPEED_SAMPLE_INTERVAL = 0.5
+
+
+class ProgressChannel:
+    """
+    Latest progress of one download, fed by yt-dlp style progress events.
+
+    publish() is used as the download's progress hook and only updates a few
+    numbers under a lock, so it is cheap enough to call for every chunk.
+    Readers either poll snapshot() or subscribe(); subscribers are called at
+    most once per `interval` seconds while downloading, and always on a
+    status change, so a UI is never updated at chunk rate.
+    """
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_PROGRESS_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.interval = interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._subscribers: list[Callable[[dict], None]] = []
+        self._status: Optional[str] = None
+        self._downloaded = 0
+        self._total: Optional[int] = None
+        self._filename: Optional[str] = None
+        self._speed: Optional[float] = None
+        self._sample: Optional[tuple[float, int]] = None
+        self._last_emit = float("-inf")
+        self._updated: Optional[float] = None
+
+    def publish(self, event: dict) -> None:
+        """Record a progress event (usable directly as a progress_hook)."""
+        now = self._clock()
+        with self._lock:
+            status = event.get("status")
+            changed = status != self._status
+            self._status = status
+            self._updated = time.time()
+            if event.get("filename"):
+                self._filename = event["filename"]
+            if status == "downloading":
+                downloaded = event.get("downloaded_bytes") or 0
+                self._total = (
+                    event.get("total_bytes") or event.get("total_bytes_estimate") or None
+                )
+                self._update_speed(now, downloaded)
+                self._downloaded = downloaded
+            elif status == "finished" and self._total:
+                self._downloaded = self._total
+            emit = bool(self._subscribers) and (
+                changed or now - self._last_emit >= self.interval
+            )
+            if emit:
+                self._last_emit = now
+                subscribers = list(self._subscribers)
+                snapshot = self._snapshot()
+        if emit:
+            for callback in subscribers:
+                try:
+                    callback(snapshot)
+                except Exception:
+                    # A failing reader must not abort the download
+                    pass
+
+    def _update_speed(self, now: float, downloaded: int) -> None:
+        if self._sample is None or downloaded < self._sample[1]:
+            # First event, or a new file of a multi-file download started
+            self._sample = (now, downloaded)
+            return
+        started, start_bytes = self._sample
+        elapsed = now - started
+        if elapsed < SPEED_SAMPLE_INTERVAL:
+            return
+        rate = (downloaded - start_bytes) / elapsed
+        if self._speed is None:
+            self._speed = rate
+        else:
+            self._speed = SPEED_SMOOTHING * rate + (1 - SPEED_SMOOTHING) * self._speed
+        self._sample = (now, downloaded)
+
+    def _snapshot(self) -> dict:
+        eta = None
+        fraction = None
+        if self._total:
+            fraction = min(1.0, self._downloaded / self._total)
+            if self._speed and self._status == "downloading":
+                eta = max(0.0, (self._total - self._downloaded) / self._speed)
+        return {
+            "status": self._status,
+            "downloaded_bytes": self._downloaded,
+            "total_bytes": self._total,
+            "fraction": fraction,
+            "speed": self._speed,
+            "eta": eta,
+            "filename": self._filename,
+            "updated": self._updated,
+        }
+
+    def snapshot(self) -> Optional[dict]:
+        """Current progress, or None before the first event."""
+        with self._lock:
+            if self._status is None:
+                return None
+            return self._snapshot()
+
+    def subscribe(self, callback: Callable[[dict], None]) -> None:
+        """Call callback(snapshot) on status changes and at most every `interval` s."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+
+def format_speed(speed: Optional[float]) -> str:
+    """Human readable transfer rate, e.g. `3.2 MB/s`."""
+    if not speed:
+        return ""
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if speed < 1024:
+            return f"{speed:.0f} {unit}" if unit == "B/s" else f"{speed:.1f} {unit}"
+        speed /= 1024
+    return f"{speed:.1f} GB/s"
+
+
+def format_eta(eta: Optional[float]) -> str:
+    """ETA as `m:ss` or `h:mm:ss`."""
+    if eta is None:
+        return ""
+    minutes, seconds = divmod(int(eta + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
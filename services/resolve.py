@@ -0,0 +1,221 @@
+"""Resolve a video through several backends, sequentially, hedged or raced."""
+
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from services.cancel import CancelToken
+from services.config import env_float
+from services.metrics import registry
+
+
+POLICY_SEQUENTIAL = "sequential"
+POLICY_HEDGED = "hedged"
+POLICY_RACE = "race"
+POLICIES = (POLICY_SEQUENTIAL, POLICY_HEDGED, POLICY_RACE)
+
+# Facebook is the slowest platform to resolve, and the only one with two backends
+DEFAULT_POLICIES = {"facebook": POLICY_HEDGED}
+DEFAULT_HEDGE_DELAY = 2.0
+
+# Recorded as the winner when no backend resolved the video
+NO_WINNER = "none"
+
+registry.describe(
+    "video_downloader_resolutions_total",
+    "counter",
+    "Resolutions by platform, policy and winning backend",
+)
+registry.describe(
+    "video_downloader_resolution_seconds",
+    "histogram",
+    "Time until the first backend resolved a video",
+)
+
+
+def parse_policies(spec: str) -> dict[str, str]:
+    """Parse a `platform=policy,platform=policy` string into a dict."""
+    policies = {}
+    for item in (spec or "").split(","):
+        name, _, value = item.partition("=")
+        name, value = name.strip().lower(), value.strip().lower()
+        if name and value in POLICIES:
+            policies[name] = value
+    return policies
+
+
+class Backend:
+    """
+    A named way to resolve a video.
+
+    resolve(cancel_token) returns a truthy value on success (a media URL,
+    an info handle, ...) and None or raises on failure. It should return
+    early once cancel_token is cancelled, where it can.
+    """
+
+    def __init__(self, name: str, resolve: Callable[[CancelToken], Any]):
+        self.name = name
+        self.resolve = resolve
+
+
+class Resolver:
+    """
+    Run a platform's backends under its policy; the first success wins.
+
+    Backends are given in order of preference. "sequential" tries the next
+    one only after the previous failed. "hedged" also starts it once the
+    previous has taken `hedge_delay` seconds. "race" starts all at once.
+    Once one succeeds, the others' cancel tokens are cancelled and their
+    results are ignored. Wins and failures per backend are kept in stats()
+    and exported at /metrics.
+    """
+
+    def __init__(
+        self,
+        policies: Optional[dict[str, str]] = None,
+        hedge_delay: float = DEFAULT_HEDGE_DELAY,
+    ):
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.hedge_delay = hedge_delay
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, dict[str, int]]] = {}
+
+    def policy_for(self, platform: str) -> str:
+        return self.policies.get(platform, POLICY_SEQUENTIAL)
+
+    def _count(self, platform: str, backend: str, field: str) -> None:
+        with self._lock:
+            counts = self._stats.setdefault(platform, {}).setdefault(
+                backend, {"wins": 0, "failures": 0}
+            )
+            counts[field] += 1
+
+    def resolve(
+        self,
+        platform: str,
+        backends: list[Backend],
+        cancel_token: Optional[CancelToken] = None,
+    ) -> tuple[Optional[str], Any]:
+        """
+        Return (backend name, value) of the first success, or (None, None).
+
+        Also returns (None, None) as soon as cancel_token is cancelled.
+        """
+        policy = self.policy_for(platform)
+        if policy == POLICY_RACE:
+            delay = 0.0
+        elif policy == POLICY_HEDGED:
+            delay = self.hedge_delay
+        else:
+            delay = None
+        results: "queue.Queue[Optional[tuple[int, Any]]]" = queue.Queue()
+        tokens: list[CancelToken] = []
+        started = time.monotonic()
+
+        def run(index: int, token: CancelToken) -> None:
+            try:
+                value = backends[index].resolve(token)
+            except Exception:
+                value = None
+            results.put((index, value))
+
+        def launch() -> None:
+            token = CancelToken()
+            tokens.append(token)
+            threading.Thread(
+                target=run,
+                args=(len(tokens) - 1, token),
+                name=f"resolve-{backends[len(tokens) - 1].name}",
+                daemon=True,
+            ).start()
+
+        remove_wakeup = (
+            cancel_token.on_cancel(lambda: results.put(None)) if cancel_token else None
+        )
+        winner, value = None, None
+        try:
+            launch()
+            pending = 1
+            next_launch = started + delay if delay is not None else None
+            while pending:
+                more = len(tokens) < len(backends)
+                while more and next_launch is not None and time.monotonic() >= next_launch:
+                    launch()
+                    pending += 1
+                    more = len(tokens) < len(backends)
+                    next_launch = time.monotonic() + delay
+                timeout = None
+                if more and next_launch is not None:
+                    timeout = max(0.0, next_launch - time.monotonic())
+                try:
+                    item = results.get(timeout=timeout)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    break
+                pending -= 1
+                index, result = item
+                if result:
+                    winner, value = backends[index].name, result
+                    break
+                self._count(platform, backends[index].name, "failures")
+                if more:
+                    # A failure starts the next backend right away
+                    launch()
+                    pending += 1
+                    if delay is not None:
+                        next_launch = time.monotonic() + delay
+        finally:
+            if remove_wakeup:
+                remove_wakeup()
+            for token in tokens:
+                token.cancel()
+
+        if cancel_token is not None and cancel_token.cancelled:
+            return None, None
+        self._count(platform, winner or NO_WINNER, "wins")
+        registry.inc(
+            "video_downloader_resolutions_total",
+            platform=platform,
+            policy=policy,
+            backend=winner or NO_WINNER,
+        )
+        if winner:
+            registry.observe(
+                "video_downloader_resolution_seconds",
+                time.monotonic() - started,
+                platform=platform,
+                backend=winner,
+            )
+        return winner, value
+
+    def stats(self) -> dict:
+        """Return {platform: {backend: {"wins", "failures"}}}."""
+        with self._lock:
+            return {
+                platform: {name: dict(counts) for name, counts in backends.items()}
+                for platform, backends in self._stats.items()
+            }
+
+
+_resolver: Optional[Resolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> Resolver:
+    """Return the process-wide resolver."""
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = Resolver(
+                policies=dict(
+                    DEFAULT_POLICIES,
+                    **parse_policies(os.environ.get("VIDEO_DOWNLOADER_RESOLVE_POLICY", "")),
+                ),
+                hedge_delay=env_float(
+                    "VIDEO_DOWNLOADER_RESOLVE_HEDGE_DELAY", DEFAULT_HEDGE_DELAY
+                ),
+            )
+        return _resolver
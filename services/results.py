@@ -0,0 +1,192 @@
+"""Content-addressed index of finished downloads with disk-budget eviction."""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from services.config import env_float, env_int
+from services.metrics import registry
+from services.state import StateBackend, get_state_backend
+
+
+DEFAULT_DISK_BUDGET_MB = 5120
+DEFAULT_RESULT_MAX_AGE = 7 * 24 * 3600.0
+
+registry.describe(
+    "video_downloader_result_cache_total",
+    "counter",
+    "Result store lookups by outcome (hit or miss)",
+)
+
+
+def result_key(video_key: str, kind: str, selector: str, postprocessing) -> str:
+    """
+    Hash everything that determines the produced file into one key.
+
+    `postprocessing` is any JSON-serializable description of the
+    post-processing settings (postprocessors list, merge format, ...).
+    """
+    payload = json.dumps(
+        [video_key, kind, selector, postprocessing], sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """
+    Index of finished files so identical requests are served from disk.
+
+    Files stay where the downloader put them; the store only records their
+    path and size. Entries older than `max_age` seconds are dropped, and the
+    least recently used files are deleted once the total size exceeds
+    `budget_bytes`. Hit and miss counts are persisted alongside the index
+    and counted in the /metrics registry.
+    The index lives in the state backend, so replicas sharing it and the
+    work directory reuse each other's files.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        budget_bytes: int = DEFAULT_DISK_BUDGET_MB * 1024 * 1024,
+        max_age: float = DEFAULT_RESULT_MAX_AGE,
+        backend: Optional[StateBackend] = None,
+    ):
+        self.backend = backend or get_state_backend()
+        self.path = str(path or self.backend.database("results"))
+        self.budget_bytes = budget_bytes
+        self.max_age = max_age
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self.backend.connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " video_key TEXT NOT NULL,"
+                " path TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS result_stats ("
+                " name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    def _bump(self, conn, name: str) -> None:
+        conn.execute(
+            "INSERT INTO result_stats (name, value) VALUES (?, 1)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the stored file path for key, or None on a miss."""
+        now = time.time()
+        with self.backend.connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT path, created FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.max_age and os.path.exists(row[0]):
+                conn.execute(
+                    "UPDATE results SET accessed = ? WHERE key = ?", (now, key)
+                )
+                self._bump(conn, "hits")
+                registry.inc("video_downloader_result_cache_total", outcome="hit")
+                return row[0]
+            if row:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._bump(conn, "misses")
+        registry.inc("video_downloader_result_cache_total", outcome="miss")
+        return None
+
+    def add(self, key: str, video_key: str, file_path: str) -> None:
+        """Record a finished file and enforce the disk budget."""
+        if not file_path or not os.path.exists(file_path):
+            return
+        now = time.time()
+        with self.backend.connect(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results"
+                " (key, video_key, path, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, video_key, file_path, os.path.getsize(file_path), now, now),
+            )
+        self.evict(keep=key)
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Drop expired entries, then least recently used ones over budget.
+
+        The entry named by `keep` is never evicted. Returns the number of
+        entries removed.
+        """
+        now = time.time()
+        removed = []
+        with self.backend.connect(self.path) as conn:
+            rows = conn.execute(
+                "SELECT key, path, size, created FROM results ORDER BY accessed DESC"
+            ).fetchall()
+            total = 0
+            live_paths = set()
+            for key, path, size, created in rows:
+                live = key == keep or (
+                    now - created <= self.max_age
+                    and total + size <= self.budget_bytes
+                )
+                if live:
+                    total += size
+                    live_paths.add(path)
+                else:
+                    removed.append((key, path))
+            for key, path in removed:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._bump(conn, "evictions")
+        for _, path in removed:
+            if path in live_paths:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return len(removed)
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and current disk usage."""
+        with self.backend.connect(self.path) as conn:
+            counters = dict(conn.execute("SELECT name, value FROM result_stats"))
+            count, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "entries": count,
+            "bytes": size,
+        }
+
+
+_result_store: Optional[ResultStore] = None
+_result_store_lock = threading.Lock()
+
+
+def get_result_store() -> ResultStore:
+    """Return the process-wide result store, creating it on first use."""
+    global _result_store
+    with _result_store_lock:
+        if _result_store is None:
+            _result_store = ResultStore(
+                budget_bytes=env_int(
+                    "VIDEO_DOWNLOADER_DISK_BUDGET_MB", DEFAULT_DISK_BUDGET_MB
+                )
+                * 1024
+                * 1024,
+                max_age=env_float(
+                    "VIDEO_DOWNLOADER_RESULT_MAX_AGE", DEFAULT_RESULT_MAX_AGE
+                ),
+            )
+        return _result_store
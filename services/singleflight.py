@@ -0,0 +1,184 @@
+"""Single-flight execution so identical downloads run only once at a time."""
+
+import threading
+from typing import Callable, Optional
+
+from services.cancel import CancelToken, DownloadCancelled
+from services.state import FileLeases, StateBackend, get_state_backend
+
+
+DEFAULT_LOCK_STALE_AFTER = 120.0
+LOCK_HEARTBEAT_INTERVAL = 5.0
+LOCK_POLL_INTERVAL = 0.5
+
+
+class _Flight:
+    """State shared between the leader of a call and the callers attached to it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.hooks: list = []
+        self.last_event: Optional[dict] = None
+        self.lock = threading.Lock()
+        # Cancelled once every attached caller has cancelled
+        self.token = CancelToken()
+        self.callers = 0
+        self.abandoned = False
+
+    def attach(self, hook, cancel_token: Optional[CancelToken] = None) -> bool:
+        """Join the flight; False if every caller already left and it is stopping."""
+        with self.lock:
+            if self.abandoned:
+                return False
+            self.callers += 1
+            if hook is not None:
+                self.hooks.append(hook)
+            last_event = self.last_event
+        if hook is not None and last_event is not None:
+            hook(last_event)
+        if cancel_token is not None:
+            cancel_token.on_cancel(lambda: self._leave(hook))
+        return True
+
+    def _leave(self, hook) -> None:
+        with self.lock:
+            self.callers -= 1
+            if hook in self.hooks:
+                self.hooks.remove(hook)
+            abandoned = self.abandoned = self.callers == 0
+        if abandoned:
+            self.token.cancel()
+
+    def publish(self, event: dict) -> None:
+        self.token.raise_if_cancelled()
+        with self.lock:
+            self.last_event = event
+            hooks = list(self.hooks)
+        for hook in hooks:
+            try:
+                hook(event)
+            except Exception:
+                # One session's UI failing must not abort the shared download
+                pass
+
+
+class SingleFlight:
+    """
+    Run a function at most once per key, sharing its result and progress.
+
+    Within a process, the first caller for a key becomes the leader and the
+    others wait for its result while receiving its progress events. Across
+    processes and replicas, a lease from the state backend makes the others
+    wait until the leader finishes; they then run the function themselves,
+    which is expected to find the leader's output in the result store.
+    Leases not renewed for `stale_after` seconds are treated as abandoned.
+    With `lock_dir`, leases are lock files in that directory instead.
+    """
+
+    def __init__(
+        self,
+        lock_dir: Optional[str] = None,
+        stale_after: float = DEFAULT_LOCK_STALE_AFTER,
+        backend: Optional[StateBackend] = None,
+    ):
+        self._leases = FileLeases(lock_dir) if lock_dir else backend or get_state_backend()
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._flights: dict[str, _Flight] = {}
+
+    def in_flight(self, key: str) -> bool:
+        """Return True if a call for key is running in this process."""
+        with self._lock:
+            return key in self._flights
+
+    def do(
+        self,
+        key: str,
+        fn: Callable,
+        progress_hook=None,
+        cancel_token: Optional[CancelToken] = None,
+    ):
+        """
+        Run fn(progress_hook, cancel_token) once for key and return its result.
+
+        fn receives a hook that fans progress events out to every caller
+        attached to the flight, and the flight's cancel token. Exceptions
+        raised by the leader are re-raised in every waiting caller.
+
+        A caller whose cancel_token is cancelled stops waiting (raising
+        DownloadCancelled) and no longer receives progress. The run itself is
+        only cancelled, and its hook starts raising DownloadCancelled, once
+        every attached caller has cancelled.
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+            if flight.attach(progress_hook, cancel_token):
+                break
+            # Its callers all cancelled and its run is stopping: start a new one,
+            # which waits for the old run's lease
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+        if not leader:
+            while not flight.done.wait(LOCK_POLL_INTERVAL):
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._run_locked(key, fn, flight)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def _acquire_lease(self, key: str, flight: _Flight) -> None:
+        """Take key's lease, waiting while another live process holds it."""
+        while not self._leases.acquire_lease(key, self.stale_after):
+            flight.publish({"status": "waiting"})
+            if flight.token.wait(LOCK_POLL_INTERVAL):
+                raise DownloadCancelled()
+
+    def _run_locked(self, key: str, fn: Callable, flight: _Flight):
+        self._acquire_lease(key, flight)
+        stop = threading.Event()
+
+        def heartbeat() -> None:
+            # Keep the lease fresh through long ffmpeg steps with no progress
+            while not stop.wait(LOCK_HEARTBEAT_INTERVAL):
+                self._leases.renew_lease(key)
+
+        beat = threading.Thread(target=heartbeat, daemon=True)
+        beat.start()
+        try:
+            return fn(flight.publish, flight.token)
+        finally:
+            stop.set()
+            self._leases.release_lease(key)
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide single-flight group, creating it on first use."""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
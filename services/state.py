@@ -0,0 +1,343 @@
+"""Shared state for running several app or API replicas side by side."""
+
+import hashlib
+import importlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import ContextManager, Iterable, Iterator, Optional
+
+from services.config import get_work_dir
+
+
+DEFAULT_JOURNAL_MODE = "WAL"
+
+
+@contextmanager
+def sqlite_connection(
+    path: str, journal_mode: Optional[str] = None
+) -> Iterator[sqlite3.Connection]:
+    """
+    Open a connection, commit on success and always close it.
+
+    journal_mode defaults to VIDEO_DOWNLOADER_SQLITE_JOURNAL_MODE, or WAL.
+    """
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        conn.execute(f"PRAGMA journal_mode={_journal_mode(journal_mode)}")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _journal_mode(mode: Optional[str]) -> str:
+    if mode is None:
+        mode = os.environ.get("VIDEO_DOWNLOADER_SQLITE_JOURNAL_MODE", DEFAULT_JOURNAL_MODE)
+    mode = mode.strip().upper()
+    # Interpolated into a PRAGMA: accept only SQLite's journal modes
+    if mode not in ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"):
+        return DEFAULT_JOURNAL_MODE
+    return mode
+
+
+def replica_id() -> str:
+    """Identify this process among the replicas sharing a state backend."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class StateBackend(ABC):
+    """
+    What replicas share: index databases, the job registry and leases.
+
+    Indexes (metadata cache, result store, download journal) are SQL
+    databases: database(name) returns a locator for one and connect()
+    opens it. The job registry maps job ids to JSON-friendly records, so
+    any replica can report on, serve or cancel another replica's job.
+    Leases are named, expiring locks held until released or not renewed.
+
+    Downloaded files themselves live in the work directory, which replicas
+    must share (e.g. an NFS or SMB mount).
+    """
+
+    @abstractmethod
+    def database(self, name: str) -> str:
+        ...
+
+    @abstractmethod
+    def connect(self, database: str) -> ContextManager:
+        ...
+
+    @abstractmethod
+    def save_job(self, record: dict) -> None:
+        """Store a job snapshot (with at least "id" and "status") under its id."""
+
+    @abstractmethod
+    def load_job(self, job_id: str) -> Optional[dict]:
+        """Return the last saved record of job_id, with "owner", or None."""
+
+    @abstractmethod
+    def request_cancel(self, job_id: str) -> bool:
+        """Ask the owner of an unfinished job to cancel it."""
+
+    @abstractmethod
+    def cancel_requests(self, job_ids: Iterable[str]) -> set[str]:
+        """Return which of job_ids someone asked to cancel."""
+
+    @abstractmethod
+    def prune_jobs(self, before: float) -> None:
+        """Forget job records not updated since `before` (unix time)."""
+
+    @abstractmethod
+    def acquire_lease(self, name: str, ttl: float) -> bool:
+        """Take the lease `name` unless a live holder has it; never blocks."""
+
+    @abstractmethod
+    def renew_lease(self, name: str) -> None:
+        """Keep a held lease from expiring for another ttl."""
+
+    @abstractmethod
+    def release_lease(self, name: str) -> None:
+        ...
+
+
+class FileLeases:
+    """
+    Leases as lock files in a (shared) directory, with the same lease
+    methods as StateBackend.
+
+    A lease is held by whoever created its file with O_EXCL; the file names
+    the holder with a random token, and renew/release only act on files
+    carrying this object's token. The holder refreshes the file's mtime to
+    renew it; a file not refreshed for `ttl` seconds is abandoned and may be
+    taken over. Takeover first renames the file to a name of its own, so of
+    several replicas seeing the same stale file only one moves it away.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._tokens: dict[str, str] = {}
+
+    def path_for(self, name: str) -> Path:
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.lock"
+
+    @staticmethod
+    def _token_of(path: Path) -> Optional[str]:
+        try:
+            return path.read_text().split(" ", 1)[0]
+        except OSError:
+            return None
+
+    def _move_aside(self, path: Path) -> Optional[Path]:
+        """Rename path to a name only this call uses; None if it is gone."""
+        aside = path.with_name(f"{path.name}.{uuid.uuid4().hex}")
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            return None
+        return aside
+
+    def _put_back(self, aside: Path, path: Path) -> None:
+        try:
+            # Never replaces a lock created meanwhile
+            os.link(aside, path)
+        except OSError:
+            pass
+        try:
+            aside.unlink()
+        except OSError:
+            pass
+
+    def acquire_lease(self, name: str, ttl: float) -> bool:
+        path = self.path_for(name)
+        token = uuid.uuid4().hex
+        while True:
+            try:
+                fd = os.open(str(path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    age = time.time() - path.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if age <= ttl:
+                    return False
+                aside = self._move_aside(path)
+                if aside is None:
+                    continue
+                try:
+                    # Another replica may have taken over and relocked meanwhile
+                    stale = time.time() - aside.stat().st_mtime > ttl
+                except FileNotFoundError:
+                    continue
+                if not stale:
+                    self._put_back(aside, path)
+                    return False
+                try:
+                    aside.unlink()
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{token} {replica_id()} {time.time()}\n")
+            with self._lock:
+                self._tokens[name] = token
+            return True
+
+    def renew_lease(self, name: str) -> None:
+        with self._lock:
+            token = self._tokens.get(name)
+        path = self.path_for(name)
+        if token is None or self._token_of(path) != token:
+            return
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def release_lease(self, name: str) -> None:
+        with self._lock:
+            token = self._tokens.pop(name, None)
+        path = self.path_for(name)
+        if token is None or self._token_of(path) != token:
+            return
+        aside = self._move_aside(path)
+        if aside is None:
+            return
+        if self._token_of(aside) == token:
+            aside.unlink()
+        else:
+            # Taken over between the check and the rename: not ours to remove
+            self._put_back(aside, path)
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    State in SQLite files and lock files under one shared directory.
+
+    Every replica points VIDEO_DOWNLOADER_STATE_DIR (default: the work
+    directory) at the same directory. SQLite's WAL mode needs shared
+    memory between processes and is not safe across machines: when the
+    directory is on a network filesystem, use journal_mode="DELETE"
+    (VIDEO_DOWNLOADER_SQLITE_JOURNAL_MODE=DELETE).
+    """
+
+    def __init__(
+        self, directory: Optional[str] = None, journal_mode: Optional[str] = None
+    ):
+        self.directory = Path(directory or get_work_dir())
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.journal_mode = journal_mode
+        self.leases = FileLeases(str(self.directory / "locks"))
+        self._jobs_path = self.database("state")
+        with self.connect(self._jobs_path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " record TEXT NOT NULL,"
+                " owner TEXT NOT NULL,"
+                " done INTEGER NOT NULL,"
+                " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+                " updated REAL NOT NULL)"
+            )
+
+    def database(self, name: str) -> str:
+        return str(self.directory / f"{name}.sqlite3")
+
+    def connect(self, database: str) -> ContextManager:
+        return sqlite_connection(database, self.journal_mode)
+
+    def save_job(self, record: dict) -> None:
+        with self.connect(self._jobs_path) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, record, owner, done, updated)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET record = excluded.record,"
+                " owner = excluded.owner, done = excluded.done, updated = excluded.updated",
+                (
+                    record["id"],
+                    json.dumps(record, default=str),
+                    replica_id(),
+                    # Only finished jobs have a finish time
+                    int(bool(record.get("finished"))),
+                    time.time(),
+                ),
+            )
+
+    def load_job(self, job_id: str) -> Optional[dict]:
+        with self.connect(self._jobs_path) as conn:
+            row = conn.execute(
+                "SELECT record, owner, cancel_requested FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(json.loads(row[0]), owner=row[1], cancel_requested=bool(row[2]))
+
+    def request_cancel(self, job_id: str) -> bool:
+        with self.connect(self._jobs_path) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND done = 0",
+                (job_id,),
+            )
+            return cursor.rowcount == 1
+
+    def cancel_requests(self, job_ids: Iterable[str]) -> set[str]:
+        job_ids = list(job_ids)
+        if not job_ids:
+            return set()
+        with self.connect(self._jobs_path) as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN"
+                f" ({','.join('?' * len(job_ids))})",
+                job_ids,
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def prune_jobs(self, before: float) -> None:
+        with self.connect(self._jobs_path) as conn:
+            conn.execute("DELETE FROM jobs WHERE updated < ?", (before,))
+
+    def acquire_lease(self, name: str, ttl: float) -> bool:
+        return self.leases.acquire_lease(name, ttl)
+
+    def renew_lease(self, name: str) -> None:
+        self.leases.renew_lease(name)
+
+    def release_lease(self, name: str) -> None:
+        self.leases.release_lease(name)
+
+
+_state_backend: Optional[StateBackend] = None
+_state_backend_lock = threading.Lock()
+
+
+def get_state_backend() -> StateBackend:
+    """
+    Return the process-wide state backend.
+
+    VIDEO_DOWNLOADER_STATE_BACKEND is "sqlite" (default) or
+    "package.module:ClassName" for another StateBackend, constructed
+    without arguments.
+    """
+    global _state_backend
+    with _state_backend_lock:
+        if _state_backend is None:
+            spec = os.environ.get("VIDEO_DOWNLOADER_STATE_BACKEND", "sqlite")
+            if spec == "sqlite":
+                _state_backend = SQLiteStateBackend(
+                    os.environ.get("VIDEO_DOWNLOADER_STATE_DIR") or None
+                )
+            else:
+                module, _, name = spec.partition(":")
+                _state_backend = getattr(importlib.import_module(module), name)()
+        return _state_backend
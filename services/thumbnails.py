@@ -0,0 +1,199 @@
+"""Local, downsized copies of video thumbnails for the preview card."""
+
+import hashlib
+import io
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from services.config import env_int, get_work_dir
+from services.direct import get_http_session
+
+
+DEFAULT_THUMBNAIL_WIDTH = 480
+DEFAULT_THUMBNAIL_CACHE_MB = 64
+JPEG_QUALITY = 80
+FETCH_TIMEOUT = (5, 15)
+# Refuse to decode thumbnails larger than this (maxresdefault is ~300 KB)
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+# Seconds before a thumbnail that failed to load is tried again; the preview
+# reruns several times a second while a download is polled
+FAILURE_RETRY_AFTER = 600.0
+
+
+def downsize_image(data: bytes, width: int) -> Optional[bytes]:
+    """
+    Re-encode image bytes as a JPEG at most `width` pixels wide.
+
+    Returns None when Pillow is unavailable or cannot decode the image.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((width, width * 4))
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            out = io.BytesIO()
+            image.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+            return out.getvalue()
+    except Exception:
+        return None
+
+
+class ThumbnailCache:
+    """
+    Directory of downsized thumbnails, keyed by canonical video key.
+
+    A thumbnail is fetched once over the pooled HTTP session, resized to
+    `width` and stored as a compact JPEG; later previews of the same video
+    read the local file. Reads refresh a file's mtime, and the least
+    recently used files are deleted once the directory exceeds
+    `budget_bytes`. Images Pillow cannot decode are not cached; the caller
+    then shows the remote URL as before.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        budget_bytes: int = DEFAULT_THUMBNAIL_CACHE_MB * 1024 * 1024,
+        width: int = DEFAULT_THUMBNAIL_WIDTH,
+    ):
+        self.directory = Path(directory or get_work_dir() / "thumbnails")
+        self.budget_bytes = budget_bytes
+        self.width = width
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fetch_locks: dict[str, threading.Lock] = {}
+        self._failed: dict[str, float] = {}
+        self.fetches = 0
+
+    def path_for(self, video_key: str) -> Path:
+        digest = hashlib.sha1(f"{video_key}|{self.width}".encode("utf-8")).hexdigest()
+        return self.directory / f"{digest[:24]}.jpg"
+
+    def get(self, video_key: str, url: Optional[str]) -> Optional[str]:
+        """
+        Return a local path to the thumbnail of video_key, fetching url on a miss.
+
+        Concurrent misses for the same video share one fetch. Returns None
+        if the thumbnail cannot be fetched (and, for FAILURE_RETRY_AFTER
+        seconds, without trying again), so callers can fall back to url.
+        """
+        path = self.path_for(video_key)
+        if self._touch(path):
+            return str(path)
+        if not url:
+            return None
+        with self._lock:
+            failed_at = self._failed.get(video_key)
+            if failed_at is not None and time.monotonic() - failed_at < FAILURE_RETRY_AFTER:
+                return None
+            fetch_lock = self._fetch_locks.setdefault(video_key, threading.Lock())
+        try:
+            with fetch_lock:
+                if self._touch(path):
+                    return str(path)
+                data = self._fetch(url)
+                thumbnail = downsize_image(data, self.width) if data else None
+                if thumbnail is None:
+                    self._remember_failure(video_key)
+                    return None
+                self._write(path, thumbnail)
+        finally:
+            with self._lock:
+                self._fetch_locks.pop(video_key, None)
+        self.evict(keep=path)
+        return str(path)
+
+    def _remember_failure(self, video_key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key, failed_at in list(self._failed.items()):
+                if now - failed_at >= FAILURE_RETRY_AFTER:
+                    del self._failed[key]
+            self._failed[video_key] = now
+
+    def _touch(self, path: Path) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def _fetch(self, url: str) -> Optional[bytes]:
+        self.fetches += 1
+        try:
+            response = get_http_session().get(url, timeout=FETCH_TIMEOUT, stream=True)
+            with response:
+                if response.status_code != 200:
+                    return None
+                data = response.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+        except Exception:
+            return None
+        if not data or len(data) > MAX_SOURCE_BYTES:
+            return None
+        return data
+
+    def _write(self, path: Path, data: bytes) -> None:
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """Delete least recently used thumbnails over budget; return how many."""
+        entries = []
+        for path in self.directory.glob("*.jpg"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort(reverse=True)
+        total = 0
+        removed = 0
+        for _, size, path in entries:
+            if path == keep or total + size <= self.budget_bytes:
+                total += size
+                continue
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def stats(self) -> dict:
+        """Return the number and total size of cached thumbnails."""
+        sizes = []
+        for path in self.directory.glob("*.jpg"):
+            try:
+                sizes.append(path.stat().st_size)
+            except OSError:
+                continue
+        return {"entries": len(sizes), "bytes": sum(sizes), "fetches": self.fetches}
+
+
+_thumbnail_cache: Optional[ThumbnailCache] = None
+_thumbnail_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """Return the process-wide thumbnail cache, creating it on first use."""
+    global _thumbnail_cache
+    with _thumbnail_cache_lock:
+        if _thumbnail_cache is None:
+            _thumbnail_cache = ThumbnailCache(
+                budget_bytes=env_int(
+                    "VIDEO_DOWNLOADER_THUMBNAIL_CACHE_MB", DEFAULT_THUMBNAIL_CACHE_MB
+                )
+                * 1024
+                * 1024,
+                width=env_int("VIDEO_DOWNLOADER_THUMBNAIL_WIDTH", DEFAULT_THUMBNAIL_WIDTH),
+            )
+        return _thumbnail_cache
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+import pytest
+
+
+# Process-wide services that keep files in the work dir
+WORK_DIR_SINGLETONS = [
+    "services.cache._metadata_cache",
+    "services.fileserver._secret",
+    "services.jobs._job_queue",
+    "services.journal._journal",
+    "services.prefetch._prefetcher",
+    "services.results._result_store",
+    "services.singleflight._single_flight",
+    "services.state._state_backend",
+    "services.thumbnails._thumbnail_cache",
+]
+
+
+def wait_for(job, timeout=5):
+    """Wait until job is done (or timeout seconds pass) and return it."""
+    deadline = time.time() + timeout
+    while not job.done and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+@contextmanager
+def isolated_work_dir(path):
+    """Use path as the work dir, with fresh process-wide services inside it."""
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.dict(os.environ, {"VIDEO_DOWNLOADER_DIR": path}))
+        for name in WORK_DIR_SINGLETONS:
+            stack.enter_context(mock.patch(name, None))
+        yield path
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _session_work_dir():
+    # Never touch the real <tempdir>/video_downloader from tests
+    with tempfile.TemporaryDirectory() as path, isolated_work_dir(path):
+        yield
@@ -0,0 +1,138 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.client import HTTPConnection
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from conftest import isolated_work_dir
+from services.api import make_server
+
+
+class ApiTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # Jobs, indexes and locks of this test stay in its own work dir
+        self.work_dir = isolated_work_dir(self.tmp.name)
+        self.work_dir.__enter__()
+        self.server = make_server("127.0.0.1", 0)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.work_dir.__exit__(None, None, None)
+        self.tmp.cleanup()
+
+    def _get(self, path):
+        with urlopen(self.base + path, timeout=5) as response:
+            return response.status, response.read()
+
+    def _post(self, path, payload):
+        request = Request(
+            self.base + path,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+
+    def test_health(self):
+        status, body = self._get("/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["status"], "ok")
+
+    def test_info_requires_url(self):
+        with self.assertRaises(HTTPError) as ctx:
+            self._get("/info")
+        self.assertEqual(ctx.exception.code, 400)
+
+    def test_download_job_and_file(self):
+        file_path = os.path.join(self.tmp.name, "clip.mp4")
+        with open(file_path, "wb") as f:
+            f.write(b"video-bytes")
+
+        def fake_download(url, progress_hook=None, **kwargs):
+            return file_path, None
+
+        with mock.patch("services.api.download_media", side_effect=fake_download):
+            status, job = self._post("/downloads", {"url": "https://youtu.be/abc"})
+            self.assertEqual(status, 202)
+            deadline = time.time() + 5
+            while job["status"] not in ("done", "error") and time.time() < deadline:
+                time.sleep(0.02)
+                job = json.loads(self._get(f"/downloads/{job['id']}")[1])
+
+        self.assertEqual(job["status"], "done")
+        status, body = self._get(f"/files/{job['id']}")
+        self.assertEqual((status, body), (200, b"video-bytes"))
+
+    def test_metrics_include_served_files(self):
+        file_path = os.path.join(self.tmp.name, "clip.mp4")
+        with open(file_path, "wb") as f:
+            f.write(b"video-bytes")
+
+        with mock.patch(
+            "services.api.download_media", return_value=(file_path, None)
+        ):
+            _, job = self._post("/downloads", {"url": "https://youtu.be/abc"})
+            deadline = time.time() + 5
+            while job["status"] != "done" and time.time() < deadline:
+                time.sleep(0.02)
+                job = json.loads(self._get(f"/downloads/{job['id']}")[1])
+        self._get(f"/files/{job['id']}")
+
+        status, body = self._get("/metrics")
+        text = body.decode("utf-8")
+        self.assertEqual(status, 200)
+        self.assertIn('video_downloader_served_bytes_total{kind="video"}', text)
+        self.assertIn('phase="serve"', text)
+        self.assertIn("video_downloader_jobs_queued 0", text)
+
+    def test_invalid_download_requests_are_400(self):
+        for payload in [
+            {"url": 123},
+            {"url": "https://youtu.be/abc", "start": "abc"},
+            {"url": "https://youtu.be/abc", "start": 60, "end": 30},
+            {"url": "https://youtu.be/abc", "quality": "4k"},
+            {"url": "https://youtu.be/abc", "audio_mode": "flac"},
+            {"url": "https://youtu.be/abc", "session": ["a"]},
+            # The server must not call URLs chosen by clients
+            {"url": "https://youtu.be/abc", "facebook_api_url": "http://169.254.169.254/"},
+        ]:
+            with self.assertRaises(HTTPError, msg=payload) as ctx:
+                self._post("/downloads", payload)
+            self.assertEqual(ctx.exception.code, 400, payload)
+
+        connection = HTTPConnection("127.0.0.1", self.server.server_port, timeout=5)
+        connection.request(
+            "POST", "/downloads", body=b"{}", headers={"Content-Length": "abc"}
+        )
+        self.assertEqual(connection.getresponse().status, 400)
+        connection.close()
+
+    def test_facebook_api_comes_from_server_configuration(self):
+        server = make_server("127.0.0.1", 0, facebook_api_url="http://fb-api.internal")
+        self.assertEqual(server.facebook_api_url, "http://fb-api.internal")
+        server.server_close()
+        with mock.patch.dict(
+            os.environ, {"VIDEO_DOWNLOADER_FACEBOOK_API_URL": "http://fb-api.env"}
+        ):
+            server = make_server("127.0.0.1", 0)
+        self.assertEqual(server.facebook_api_url, "http://fb-api.env")
+        server.server_close()
+
+    def test_unknown_job_is_404(self):
+        with self.assertRaises(HTTPError) as ctx:
+            self._get("/downloads/nope")
+        self.assertEqual(ctx.exception.code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from services.audio import (
+    AUDIO_MODE_FAST,
+    AUDIO_MODE_MP3,
+    Mp3Transcoder,
+    plan_audio_formats,
+)
+from services.metrics import registry
+
+
+FAKE_FFMPEG = """#!{python}
+import shutil, sys
+args = sys.argv[1:]
+src = args[args.index("-i") + 1]
+if src.endswith(".bad"):
+    sys.stderr.write("Invalid data found when processing input")
+    sys.exit(1)
+shutil.copyfile(src, args[-1])
+"""
+
+
+class AudioPlanTests(unittest.TestCase):
+    def test_picks_best_audio_only_stream_without_postprocessing(self):
+        info = {
+            "formats": [
+                {"format_id": "140", "ext": "m4a", "vcodec": "none", "acodec": "mp4a", "abr": 129},
+                {"format_id": "251", "ext": "webm", "vcodec": "none", "acodec": "opus", "abr": 135},
+                {"format_id": "18", "ext": "mp4", "vcodec": "avc1", "acodec": "mp4a"},
+            ]
+        }
+        plan = plan_audio_formats(info, AUDIO_MODE_FAST)
+        self.assertEqual((plan.format_selector, plan.postprocessors), ("251", []))
+
+    def test_muxed_only_source_is_extracted_with_stream_copy(self):
+        info = {"formats": [{"format_id": "18", "ext": "mp4", "vcodec": "avc1", "acodec": "mp4a"}]}
+        plan = plan_audio_formats(info, AUDIO_MODE_MP3)
+        self.assertEqual(plan.postprocessors[0]["preferredcodec"], "best")
+
+
+class Mp3TranscoderTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ffmpeg = os.path.join(self.tmp.name, "ffmpeg")
+        with open(self.ffmpeg, "w") as f:
+            f.write(FAKE_FFMPEG.format(python=sys.executable))
+        os.chmod(self.ffmpeg, os.stat(self.ffmpeg).st_mode | stat.S_IEXEC)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _source(self, name):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(b"audio")
+        return path
+
+    @unittest.skipIf(os.name == "nt", "uses a shebang script as ffmpeg")
+    def test_transcode_and_stats(self):
+        transcoder = Mp3Transcoder(workers=2, ffmpeg=self.ffmpeg)
+        path, error = transcoder.transcode(self._source("song.m4a"))
+        self.assertIsNone(error)
+        self.assertTrue(path.endswith("song.mp3"))
+        self.assertTrue(os.path.exists(path))
+
+        path, error = transcoder.transcode(self._source("song.bad"))
+        self.assertIsNone(path)
+        self.assertIn("Invalid data", error)
+
+        stats = transcoder.stats()
+        self.assertEqual(
+            (stats["workers"], stats["queued"], stats["running"], stats["completed"], stats["failed"]),
+            (2, 0, 0, 1, 1),
+        )
+
+    def test_queue_depth_is_exported(self):
+        transcoder = Mp3Transcoder(workers=1, ffmpeg=self.ffmpeg)
+        transcoder._bump(queued=2, running=1)
+        with mock.patch("services.audio._transcoder", transcoder):
+            text = registry.render()
+        self.assertIn("video_downloader_transcodes_queued 2", text)
+        self.assertIn("video_downloader_transcodes_running 1", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
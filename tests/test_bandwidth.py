@@ -0,0 +1,181 @@
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from benchmarks.media_server import MediaServer
+from services.bandwidth import (
+    PREFETCH_GROUP,
+    BandwidthScheduler,
+    FairShare,
+    TokenBucket,
+    parse_host_limits,
+    prefetch_session,
+)
+from services.cancel import CancelToken, DownloadCancelled
+from services.downloader import download_direct_url, download_with_ytdlp
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class LimitTests(unittest.TestCase):
+    def test_token_bucket_goes_into_debt_and_pauses(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10, clock=clock)
+        self.assertEqual(bucket.reserve(10), 0.0)
+        self.assertAlmostEqual(bucket.reserve(5), 0.5)
+        clock.now += 1.5
+        self.assertEqual(bucket.reserve(1), 0.0)
+        bucket.pause(3)
+        self.assertAlmostEqual(bucket.reserve(1), 3.0)
+
+    def test_host_limits_match_domain_suffixes(self):
+        self.assertEqual(
+            parse_host_limits("googlevideo.com=20, .fbcdn.net=5,bad=x,zero=0"),
+            {"googlevideo.com": 20.0, "fbcdn.net": 5.0},
+        )
+        clock = FakeClock()
+        scheduler = BandwidthScheduler(host_rates={"googlevideo.com": 1}, clock=clock)
+        a = scheduler._host_bucket("rr1.googlevideo.com")
+        self.assertIs(a, scheduler._host_bucket("rr2.googlevideo.com"))
+        self.assertIsNone(scheduler._host_bucket("notgooglevideo.com"))
+        scheduler.penalize("https://rr3.googlevideo.com/videoplayback", 5)
+        self.assertGreaterEqual(a.reserve(), 5)
+
+    def test_sessions_share_bandwidth_fairly_whatever_their_job_count(self):
+        share = FairShare(400 * 1024)
+        received = {"busy": 0, "single": 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + 1.0
+
+        def download(group):
+            while time.monotonic() < deadline:
+                share.acquire(group, 16 * 1024)
+                with lock:
+                    received[group] += 16 * 1024
+
+        threads = [threading.Thread(target=download, args=("busy",)) for _ in range(3)]
+        threads.append(threading.Thread(target=download, args=("single",)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ratio = received["single"] / received["busy"]
+        # Without fair sharing the single job would get a third of the busy session
+        self.assertGreater(ratio, 0.6)
+        self.assertLess(ratio, 1.4)
+
+    def test_waiting_for_a_share_is_cancellable(self):
+        share = FairShare(1024)
+        share.acquire("a", 64 * 1024)
+        token = CancelToken()
+        threading.Timer(0.05, token.cancel).start()
+        with self.assertRaises(DownloadCancelled):
+            share.acquire("b", 1024, token)
+        self.assertEqual(share._waiting, [])
+
+
+class ThrottledDownloadTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MediaServer(file_size=2 * 1024 * 1024, segments=4, segment_size=64 * 1024)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_direct_download_respects_the_job_rate_and_host_limit(self):
+        scheduler = BandwidthScheduler(
+            job_rate=1024 * 1024, host_rates={"127.0.0.1": 1000}
+        )
+        started = time.monotonic()
+        with mock.patch(
+            "services.downloader.get_bandwidth_scheduler", return_value=scheduler
+        ):
+            path, error = download_direct_url(
+                f"{self.server.base_url}/progressive.mp4", output_dir=self.tmp.name
+            )
+        self.assertIsNone(error)
+        # 1 MiB of burst, then 1 MiB at 1 MiB/s
+        self.assertGreater(time.monotonic() - started, 0.8)
+        self.assertGreater(scheduler.stats()["waited"]["job"], 0.5)
+        self.assertEqual(scheduler.stats()["hosts"], 1)
+
+    def test_prefetches_respect_the_prefetch_rate_until_claimed(self):
+        scheduler = BandwidthScheduler(prefetch_rate=1024 * 1024)
+
+        def download(session, token):
+            started = time.monotonic()
+            with mock.patch(
+                "services.downloader.get_bandwidth_scheduler", return_value=scheduler
+            ):
+                path, error = download_direct_url(
+                    f"{self.server.base_url}/progressive.mp4",
+                    output_dir=self.tmp.name,
+                    cancel_token=token,
+                    session=session,
+                )
+            self.assertIsNone(error)
+            return time.monotonic() - started
+
+        # 1 MiB of burst, then 1 MiB at 1 MiB/s
+        self.assertGreater(download(prefetch_session("alice"), CancelToken()), 0.8)
+        waited = scheduler.stats()["waited"]["prefetch"]
+        self.assertGreater(waited, 0.5)
+        self.assertLess(download("alice", CancelToken()), 0.8)
+        claimed = CancelToken()
+        scheduler.claim(claimed)
+        self.assertLess(download(prefetch_session("alice"), claimed), 0.8)
+        self.assertEqual(scheduler.stats()["waited"]["prefetch"], waited)
+
+    def test_unclaimed_prefetches_share_one_group(self):
+        scheduler = BandwidthScheduler(rate=64 * 1024 * 1024)
+        charged = []
+        scheduler.transfer = lambda group, amount, cancel_token=None: charged.append(group)
+        token = CancelToken()
+        flow = scheduler.flow("https://example.com/v", prefetch_session("alice"), token)
+        flow.consume(1024)
+        scheduler.claim(token)
+        flow.consume(1024)
+        self.assertEqual(charged, [PREFETCH_GROUP, "alice"])
+
+    def test_ytdlp_downloads_are_charged_to_the_scheduler(self):
+        scheduler = BandwidthScheduler(rate=64 * 1024 * 1024)
+        charged = []
+        transfer = scheduler.transfer
+
+        def record(group, amount, cancel_token=None):
+            charged.append((group, amount))
+            transfer(group, amount, cancel_token)
+
+        scheduler.transfer = record
+        with mock.patch(
+            "services.downloader.get_bandwidth_scheduler", return_value=scheduler
+        ):
+            path, error = download_with_ytdlp(
+                f"{self.server.base_url}/hls/stream.m3u8",
+                output_dir=self.tmp.name,
+                use_cache=False,
+                session="alice",
+            )
+        self.assertIsNone(error)
+        self.assertEqual({group for group, _ in charged}, {"alice"})
+        self.assertEqual(sum(amount for _, amount in charged), 4 * 64 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from services.batch import (
+    ITEM_DONE,
+    ITEM_ERROR,
+    BatchRun,
+    is_playlist_url,
+    parse_batch_input,
+)
+from services.jobs import JobQueue
+
+
+class BatchInputTests(unittest.TestCase):
+    def test_parse_batch_input_normalizes_and_dedupes(self):
+        text = """
+        https://youtu.be/abc123?feature=share
+        not a url, https://www.youtube.com/watch?v=def456
+        https://youtu.be/abc123
+        """
+        self.assertEqual(
+            parse_batch_input(text),
+            ["https://youtu.be/abc123", "https://www.youtube.com/watch?v=def456"],
+        )
+
+    def test_is_playlist_url(self):
+        self.assertTrue(is_playlist_url("https://www.youtube.com/playlist?list=PL42"))
+        self.assertTrue(is_playlist_url("https://www.youtube.com/watch?list=PL42"))
+        self.assertFalse(is_playlist_url("https://www.youtube.com/watch?v=a&list=PL42"))
+        self.assertFalse(is_playlist_url("https://www.facebook.com/watch/?list=PL42"))
+
+
+class BatchRunTests(unittest.TestCase):
+    def test_downloads_respect_batch_concurrency(self):
+        lock = threading.Lock()
+        running = {"now": 0, "peak": 0}
+
+        def fake_download(url, progress_hook=None, **kwargs):
+            with lock:
+                running["now"] += 1
+                running["peak"] = max(running["peak"], running["now"])
+            progress_hook({"status": "downloading", "downloaded_bytes": 5, "total_bytes": 10})
+            time.sleep(0.05)
+            with lock:
+                running["now"] -= 1
+            if url.endswith("bad"):
+                return None, "boom"
+            return f"/tmp/{url[-3:]}.mp4", None
+
+        urls = [f"https://example.com/v{i:02d}" for i in range(5)] + [
+            "https://example.com/bad"
+        ]
+        with mock.patch("services.batch.download_media", side_effect=fake_download), \
+                mock.patch("services.batch.get_video_info", return_value=({"title": "T"}, None)):
+            batch = BatchRun(urls, concurrency=2).start()
+            batch.finished.wait(10)
+
+        self.assertTrue(batch.done)
+        self.assertLessEqual(running["peak"], 2)
+        self.assertEqual(batch.summary(), {"done": 5, "error": 1})
+        self.assertEqual(batch.items[0]["title"], "T")
+        self.assertEqual(batch.items[-1]["error"], "boom")
+
+    def test_cancelling_a_queued_item_frees_its_slot(self):
+        queue = JobQueue(workers=1)
+        release = threading.Event()
+
+        def fake_download(url, progress_hook=None, **kwargs):
+            release.wait(5)
+            return f"/tmp/{url[-3:]}.mp4", None
+
+        urls = [f"https://example.com/v{i:02d}" for i in range(3)]
+        with mock.patch("services.batch.download_media", side_effect=fake_download), \
+                mock.patch("services.batch.get_video_info", return_value=({"title": "T"}, None)), \
+                mock.patch("services.batch.get_job_queue", return_value=queue):
+            batch = BatchRun(urls, concurrency=2).start()
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                stats = queue.stats()
+                if stats["queued"] == 1 and sum(stats["running"].values()) == 1:
+                    break
+                time.sleep(0.01)
+            # The second item waits behind the first; cancel it before it runs
+            self.assertTrue(queue.cancel(queue._queued[0][2].id))
+            release.set()
+            batch.finished.wait(5)
+
+        self.assertTrue(batch.done)
+        self.assertEqual(
+            [item["status"] for item in batch.items], [ITEM_DONE, ITEM_ERROR, ITEM_DONE]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
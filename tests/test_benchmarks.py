@@ -0,0 +1,61 @@
+import json
+import unittest
+from urllib.request import Request, urlopen
+
+from benchmarks.media_server import MediaServer, synthetic_bytes
+from benchmarks.run import compare
+
+
+class MediaServerTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MediaServer(file_size=256 * 1024, segments=3, segment_size=1024).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_range_requests(self):
+        request = Request(
+            self.server.base_url + "/progressive.mp4", headers={"Range": "bytes=100-199"}
+        )
+        with urlopen(request) as response:
+            self.assertEqual(response.status, 206)
+            self.assertEqual(response.read(), synthetic_bytes(100, 200))
+
+    def test_hls_playlist_lists_every_segment(self):
+        with urlopen(self.server.base_url + "/hls/stream.m3u8") as response:
+            playlist = response.read().decode("utf-8")
+        self.assertEqual(playlist.count(".ts"), 3)
+
+    def test_facebook_stand_in_points_at_local_file(self):
+        request = Request(
+            self.server.base_url + "/download",
+            data=json.dumps({"url": "https://fb.watch/x", "quality": "best"}).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        with urlopen(request) as response:
+            payload = json.load(response)
+        self.assertEqual(payload["status"], "success")
+        self.assertEqual(payload["download_url"], self.server.base_url + "/progressive.mp4")
+
+
+class CompareTests(unittest.TestCase):
+    def test_flags_only_metrics_beyond_tolerance(self):
+        baseline = {"cases": {"a": {"seconds": 1.0, "peak_rss_mb": 50, "mib_per_s": 10}}}
+        results = {"cases": {"a": {"seconds": 1.2, "peak_rss_mb": 80, "mib_per_s": 9}}}
+        regressions = compare(results, baseline, tolerance=0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("a.peak_rss_mb"))
+
+    def test_lower_throughput_is_a_regression(self):
+        baseline = {"cases": {"a": {"seconds": 1.0, "mib_per_s": 10}}}
+        slower = {"cases": {"a": {"seconds": 1.0, "mib_per_s": 1}}}
+        faster = {"cases": {"a": {"seconds": 1.0, "mib_per_s": 40}}}
+        regressions = compare(slower, baseline, tolerance=0.25)
+        self.assertEqual(regressions, ["a.mib_per_s: 10 -> 1 (-90%)"])
+        self.assertEqual(compare(faster, baseline, tolerance=0.25), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from services.cancel import (
+    CancelToken,
+    DownloadCancelled,
+    child_processes,
+    kill_child_processes,
+)
+from services.downloader import _remove_partial_files
+
+
+class CancelTokenTests(unittest.TestCase):
+    def test_callbacks_run_once_and_can_be_removed(self):
+        token = CancelToken()
+        calls = []
+        token.on_cancel(lambda: calls.append("a"))
+        remove = token.on_cancel(lambda: calls.append("b"))
+        remove()
+        token.cancel()
+        token.cancel()
+        self.assertEqual(calls, ["a"])
+        token.on_cancel(lambda: calls.append("late"))
+        self.assertEqual(calls, ["a", "late"])
+        with self.assertRaises(DownloadCancelled):
+            token.raise_if_cancelled()
+
+    @unittest.skipUnless(os.path.isdir("/proc"), "needs /proc")
+    def test_kill_child_processes_by_command_line(self):
+        marker = "/tmp/video_downloader_cancel_test_marker"
+        proc = subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(30)", marker]
+        )
+        try:
+            self.assertEqual(kill_child_processes(marker), 1)
+            proc.wait(5)
+            self.assertNotEqual(proc.returncode, 0)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+    @unittest.skipIf(os.name == "nt", "uses ps")
+    def test_children_are_found_without_proc(self):
+        marker = "/tmp/video_downloader_listed_test_marker"
+        proc = subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(30)", marker]
+        )
+        try:
+            # As on macOS, where there is no /proc
+            with mock.patch("services.cancel.os.path.isdir", return_value=False):
+                self.assertIn(proc.pid, [pid for pid, _ in child_processes()])
+                self.assertEqual(kill_child_processes(marker), 1)
+            proc.wait(5)
+            self.assertNotEqual(proc.returncode, 0)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+    def test_only_the_matching_run_is_killed(self):
+        # Two runs of one video, e.g. at different qualities
+        names = ("/tmp/Clip - abc - 1111aaaa.mp4", "/tmp/Clip - abc - 2222bbbb.mp4")
+        procs = [
+            subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)", name])
+            for name in names
+        ]
+        try:
+            self.assertEqual(kill_child_processes("/tmp/Clip - abc - 1111aaaa"), 1)
+            procs[0].wait(5)
+            self.assertIsNone(procs[1].poll())
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+
+
+class PartialFileCleanupTests(unittest.TestCase):
+    def test_removes_only_intermediate_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [
+                "Clip - abc.f137.mp4",
+                "Clip - abc.f137.mp4.part",
+                "Clip - abc.f140.m4a.part-Frag3",
+                "Clip - abc.f140.m4a.ytdl",
+                "Clip - abc.temp.mp4",
+                "Clip - abc.mp4",
+                "Clip - abc.flac",
+                "Other - xyz.mp4.part",
+            ]
+            for name in names:
+                with open(os.path.join(tmp, name), "wb"):
+                    pass
+            _remove_partial_files(os.path.join(tmp, "Clip - abc"))
+            self.assertEqual(
+                sorted(os.listdir(tmp)),
+                ["Clip - abc.flac", "Clip - abc.mp4", "Other - xyz.mp4.part"],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from unittest import mock
+
+from services.clips import (
+    Clip,
+    format_timestamp,
+    make_clip,
+    parse_timestamp,
+    url_start_time,
+)
+from services.downloader import (
+    CLIP_NEEDS_FFMPEG,
+    _output_template,
+    download_media,
+    download_with_ytdlp,
+)
+
+
+class ClipTests(unittest.TestCase):
+    def test_parse_timestamp(self):
+        for text, seconds in [
+            ("90", 90),
+            ("90.5", 90.5),
+            ("90s", 90),
+            ("1m30s", 90),
+            ("1h2m3s", 3723),
+            ("1:30", 90),
+            ("01:02:03.5", 3723.5),
+            (45, 45),
+        ]:
+            self.assertEqual(parse_timestamp(text), seconds, text)
+        for bad in ("", "abc", "1:xx", "1:2:3:4", "-5", -5, None, True):
+            self.assertIsNone(parse_timestamp(bad), bad)
+        self.assertEqual(format_timestamp(90), "1:30")
+        self.assertEqual(format_timestamp(3723.5), "1:02:03.5")
+
+    def test_start_time_from_link(self):
+        self.assertEqual(url_start_time("https://youtu.be/abc?t=1m30s"), 90)
+        self.assertEqual(url_start_time("https://www.youtube.com/watch?v=abc&t=42"), 42)
+        self.assertEqual(url_start_time("https://example.com/v.mp4#t=10"), 10)
+        self.assertIsNone(url_start_time("https://www.youtube.com/watch?v=abc"))
+
+    def test_make_clip(self):
+        self.assertIsNone(make_clip())
+        self.assertIsNone(make_clip("0", ""))
+        clip = make_clip("1:30", "2:00", exact=True)
+        self.assertEqual((clip.start, clip.end, clip.exact), (90, 120, True))
+        self.assertEqual(make_clip(None, 30).start, 0)
+        with self.assertRaises(ValueError):
+            make_clip("later")
+        with self.assertRaises(ValueError):
+            make_clip(60, 30)
+
+    def test_only_the_section_is_requested(self):
+        clip = Clip(90, 120)
+        opts = clip.ydl_options()
+        sections = list(opts["download_ranges"]({"duration": 600}, None))
+        self.assertEqual(sections, [{"start_time": 90, "end_time": 120}])
+        self.assertFalse(opts["force_keyframes_at_cuts"])
+        self.assertTrue(Clip(90, exact=True).ydl_options()["force_keyframes_at_cuts"])
+
+        # Clips get their own files and cache entries
+        self.assertNotEqual(clip.key(), Clip(90, 120, exact=True).key())
+        self.assertNotEqual(clip.suffix(), Clip(90, 120, exact=True).suffix())
+        self.assertNotEqual(
+            _output_template("/tmp", "key", clip), _output_template("/tmp", "key")
+        )
+
+    def test_exact_and_keyframe_cuts_are_separate_files(self):
+        templates = []
+
+        def fake_download(url, info_handle, ydl_opts, *args):
+            templates.append(ydl_opts["outtmpl"])
+            return None, None
+
+        url = "https://www.youtube.com/watch?v=abc"
+        with mock.patch("services.downloader.clips_supported", return_value=True), \
+                mock.patch("services.downloader._download_planned", side_effect=fake_download):
+            for exact in (False, True):
+                download_with_ytdlp(url, output_dir="/tmp", clip=Clip(90, 120, exact=exact))
+        self.assertEqual(len(templates), 2)
+        self.assertNotEqual(templates[0], templates[1])
+        self.assertIn("-exact", templates[1])
+
+    def test_clips_need_ffmpeg(self):
+        with mock.patch("services.downloader.clips_supported", return_value=False):
+            path, error = download_with_ytdlp(
+                "https://www.youtube.com/watch?v=abc", clip=Clip(10, 20)
+            )
+        self.assertIsNone(path)
+        self.assertEqual(error, CLIP_NEEDS_FFMPEG)
+
+    def test_download_media_builds_the_clip(self):
+        url = "https://www.youtube.com/watch?v=abc&t=90"
+        with mock.patch("services.downloader.get_download_journal"), mock.patch(
+            "services.downloader._download_media", return_value=("clip.mp4", None)
+        ) as inner:
+            # Only an end: the clip starts at the link's t=
+            download_media(url, clip_end="2:00")
+            clip = inner.call_args.args[-1]
+            self.assertEqual((clip.start, clip.end), (90, 120))
+
+            download_media(url)
+            self.assertIsNone(inner.call_args.args[-1])
+
+            path, error = download_media(url, clip_start="soon")
+        self.assertIsNone(path)
+        self.assertIn("Invalid clip start", error)
+
+
+if __name__ == "__main__":
+    unittest.main()
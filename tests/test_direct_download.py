@@ -0,0 +1,140 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from services.direct import RangedDownloader, split_ranges
+from services.downloader import download_direct_url
+
+
+PAYLOAD = bytes(range(256)) * 4096  # 1 MiB
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    range_requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        supports_ranges = self.path.startswith("/ranged")
+        header = self.headers.get("Range")
+        match = re.match(r"bytes=(\d+)-(\d+)", header or "")
+        if supports_ranges and match:
+            start, end = int(match.group(1)), int(match.group(2))
+            MediaHandler.range_requests.append((start, end))
+            body = PAYLOAD[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+        else:
+            body = PAYLOAD
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RangedDownloaderTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), MediaHandler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, "out.mp4")
+        MediaHandler.range_requests = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_split_ranges(self):
+        self.assertEqual(split_ranges(10, 3, 1), [(0, 3), (4, 7), (8, 9)])
+        self.assertEqual(split_ranges(10, 4, 8), [(0, 9)])
+        self.assertEqual(split_ranges(0, 4, 1), [])
+
+    def test_parallel_ranges_reassemble_the_file(self):
+        events = []
+        downloader = RangedDownloader(
+            connections=4, buffer_size=64 * 1024, min_segment_size=128 * 1024
+        )
+        written = downloader.download(self.base + "/ranged", self.dest, events.append)
+        self.assertEqual(written, len(PAYLOAD))
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        # One probe plus four segments
+        self.assertEqual(len(MediaHandler.range_requests), 5)
+        self.assertEqual(events[-1]["downloaded_bytes"], len(PAYLOAD))
+
+    def test_resumes_from_saved_range_offsets(self):
+        half = len(PAYLOAD) // 2
+        with open(self.dest, "wb") as f:
+            f.write(PAYLOAD[:half // 2])
+            f.truncate(len(PAYLOAD))
+        with open(self.dest + ".ranges", "w") as f:
+            json.dump(
+                {
+                    "total": len(PAYLOAD),
+                    "ranges": [[0, half - 1, half // 2], [half, len(PAYLOAD) - 1, half]],
+                },
+                f,
+            )
+        downloader = RangedDownloader(connections=2, min_segment_size=1024)
+        downloader.download(self.base + "/ranged", self.dest)
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        self.assertIn((half // 2, half - 1), MediaHandler.range_requests)
+        self.assertIn((half, len(PAYLOAD) - 1), MediaHandler.range_requests)
+        self.assertFalse(os.path.exists(self.dest + ".ranges"))
+
+    def test_ignores_state_for_a_different_size(self):
+        with open(self.dest, "wb") as f:
+            f.truncate(10)
+        with open(self.dest + ".ranges", "w") as f:
+            json.dump({"total": 10, "ranges": [[0, 9, 5]]}, f)
+        downloader = RangedDownloader(connections=2, min_segment_size=1024)
+        downloader.download(self.base + "/ranged", self.dest)
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), PAYLOAD)
+
+    def test_falls_back_to_single_stream_without_range_support(self):
+        downloader = RangedDownloader(connections=4, min_segment_size=1024)
+        written = downloader.download(self.base + "/plain", self.dest)
+        self.assertEqual(written, len(PAYLOAD))
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), PAYLOAD)
+
+    def test_concurrent_downloads_of_one_key_share_the_file(self):
+        results = []
+
+        def download():
+            results.append(
+                download_direct_url(
+                    self.base + "/ranged", output_dir=self.tmp.name, resume_key="video|best"
+                )
+            )
+
+        threads = [threading.Thread(target=download) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(len(results), 3)
+        self.assertEqual({error for _, error in results}, {None})
+        paths = {path for path, _ in results}
+        self.assertEqual(len(paths), 1)
+        with open(paths.pop(), "rb") as f:
+            self.assertEqual(f.read(), PAYLOAD)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import json
+import threading
+import unittest
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from services.facebook_api import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_HALF_OPEN,
+    CIRCUIT_OPEN,
+    MAX_API_CLIENTS,
+    FacebookApiClient,
+    get_facebook_api_client,
+)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    requests = 0
+    # "ok", "miss" or "error"
+    mode = "ok"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        ApiHandler.requests += 1
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if ApiHandler.mode == "error":
+            status, body = 502, {"status": "error"}
+        elif ApiHandler.mode == "miss":
+            status, body = 200, {"status": "error", "message": "not found"}
+        else:
+            status, body = 200, {
+                "status": "success",
+                "download_url": f"http://cdn.test/{payload['quality']}.mp4",
+            }
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FacebookApiClientTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), ApiHandler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        ApiHandler.requests = 0
+        ApiHandler.mode = "ok"
+        self.clock = FakeClock()
+
+    def test_resolved_urls_are_cached_per_quality_until_ttl(self):
+        client = FacebookApiClient(self.base, url_ttl=60, clock=self.clock)
+        video = "https://www.facebook.com/watch?v=1"
+
+        self.assertEqual(client.resolve(video, "720p"), "http://cdn.test/720p.mp4")
+        self.assertEqual(client.resolve(video, "720p"), "http://cdn.test/720p.mp4")
+        self.assertEqual(client.resolve(video, "480p"), "http://cdn.test/480p.mp4")
+        self.assertEqual(ApiHandler.requests, 2)
+
+        self.clock.now += 61
+        client.resolve(video, "720p")
+        self.assertEqual(ApiHandler.requests, 3)
+        client.forget(video, "720p")
+        client.resolve(video, "720p")
+        self.assertEqual(ApiHandler.requests, 4)
+
+        stats = client.stats()
+        self.assertEqual(stats["ok"], 4)
+        self.assertEqual(stats["cached"], 1)
+        self.assertIsNotNone(stats["latency"]["mean"])
+
+    def test_unresolvable_videos_do_not_open_the_circuit(self):
+        ApiHandler.mode = "miss"
+        client = FacebookApiClient(self.base, failure_threshold=2, clock=self.clock)
+        for _ in range(3):
+            self.assertIsNone(client.resolve("https://fb.watch/x", "best"))
+        self.assertEqual(ApiHandler.requests, 3)
+        self.assertEqual(client.stats()["miss"], 3)
+        self.assertEqual(client.breaker.state, CIRCUIT_CLOSED)
+
+    def test_circuit_opens_after_failures_and_recovers_after_cooldown(self):
+        ApiHandler.mode = "error"
+        client = FacebookApiClient(
+            self.base, failure_threshold=2, cooldown=30, clock=self.clock
+        )
+        video = "https://www.facebook.com/watch?v=2"
+        client.resolve(video, "best")
+        client.resolve(video, "best")
+        self.assertEqual(client.breaker.state, CIRCUIT_OPEN)
+
+        self.assertIsNone(client.resolve(video, "best"))
+        self.assertEqual(ApiHandler.requests, 2)
+        self.assertEqual(client.stats()["skipped"], 1)
+
+        # Half-open: one trial; a failure opens the circuit again
+        self.clock.now += 31
+        self.assertEqual(client.breaker.state, CIRCUIT_HALF_OPEN)
+        client.resolve(video, "best")
+        self.assertEqual(ApiHandler.requests, 3)
+        self.assertEqual(client.breaker.state, CIRCUIT_OPEN)
+
+        ApiHandler.mode = "ok"
+        self.clock.now += 31
+        self.assertEqual(client.resolve(video, "best"), "http://cdn.test/best.mp4")
+        self.assertEqual(client.breaker.state, CIRCUIT_CLOSED)
+
+    def test_unreachable_api_fails_fast_and_counts_as_failure(self):
+        client = FacebookApiClient(
+            "http://127.0.0.1:9", connect_timeout=1, failure_threshold=1, clock=self.clock
+        )
+        self.assertIsNone(client.resolve("https://fb.watch/y", "best"))
+        stats = client.stats()
+        self.assertEqual(stats["failure"], 1)
+        self.assertEqual(stats["circuit"], CIRCUIT_OPEN)
+
+    def test_clients_per_base_url_are_bounded(self):
+        with mock.patch("services.facebook_api._clients", OrderedDict()) as clients:
+            first = get_facebook_api_client("http://api-0.test/")
+            self.assertIs(get_facebook_api_client("http://api-0.test"), first)
+            for index in range(1, MAX_API_CLIENTS + 5):
+                get_facebook_api_client(f"http://api-{index}.test")
+            self.assertEqual(len(clients), MAX_API_CLIENTS)
+            self.assertNotIn("http://api-0.test", clients)
+
+
+if __name__ == "__main__":
+    unittest.main()
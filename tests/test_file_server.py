@@ -0,0 +1,128 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from services import fileserver
+from services.api import StreamHandler, make_server
+from services.fileserver import parse_range, sign_file_token, verify_file_token
+
+
+class FileTokenTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(
+            os.environ,
+            {"VIDEO_DOWNLOADER_SECRET": "test-secret", "VIDEO_DOWNLOADER_DIR": self.tmp.name},
+        )
+        self.env.start()
+        fileserver._secret = None
+        self.path = os.path.join(self.tmp.name, "a.mp4")
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+        fileserver._secret = None
+
+    def test_roundtrip(self):
+        token = sign_file_token(self.path, "video.mp4")
+        self.assertEqual(
+            verify_file_token(token), {"path": self.path, "filename": "video.mp4"}
+        )
+
+    def test_tampered_and_expired_tokens_are_rejected(self):
+        token = sign_file_token(self.path)
+        payload, _, signature = token.partition(".")
+        forged = sign_file_token(os.path.join(self.tmp.name, "b.mp4")).partition(".")[0]
+        self.assertIsNone(verify_file_token(f"{forged}.{signature}"))
+        self.assertIsNone(verify_file_token("garbage"))
+        with mock.patch("services.fileserver.time.time", return_value=time.time() + 10**6):
+            self.assertIsNone(verify_file_token(token))
+
+    def test_files_outside_the_work_dir_are_never_granted(self):
+        self.assertIsNone(verify_file_token(sign_file_token("/etc/passwd")))
+        self.assertIsNone(verify_file_token(sign_file_token(self.tmp.name + "/../x.mp4")))
+
+    def test_generated_key_is_shared_and_never_empty(self):
+        with mock.patch.dict(os.environ, {"VIDEO_DOWNLOADER_SECRET": ""}):
+            fileserver._secret = None
+            key = fileserver._get_secret()
+            self.assertEqual(len(key), 64)
+            fileserver._secret = None
+            self.assertEqual(fileserver._get_secret(), key)
+            self.assertEqual(os.listdir(self.tmp.name), ["file_token.key"])
+
+            # A key file left empty is refused, never used to sign
+            with open(os.path.join(self.tmp.name, "file_token.key"), "w"):
+                pass
+            fileserver._secret = None
+            with self.assertRaises(RuntimeError):
+                fileserver._get_secret()
+
+    def test_parse_range(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertEqual(parse_range("bytes=10-19", 100), (10, 19))
+        self.assertEqual(parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=-5", 100), (95, 99))
+        self.assertEqual(parse_range("bytes=50-500", 100), (50, 99))
+        with self.assertRaises(ValueError):
+            parse_range("bytes=100-", 100)
+
+
+class StreamEndpointTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(
+            os.environ,
+            {"VIDEO_DOWNLOADER_SECRET": "test-secret", "VIDEO_DOWNLOADER_DIR": self.tmp.name},
+        )
+        self.env.start()
+        fileserver._secret = None
+        self.path = os.path.join(self.tmp.name, "clip.mp4")
+        with open(self.path, "wb") as f:
+            f.write(b"0123456789" * 100)
+        self.server = make_server("127.0.0.1", 0, StreamHandler)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+        self.env.stop()
+        fileserver._secret = None
+
+    def test_full_and_ranged_download(self):
+        url = f"{self.base}/stream/{sign_file_token(self.path, 'video.mp4')}"
+        with urlopen(url, timeout=5) as response:
+            self.assertEqual(response.status, 200)
+            self.assertEqual(len(response.read()), 1000)
+            self.assertIn("video.mp4", response.headers["Content-Disposition"])
+        with urlopen(Request(url, headers={"Range": "bytes=5-14"}), timeout=5) as response:
+            self.assertEqual(response.status, 206)
+            self.assertEqual(response.headers["Content-Range"], "bytes 5-14/1000")
+            self.assertEqual(response.read(), b"5678901234")
+
+    def test_files_outside_the_work_dir_are_forbidden(self):
+        with tempfile.NamedTemporaryFile(suffix=".mp4") as outside:
+            handler = mock.Mock(headers={}, command="GET")
+            fileserver.send_file(handler, outside.name)
+        handler.send_response.assert_called_once_with(403)
+
+    def test_invalid_token_is_forbidden(self):
+        with self.assertRaises(HTTPError) as ctx:
+            urlopen(f"{self.base}/stream/bad.token", timeout=5)
+        self.assertEqual(ctx.exception.code, 403)
+
+    def test_other_routes_are_not_exposed(self):
+        with self.assertRaises(HTTPError) as ctx:
+            urlopen(f"{self.base}/health", timeout=5)
+        self.assertEqual(ctx.exception.code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+from services.formats import (
+    PLAN_PROGRESSIVE,
+    PLAN_REMUX,
+    PLAN_TRANSCODE,
+    FormatPlan,
+    PlanStats,
+    plan_video_formats,
+)
+from services.metrics import registry
+
+
+def fmt(format_id, ext, height=None, vcodec="avc1", acodec="mp4a", tbr=None):
+    return {
+        "format_id": format_id,
+        "ext": ext,
+        "height": height,
+        "vcodec": vcodec,
+        "acodec": acodec,
+        "tbr": tbr,
+        "url": f"https://cdn.example/{format_id}",
+    }
+
+
+YOUTUBE_LIKE = {
+    "formats": [
+        fmt("18", "mp4", 360),
+        fmt("140", "m4a", vcodec="none", acodec="mp4a"),
+        fmt("251", "webm", vcodec="none", acodec="opus"),
+        fmt("136", "mp4", 720, acodec="none"),
+        fmt("137", "mp4", 1080, acodec="none"),
+        fmt("248", "webm", 1080, vcodec="vp9", acodec="none"),
+    ]
+}
+
+
+class FormatPlannerTests(unittest.TestCase):
+    def test_prefers_stream_copy_pair_over_lower_progressive(self):
+        plan = plan_video_formats(YOUTUBE_LIKE, "best")
+        self.assertEqual((plan.kind, plan.format_selector), (PLAN_REMUX, "137+140"))
+        self.assertEqual(plan.postprocessors, [])
+
+    def test_respects_height_cap(self):
+        plan = plan_video_formats(YOUTUBE_LIKE, "720p")
+        self.assertEqual(plan.format_selector, "136+140")
+
+    def test_progressive_when_it_is_as_good_as_any_pair(self):
+        plan = plan_video_formats(YOUTUBE_LIKE, "360p")
+        self.assertEqual((plan.kind, plan.format_selector), (PLAN_PROGRESSIVE, "18"))
+
+    def test_worst_picks_the_smallest_option(self):
+        plan = plan_video_formats(YOUTUBE_LIKE, "worst")
+        self.assertEqual(plan.format_selector, "18")
+
+    def test_transcode_only_without_mp4_compatible_streams(self):
+        info = {
+            "formats": [
+                fmt("1", "webm", 720, vcodec="vp9", acodec="none"),
+                fmt("2", "webm", vcodec="none", acodec="opus"),
+            ]
+        }
+        plan = plan_video_formats(info, "best")
+        self.assertEqual(plan.kind, PLAN_TRANSCODE)
+        self.assertEqual(plan.postprocessors[0]["key"], "FFmpegVideoConvertor")
+
+    def test_direct_link_with_unknown_codecs_is_progressive(self):
+        info = {"formats": [{"format_id": "mp4", "ext": "mp4", "url": "http://x/a.mp4"}]}
+        self.assertEqual(plan_video_formats(info).kind, PLAN_PROGRESSIVE)
+
+    def test_plans_are_exported_by_kind(self):
+        before = registry.value("video_downloader_format_plans_total", kind=PLAN_REMUX)
+        PlanStats().record(FormatPlan(PLAN_REMUX, "137+140", []), 2.0, 0.5)
+        self.assertEqual(
+            registry.value("video_downloader_format_plans_total", kind=PLAN_REMUX),
+            before + 1,
+        )
+        self.assertIsNotNone(
+            registry.histogram("video_downloader_format_plan_seconds", kind=PLAN_REMUX)
+        )
+        self.assertIn('kind="remux"', registry.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import unittest
+from unittest import mock
+
+from services.fragments import fragment_options, get_fragment_concurrency
+
+
+class FragmentConcurrencyTests(unittest.TestCase):
+    def test_platform_defaults(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(get_fragment_concurrency("youtube"), 4)
+            self.assertEqual(get_fragment_concurrency("facebook"), 8)
+            self.assertEqual(get_fragment_concurrency("vimeo"), 4)
+
+    def test_env_overrides(self):
+        env = {
+            "VIDEO_DOWNLOADER_FRAGMENT_CONCURRENCY": "6",
+            "VIDEO_DOWNLOADER_FRAGMENT_LIMITS": "facebook=16",
+        }
+        with mock.patch.dict(os.environ, env, clear=True):
+            self.assertEqual(get_fragment_concurrency("youtube"), 6)
+            self.assertEqual(get_fragment_concurrency("facebook"), 16)
+
+    def test_external_downloader_only_when_installed(self):
+        env = {"VIDEO_DOWNLOADER_EXTERNAL_DOWNLOADER": "auto"}
+        with mock.patch.dict(os.environ, env, clear=True):
+            with mock.patch("services.fragments.shutil.which", return_value=None):
+                opts = fragment_options("youtube")
+            self.assertEqual(opts, {"concurrent_fragment_downloads": 4})
+
+            with mock.patch(
+                "services.fragments.shutil.which", return_value="/usr/bin/aria2c"
+            ):
+                opts = fragment_options("youtube", concurrency=2)
+            self.assertEqual(opts["concurrent_fragment_downloads"], 2)
+            self.assertEqual(opts["external_downloader"], {"default": "aria2c"})
+            self.assertIn("aria2c", opts["external_downloader_args"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import time
+import unittest
+from unittest import mock
+
+from services.downloader import _load_info, canonical_video_key
+from services.infostore import InfoStore, format_urls_expire_at
+
+
+def info_with_urls(*urls):
+    return {"id": "abc", "formats": [{"format_id": str(i), "url": u} for i, u in enumerate(urls)]}
+
+
+class FormatExpiryTests(unittest.TestCase):
+    def test_reads_youtube_and_facebook_expiry(self):
+        info = info_with_urls(
+            "https://rr1.googlevideo.com/videoplayback?expire=2000000000&itag=22",
+            "https://video.fbcdn.net/v/t42.mp4?oe=6553F100&_nc_ht=x",
+            "https://example.com/no-expiry.mp4",
+        )
+        self.assertEqual(format_urls_expire_at(info), float(0x6553F100))
+
+    def test_none_when_urls_do_not_say(self):
+        self.assertIsNone(format_urls_expire_at(info_with_urls("https://example.com/a.mp4")))
+
+
+class InfoStoreTests(unittest.TestCase):
+    def test_roundtrip(self):
+        store = InfoStore()
+        info = info_with_urls("https://example.com/a.mp4")
+        handle = store.put(info, "generic:a")
+        self.assertIs(store.get(handle, "generic:a"), info)
+        self.assertIsNone(store.get(None, "generic:a"))
+        self.assertIsNone(store.get("unknown", "generic:a"))
+
+    def test_handles_only_serve_their_own_video(self):
+        store = InfoStore()
+        handle = store.put(info_with_urls("https://example.com/b.mp4"), "youtube:b")
+        self.assertIsNone(store.get(handle, "youtube:a"))
+        # Still there for the video it belongs to
+        self.assertIsNotNone(store.get(handle, "youtube:b"))
+
+    def test_expired_signed_urls_are_not_reused(self):
+        store = InfoStore()
+        soon = int(time.time()) + 30
+        handle = store.put(
+            info_with_urls(f"https://x.googlevideo.com/v?expire={soon}"), "youtube:abc"
+        )
+        self.assertIsNone(store.get(handle, "youtube:abc"))
+
+    def test_ttl_and_size_bound(self):
+        store = InfoStore(ttl=0.05, max_entries=2)
+        first = store.put(info_with_urls("https://example.com/1.mp4"), "k")
+        store.put(info_with_urls("https://example.com/2.mp4"), "k")
+        store.put(info_with_urls("https://example.com/3.mp4"), "k")
+        self.assertIsNone(store.get(first, "k"))
+        handle = store.put(info_with_urls("https://example.com/4.mp4"), "k")
+        time.sleep(0.1)
+        self.assertIsNone(store.get(handle, "k"))
+
+    def test_download_ignores_a_handle_of_another_video(self):
+        store = InfoStore()
+        other = "https://www.youtube.com/watch?v=bbb"
+        handle = store.put(
+            info_with_urls("https://example.com/b.mp4"), canonical_video_key(other)
+        )
+        with mock.patch("services.downloader.get_info_store", return_value=store), \
+                mock.patch("yt_dlp.YoutubeDL") as ydl:
+            ydl.return_value.__enter__.return_value.extract_info.return_value = {"id": "aaa"}
+            info, reused = _load_info("https://www.youtube.com/watch?v=aaa", handle, {})
+            self.assertEqual((info, reused), ({"id": "aaa"}, False))
+            info, reused = _load_info(other, handle, {})
+        self.assertTrue(reused)
+        self.assertEqual(info["id"], "abc")
+
+
+if __name__ == "__main__":
+    unittest.main()
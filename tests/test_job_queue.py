@@ -0,0 +1,133 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from conftest import wait_for
+from services.cancel import CancelToken
+from services.jobs import (
+    JOB_CANCELLED,
+    JOB_DONE,
+    JOB_ERROR,
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    JobQueue,
+    parse_platform_limits,
+)
+
+
+class JobQueueTests(unittest.TestCase):
+    def test_parse_platform_limits(self):
+        self.assertEqual(
+            parse_platform_limits("youtube=2, facebook=1,bad,x=y"),
+            {"youtube": 2, "facebook": 1},
+        )
+
+    def test_job_result_and_progress(self):
+        queue = JobQueue(workers=1)
+
+        def work(name, progress_hook):
+            progress_hook({"status": "downloading", "downloaded_bytes": 1})
+            return f"/tmp/{name}.mp4", None
+
+        job = wait_for(queue.submit(work, name="clip"))
+        self.assertEqual(job.status, JOB_DONE)
+        self.assertEqual(job.result, "/tmp/clip.mp4")
+        self.assertEqual(job.progress["downloaded_bytes"], 1)
+
+    def test_errors_and_exceptions_are_captured(self):
+        queue = JobQueue(workers=1)
+
+        def failing(progress_hook):
+            raise RuntimeError("boom")
+
+        job = wait_for(queue.submit(failing))
+        self.assertEqual((job.status, job.error), (JOB_ERROR, "boom"))
+        job = wait_for(queue.submit(lambda progress_hook: (None, "nope")))
+        self.assertEqual((job.status, job.error), (JOB_ERROR, "nope"))
+
+    def test_higher_priority_jobs_run_first(self):
+        queue = JobQueue(workers=1)
+        gate = threading.Event()
+        order = []
+
+        def work(name, progress_hook):
+            gate.wait(5)
+            order.append(name)
+            return name, None
+
+        blocker = queue.submit(work, name="blocker")
+        while blocker.started is None:
+            time.sleep(0.01)
+        low = queue.submit(work, name="low", priority=PRIORITY_BACKGROUND)
+        high = queue.submit(work, name="high", priority=PRIORITY_INTERACTIVE)
+        self.assertEqual(queue.position(high.id), 1)
+        gate.set()
+        wait_for(low)
+        wait_for(high)
+        self.assertEqual(order, ["blocker", "high", "low"])
+
+    def test_platform_limit_is_respected(self):
+        queue = JobQueue(workers=3, platform_limits={"youtube": 1})
+        lock = threading.Lock()
+        running = {"now": 0, "peak": 0}
+
+        def work(progress_hook):
+            with lock:
+                running["now"] += 1
+                running["peak"] = max(running["peak"], running["now"])
+            time.sleep(0.05)
+            with lock:
+                running["now"] -= 1
+            return "ok", None
+
+        jobs = [queue.submit(work, platform="youtube") for _ in range(3)]
+        for job in jobs:
+            wait_for(job)
+        self.assertEqual(running["peak"], 1)
+
+    def test_cancel_queued_and_running_jobs(self):
+        queue = JobQueue(workers=1)
+        started = threading.Event()
+        seen_tokens = []
+
+        def work(progress_hook, cancel_token):
+            seen_tokens.append(cancel_token)
+            started.set()
+            while True:
+                progress_hook({"status": "downloading", "downloaded_bytes": 1})
+                time.sleep(0.01)
+
+        running = queue.submit(work, cancel_token=CancelToken())
+        queued = queue.submit(work, cancel_token=CancelToken())
+        started.wait(5)
+        self.assertTrue(queue.cancel(queued.id))
+        self.assertEqual(queued.status, JOB_CANCELLED)
+        self.assertTrue(queue.cancel(running.id))
+        wait_for(running)
+        self.assertEqual(running.status, JOB_CANCELLED)
+        self.assertIsNone(running.result)
+        self.assertEqual(seen_tokens, [running.cancel_token])
+        self.assertTrue(running.cancel_token.cancelled)
+        self.assertFalse(queue.cancel(running.id))
+
+    def test_unpolled_jobs_are_cancelled_when_their_lease_expires(self):
+        with mock.patch("services.jobs.LEASE_CHECK_INTERVAL", 0.02):
+            queue = JobQueue(workers=1)
+
+        def work(progress_hook, cancel_token):
+            cancel_token.wait(5)
+            return None, "stopped"
+
+        kept = queue.submit(work, lease=0.2, cancel_token=CancelToken())
+        deadline = time.time() + 0.5
+        while time.time() < deadline:
+            kept.touch()
+            time.sleep(0.02)
+        self.assertFalse(kept.done)
+        wait_for(kept)
+        self.assertEqual(kept.status, JOB_CANCELLED)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from services.cancel import CancelToken
+from services.downloader import download_media, resume_interrupted_downloads
+from services.journal import DownloadJournal, collect_partial_files
+
+
+def dead_pid() -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+class DownloadJournalTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = DownloadJournal(os.path.join(self.tmp.name, "journal.sqlite3"))
+        self.params = {"url": "https://youtu.be/abc", "quality": "720p"}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _reassign(self, entry_id, pid, updated=None):
+        with self.journal._connect() as conn:
+            conn.execute(
+                "UPDATE journal SET pid = ?, updated = ? WHERE id = ?",
+                (pid, updated or time.time(), entry_id),
+            )
+
+    def test_finished_downloads_leave_no_entry(self):
+        entry_id = self.journal.begin(self.params)
+        self.assertEqual(len(self.journal), 1)
+        self.assertEqual(self.journal.orphaned(), [])
+        self.journal.finish(entry_id)
+        self.assertEqual(len(self.journal), 0)
+
+    def test_entries_of_dead_processes_are_orphaned_and_claimed_once(self):
+        entry_id = self.journal.begin(self.params)
+        self._reassign(entry_id, dead_pid())
+        orphans = self.journal.orphaned()
+        self.assertEqual([o["params"] for o in orphans], [self.params])
+        self.assertTrue(self.journal.claim(entry_id))
+        self.assertFalse(self.journal.claim(entry_id))
+        self.assertEqual(self.journal.orphaned(), [])
+
+    def test_live_process_entries_are_orphaned_only_when_stale(self):
+        entry_id = self.journal.begin(self.params)
+        self._reassign(entry_id, os.getppid())
+        self.assertEqual(self.journal.orphaned(), [])
+        self._reassign(entry_id, os.getppid(), updated=time.time() - 7 * 3600)
+        self.assertEqual(len(self.journal.orphaned()), 1)
+
+    def test_each_run_gets_its_own_entry(self):
+        first = self.journal.begin(self.params)
+        second = self.journal.begin(dict(reversed(list(self.params.items()))))
+        self.assertNotEqual(first, second)
+        self.journal.finish(first)
+        self.assertEqual(len(self.journal), 1)
+
+    def _updated(self, entry_id):
+        with self.journal._connect() as conn:
+            return conn.execute(
+                "SELECT updated FROM journal WHERE id = ?", (entry_id,)
+            ).fetchone()[0]
+
+    def test_progress_keeps_long_downloads_fresh(self):
+        seen = []
+
+        def fake_download(*args):
+            with self.journal._connect() as conn:
+                (entry_id,) = conn.execute("SELECT id FROM journal").fetchone()
+            self._reassign(entry_id, os.getpid(), updated=time.time() - 7 * 3600)
+            args[5]({"status": "downloading"})
+            seen.append(self._updated(entry_id))
+            return "/tmp/a.mp4", None
+
+        with mock.patch(
+            "services.downloader.get_download_journal", return_value=self.journal
+        ), mock.patch("services.downloader.JOURNAL_HEARTBEAT_INTERVAL", 0), mock.patch(
+            "services.downloader._download_media", side_effect=fake_download
+        ):
+            download_media("https://youtu.be/abc")
+        self.assertGreater(seen[0], time.time() - 60)
+        self.assertEqual(len(self.journal), 0)
+
+    def test_resumed_run_continues_the_claimed_entry(self):
+        entry_id = self.journal.begin(dict(self.params, audio_only=False))
+        self._reassign(entry_id, dead_pid())
+        queue = mock.Mock()
+        with mock.patch(
+            "services.downloader.get_download_journal", return_value=self.journal
+        ), mock.patch("services.downloader.get_job_queue", return_value=queue), \
+                mock.patch("services.downloader._resumed", False), \
+                mock.patch("services.downloader.collect_partial_files"):
+            resume_interrupted_downloads()
+        kwargs = queue.submit.call_args.kwargs
+        self.assertEqual(kwargs["journal_entry"], entry_id)
+        self.assertIsInstance(kwargs["cancel_token"], CancelToken)
+
+
+class CollectPartialFilesTests(unittest.TestCase):
+    def test_removes_only_old_partial_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            old = time.time() - 3600
+            paths = {}
+            for name in ("a.mp4.part", "a.mp4.part-Frag3", "a.mp4.ytdl", "b.mp4", "c.mp4.part"):
+                paths[name] = os.path.join(tmp, name)
+                with open(paths[name], "wb"):
+                    pass
+                if name != "c.mp4.part":
+                    os.utime(paths[name], (old, old))
+            removed = collect_partial_files(tmp, max_age=60)
+            self.assertEqual(
+                sorted(os.path.basename(p) for p in removed),
+                ["a.mp4.part", "a.mp4.part-Frag3", "a.mp4.ytdl"],
+            )
+            self.assertTrue(os.path.exists(paths["b.mp4"]))
+            self.assertTrue(os.path.exists(paths["c.mp4.part"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import time
+import unittest
+
+from services.cache import MetadataCache
+
+
+class MetadataCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "meta.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip_and_counters(self):
+        cache = MetadataCache(self.path)
+        self.assertIsNone(cache.get("youtube:abc"))
+        cache.put("youtube:abc", {"title": "Hello"})
+        self.assertEqual(cache.get("youtube:abc"), {"title": "Hello"})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_entries_expire_after_ttl(self):
+        cache = MetadataCache(self.path, ttl=0.05)
+        cache.put("youtube:abc", {"title": "Hello"})
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("youtube:abc"))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = MetadataCache(self.path, max_entries=2)
+        cache.put("a", {"n": 1})
+        time.sleep(0.01)
+        cache.put("b", {"n": 2})
+        time.sleep(0.01)
+        cache.get("a")
+        time.sleep(0.01)
+        cache.put("c", {"n": 3})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {"n": 1})
+
+    def test_cache_is_shared_between_instances(self):
+        MetadataCache(self.path).put("a", {"n": 1})
+        self.assertEqual(MetadataCache(self.path).get("a"), {"n": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import io
+import json
+import logging
+import os
+import unittest
+from unittest import mock
+
+from services import metrics
+from services.metrics import JobTrace, MetricsRegistry, registry
+
+
+class MetricsRegistryTests(unittest.TestCase):
+    def test_render_counters_and_histograms(self):
+        metrics = MetricsRegistry(buckets=(1, 5))
+        metrics.describe("jobs_total", "counter", "Jobs")
+        metrics.inc("jobs_total", outcome="ok")
+        metrics.inc("jobs_total", 2, outcome="ok")
+        metrics.observe("phase_seconds", 0.5, phase="extract")
+        metrics.observe("phase_seconds", 3, phase="extract")
+        metrics.observe("phase_seconds", 9, phase="extract")
+        metrics.gauge("queued", lambda: {(): 4})
+
+        text = metrics.render()
+        self.assertIn("# HELP jobs_total Jobs\n# TYPE jobs_total counter", text)
+        self.assertIn('jobs_total{outcome="ok"} 3\n', text)
+        self.assertIn('phase_seconds_bucket{phase="extract",le="1"} 1\n', text)
+        self.assertIn('phase_seconds_bucket{phase="extract",le="5"} 2\n', text)
+        self.assertIn('phase_seconds_bucket{phase="extract",le="+Inf"} 3\n', text)
+        self.assertIn('phase_seconds_sum{phase="extract"} 12.5\n', text)
+        self.assertIn('phase_seconds_count{phase="extract"} 3\n', text)
+        self.assertIn("# TYPE queued gauge\nqueued 4\n", text)
+
+    def test_label_values_are_escaped(self):
+        metrics = MetricsRegistry()
+        metrics.inc("c", label='a"b\\c')
+        self.assertIn('c{label="a\\"b\\\\c"} 1', metrics.render())
+
+
+class JobTraceTests(unittest.TestCase):
+    def test_spans_bytes_and_outcome_are_recorded(self):
+        labels = {"kind": "video", "platform": "test-trace", "quality": "720p"}
+        trace = JobTrace("video", "test-trace", "720p", "https://example.com/v")
+        with trace.span("extract"):
+            pass
+        trace.record("transfer", 2.0)
+        trace.record("transfer", 1.0)
+        trace.add_bytes(100)
+
+        with self.assertLogs("services.metrics", level="INFO") as logs, mock.patch.dict(
+            os.environ, {"VIDEO_DOWNLOADER_JOB_LOG": "1"}
+        ):
+            trace.finish("ok")
+            trace.finish("error")
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(line["outcome"], "ok")
+        self.assertEqual(line["phases"]["transfer"], 3.0)
+        self.assertEqual(line["bytes"], 100)
+        self.assertEqual(
+            registry.histogram("video_downloader_phase_seconds", phase="transfer", **labels),
+            {"count": 2, "sum": 3.0},
+        )
+        self.assertEqual(registry.value("video_downloader_bytes_total", **labels), 100)
+        self.assertEqual(
+            registry.value("video_downloader_downloads_total", outcome="ok", **labels), 1
+        )
+        self.assertEqual(
+            registry.value("video_downloader_downloads_total", outcome="error", **labels), 0
+        )
+
+    def test_job_log_is_printed_without_logging_configured(self):
+        stderr = io.StringIO()
+        with mock.patch.object(logging.getLogger(), "handlers", []), mock.patch(
+            "services.metrics._job_log_handler", None
+        ), mock.patch("sys.stderr", stderr), mock.patch.dict(
+            os.environ, {"VIDEO_DOWNLOADER_JOB_LOG": "1"}
+        ):
+            JobTrace("video", "test-log", "best", "https://example.com/v").finish("ok")
+            handler = metrics._job_log_handler
+        metrics.logger.removeHandler(handler)
+        self.assertEqual(json.loads(stderr.getvalue())["platform"], "test-log")
+
+
+if __name__ == "__main__":
+    unittest.main()
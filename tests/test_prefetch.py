@@ -0,0 +1,115 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from conftest import wait_for
+from services.bandwidth import get_bandwidth_scheduler
+from services.cancel import CancelToken
+from services.jobs import (
+    JOB_CANCELLED,
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    JobQueue,
+)
+from services.prefetch import Prefetcher, prefetch_key
+
+
+class PrefetcherTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = JobQueue(workers=2)
+        self.gate = threading.Event()
+
+    def tearDown(self):
+        self.gate.set()
+        self.tmp.cleanup()
+
+    def _work(self, name, progress_hook, cancel_token, size=100):
+        while not self.gate.wait(0.01):
+            progress_hook({"status": "downloading", "downloaded_bytes": 1})
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        return path, None
+
+    def _submit(self, name, **kwargs):
+        return lambda: self.queue.submit(
+            self._work,
+            priority=PRIORITY_BACKGROUND,
+            name=name,
+            cancel_token=CancelToken(),
+            **kwargs,
+        )
+
+    def test_key_ignores_argument_order(self):
+        self.assertEqual(
+            prefetch_key({"url": "u", "quality": "best"}),
+            prefetch_key({"quality": "best", "url": "u"}),
+        )
+
+    def test_owners_share_one_prefetch_cancelled_by_the_last(self):
+        prefetcher = Prefetcher(self.queue)
+        job = prefetcher.want("a", "session-1", self._submit("a.mp4"))
+        self.assertIs(prefetcher.want("a", "session-2", self._submit("a.mp4")), job)
+        prefetcher.release("a", "session-1")
+        self.assertFalse(job.cancel_token.cancelled)
+        prefetcher.release("a", "session-2")
+        self.assertEqual(wait_for(job).status, JOB_CANCELLED)
+        self.assertIsNone(prefetcher.claim("a"))
+
+    def test_active_and_disk_budgets(self):
+        prefetcher = Prefetcher(self.queue, max_active=1, disk_budget_bytes=100)
+        first = prefetcher.want("a", "s", self._submit("a.mp4"))
+        self.assertIsNone(prefetcher.want("b", "s", self._submit("b.mp4")))
+        self.gate.set()
+        wait_for(first)
+        # The 100 unclaimed bytes of "a" fill the disk budget
+        self.assertIsNone(prefetcher.want("b", "s", self._submit("b.mp4")))
+        self.assertIs(prefetcher.claim("a"), first)
+        self.assertIsNotNone(prefetcher.want("b", "s", self._submit("b.mp4")))
+        self.assertEqual(prefetcher.stats()["skipped"], 2)
+
+    def test_claim_promotes_a_queued_prefetch(self):
+        prefetcher = Prefetcher(self.queue, max_active=3)
+        blockers = [
+            prefetcher.want(name, "s", self._submit(name)) for name in ("x", "y")
+        ]
+        while any(job.started is None for job in blockers):
+            time.sleep(0.01)
+        job = prefetcher.want("a", "s", self._submit("a.mp4"))
+        self.queue.submit(self._work, name="other", cancel_token=CancelToken(),
+                          priority=PRIORITY_BACKGROUND)
+
+        claimed = prefetcher.claim("a", lease=30)
+        self.assertIs(claimed, job)
+        self.assertEqual((job.priority, job.lease), (PRIORITY_INTERACTIVE, 30))
+        self.assertEqual(self.queue.position(job.id), 1)
+        # No longer held to the prefetch bandwidth cap
+        self.assertTrue(
+            get_bandwidth_scheduler()._is_claimed(job.kwargs["cancel_token"])
+        )
+        self.assertIsNone(prefetcher.claim("a"))
+        self.gate.set()
+        self.assertTrue(os.path.exists(wait_for(job).result))
+
+    def test_prefetch_of_a_closed_page_is_cancelled(self):
+        with mock.patch("services.jobs.LEASE_CHECK_INTERVAL", 0.02):
+            queue = JobQueue(workers=2)
+            prefetcher = Prefetcher(queue, lease=0.2)
+            self.queue = queue
+            kept = prefetcher.want("a", "s", self._submit("a.mp4"))
+            dropped = prefetcher.want("b", "s", self._submit("b.mp4"))
+            self.assertEqual((kept.lease, dropped.lease), (0.2, 0.2))
+            deadline = time.time() + 1
+            while time.time() < deadline:
+                prefetcher.touch("a")
+                time.sleep(0.05)
+        self.assertEqual(wait_for(dropped).status, JOB_CANCELLED)
+        self.assertFalse(kept.done)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from services.progress import ProgressChannel, format_eta, format_speed
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def downloading(done, total=1000):
+    return {"status": "downloading", "downloaded_bytes": done, "total_bytes": total}
+
+
+class ProgressChannelTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.channel = ProgressChannel(interval=1.0, clock=self.clock)
+
+    def test_snapshot_reports_speed_and_eta(self):
+        self.assertIsNone(self.channel.snapshot())
+        self.channel.publish(downloading(0))
+        self.clock.now = 1.0
+        self.channel.publish(downloading(100))
+        snapshot = self.channel.snapshot()
+        self.assertEqual(snapshot["fraction"], 0.1)
+        self.assertEqual(snapshot["speed"], 100)
+        self.assertEqual(snapshot["eta"], 9)
+
+    def test_subscribers_are_rate_limited(self):
+        seen = []
+        self.channel.subscribe(seen.append)
+        for i in range(50):
+            self.clock.now = i * 0.1
+            self.channel.publish(downloading(i * 10))
+        # First event (status change) plus one per second of the 4.9s run
+        self.assertEqual(len(seen), 5)
+        self.channel.publish({"status": "finished", "filename": "out.mp4"})
+        self.assertEqual(seen[-1]["status"], "finished")
+        self.assertEqual(seen[-1]["fraction"], 1.0)
+
+    def test_speed_restarts_for_next_file(self):
+        self.channel.publish(downloading(0))
+        self.clock.now = 1.0
+        self.channel.publish(downloading(800))
+        self.clock.now = 1.2
+        self.channel.publish(downloading(10, total=200))
+        snapshot = self.channel.snapshot()
+        self.assertEqual(snapshot["downloaded_bytes"], 10)
+        self.assertEqual(snapshot["speed"], 800)
+
+    def test_failing_subscriber_is_ignored(self):
+        self.channel.subscribe(lambda snapshot: 1 / 0)
+        self.channel.publish(downloading(1))
+        self.assertEqual(self.channel.snapshot()["downloaded_bytes"], 1)
+
+    def test_formatting(self):
+        self.assertEqual(format_speed(512), "512 B/s")
+        self.assertEqual(format_speed(3.5 * 1024 * 1024), "3.5 MB/s")
+        self.assertEqual(format_speed(None), "")
+        self.assertEqual(format_eta(75), "1:15")
+        self.assertEqual(format_eta(3725), "1:02:05")
+
+
+if __name__ == "__main__":
+    unittest.main()
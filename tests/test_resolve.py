@@ -0,0 +1,104 @@
+import threading
+import time
+import unittest
+
+from services.cancel import CancelToken
+from services.resolve import (
+    POLICY_HEDGED,
+    POLICY_RACE,
+    POLICY_SEQUENTIAL,
+    Backend,
+    Resolver,
+    parse_policies,
+)
+
+
+def backend(name, value, delay=0.0, calls=None, cancelled=None):
+    def resolve(token):
+        if calls is not None:
+            calls.append(name)
+        if token.wait(delay):
+            if cancelled is not None:
+                cancelled.append(name)
+            return None
+        return value
+
+    return Backend(name, resolve)
+
+
+class ResolverTests(unittest.TestCase):
+    def test_sequential_tries_the_next_backend_only_after_a_failure(self):
+        resolver = Resolver({"facebook": POLICY_SEQUENTIAL})
+        calls = []
+        winner, value = resolver.resolve(
+            "facebook",
+            [backend("api", None, 0.05, calls), backend("ytdlp", "handle", 0, calls)],
+        )
+        self.assertEqual((winner, value), ("ytdlp", "handle"))
+        self.assertEqual(calls, ["api", "ytdlp"])
+        self.assertEqual(
+            resolver.stats()["facebook"],
+            {"api": {"wins": 0, "failures": 1}, "ytdlp": {"wins": 1, "failures": 0}},
+        )
+
+    def test_hedged_starts_the_next_backend_after_the_delay_and_cancels_the_loser(self):
+        resolver = Resolver({"facebook": POLICY_HEDGED}, hedge_delay=0.05)
+        cancelled = []
+        started = time.monotonic()
+        winner, value = resolver.resolve(
+            "facebook",
+            [
+                backend("api", "url", 5.0, cancelled=cancelled),
+                backend("ytdlp", "handle", 0.05),
+            ],
+        )
+        self.assertEqual((winner, value), ("ytdlp", "handle"))
+        self.assertLess(time.monotonic() - started, 1.0)
+        time.sleep(0.05)
+        self.assertEqual(cancelled, ["api"])
+
+    def test_hedge_is_not_started_when_the_first_backend_is_fast(self):
+        resolver = Resolver({"facebook": POLICY_HEDGED}, hedge_delay=0.5)
+        calls = []
+        winner, _ = resolver.resolve(
+            "facebook",
+            [backend("api", "url", 0, calls), backend("ytdlp", "handle", 0, calls)],
+        )
+        self.assertEqual(winner, "api")
+        self.assertEqual(calls, ["api"])
+
+    def test_race_returns_the_fastest_and_none_when_all_fail(self):
+        resolver = Resolver({"facebook": POLICY_RACE})
+        winner, _ = resolver.resolve(
+            "facebook", [backend("api", "url", 0.3), backend("ytdlp", "handle", 0)]
+        )
+        self.assertEqual(winner, "ytdlp")
+
+        def broken(token):
+            raise RuntimeError("boom")
+
+        self.assertEqual(
+            resolver.resolve("facebook", [Backend("api", broken), backend("ytdlp", None)]),
+            (None, None),
+        )
+        self.assertEqual(resolver.stats()["facebook"]["none"]["wins"], 1)
+
+    def test_cancelling_returns_at_once(self):
+        resolver = Resolver({"facebook": POLICY_SEQUENTIAL})
+        token = CancelToken()
+        threading.Timer(0.05, token.cancel).start()
+        started = time.monotonic()
+        result = resolver.resolve("facebook", [backend("api", "url", 5.0)], token)
+        self.assertEqual(result, (None, None))
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_parse_policies_ignores_unknown_values(self):
+        self.assertEqual(
+            parse_policies("facebook=race, youtube=HEDGED,generic=fastest,=race"),
+            {"facebook": "race", "youtube": "hedged"},
+        )
+        self.assertEqual(Resolver({}).policy_for("facebook"), POLICY_SEQUENTIAL)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from services.downloader import download_audio, download_with_ytdlp
+from services.metrics import registry
+from services.results import ResultStore, result_key
+
+
+class ResultStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = os.path.join(self.tmp.name, "results.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _make_file(self, name, size):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        return path
+
+    def test_key_depends_on_format_and_postprocessing(self):
+        base = result_key("youtube:abc", "video", "best", ["mp4"])
+        self.assertEqual(base, result_key("youtube:abc", "video", "best", ["mp4"]))
+        self.assertNotEqual(base, result_key("youtube:abc", "video", "720p", ["mp4"]))
+        self.assertNotEqual(base, result_key("youtube:abc", "video", "best", ["mkv"]))
+
+    def test_hit_and_miss_are_counted(self):
+        name = "video_downloader_result_cache_total"
+        hits, misses = registry.value(name, outcome="hit"), registry.value(name, outcome="miss")
+        store = ResultStore(self.index)
+        path = self._make_file("a.mp4", 10)
+        self.assertIsNone(store.lookup("k1"))
+        store.add("k1", "youtube:a", path)
+        self.assertEqual(store.lookup("k1"), path)
+        stats = store.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["bytes"], 10)
+        self.assertEqual(
+            (registry.value(name, outcome="hit"), registry.value(name, outcome="miss")),
+            (hits + 1, misses + 1),
+        )
+
+    def test_missing_file_is_a_miss(self):
+        store = ResultStore(self.index)
+        path = self._make_file("a.mp4", 10)
+        store.add("k1", "youtube:a", path)
+        os.remove(path)
+        self.assertIsNone(store.lookup("k1"))
+        self.assertEqual(store.stats()["entries"], 0)
+
+    def test_least_recently_used_files_are_deleted_over_budget(self):
+        store = ResultStore(self.index, budget_bytes=25)
+        old = self._make_file("old.mp4", 10)
+        store.add("old", "youtube:old", old)
+        time.sleep(0.01)
+        mid = self._make_file("mid.mp4", 10)
+        store.add("mid", "youtube:mid", mid)
+        time.sleep(0.01)
+        store.lookup("old")
+        time.sleep(0.01)
+        new = self._make_file("new.mp4", 10)
+        store.add("new", "youtube:new", new)
+        self.assertFalse(os.path.exists(mid))
+        self.assertTrue(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+        self.assertEqual(store.stats()["evictions"], 1)
+
+    def test_expired_entries_are_evicted(self):
+        store = ResultStore(self.index, max_age=0.05)
+        path = self._make_file("a.mp4", 10)
+        store.add("k1", "youtube:a", path)
+        time.sleep(0.1)
+        self.assertEqual(store.evict(), 1)
+        self.assertFalse(os.path.exists(path))
+
+
+class OutputPathTests(unittest.TestCase):
+    def test_each_result_key_gets_its_own_file(self):
+        templates = []
+
+        def fake_download(url, info_handle, ydl_opts, *args):
+            templates.append(ydl_opts["outtmpl"])
+            return None, None
+
+        url = "https://www.youtube.com/watch?v=abc"
+        with mock.patch("services.downloader._download_planned", side_effect=fake_download):
+            for quality in ("worst", "720p", "best", "best"):
+                download_with_ytdlp(url, quality, "/tmp", use_cache=False)
+            for mode in ("mp3", "fast"):
+                download_audio(url, "/tmp", use_cache=False, mode=mode)
+        self.assertEqual(len(set(templates)), 5)
+        self.assertEqual(templates[2], templates[3])
+
+
+if __name__ == "__main__":
+    unittest.main()
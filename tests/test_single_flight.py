@@ -0,0 +1,158 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from services.cancel import CancelToken, DownloadCancelled
+from services.singleflight import SingleFlight
+from services.state import FileLeases
+
+
+class SingleFlightTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.group = SingleFlight(lock_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_concurrent_callers_share_one_run(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def work(hook, cancel_token):
+            calls.append(1)
+            started.set()
+            hook({"status": "downloading", "downloaded_bytes": 5})
+            release.wait(5)
+            return "result.mp4", None
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(self.group.do("k", work))
+        )
+        leader.start()
+        started.wait(5)
+
+        follower_events = []
+        follower = threading.Thread(
+            target=lambda: results.append(
+                self.group.do("k", work, follower_events.append)
+            )
+        )
+        follower.start()
+        while not follower_events:
+            time.sleep(0.01)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [("result.mp4", None)] * 2)
+        self.assertEqual(follower_events[0]["downloaded_bytes"], 5)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_leader_errors_reach_followers(self):
+        def work(hook, cancel_token):
+            time.sleep(0.1)
+            raise RuntimeError("boom")
+
+        errors = []
+
+        def call():
+            try:
+                self.group.do("k", work)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=call) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(errors, ["boom", "boom"])
+
+    def test_stale_lock_files_are_taken_over(self):
+        group = SingleFlight(lock_dir=self.tmp.name, stale_after=0.05)
+        lock_path = FileLeases(self.tmp.name).path_for("k")
+        lock_path.write_text("12345 0\n")
+        old = time.time() - 10
+        os.utime(lock_path, (old, old))
+        self.assertEqual(group.do("k", lambda hook, cancel_token: "done"), "done")
+
+    def test_run_is_cancelled_only_when_every_caller_cancels(self):
+        started = threading.Event()
+        outcome = []
+
+        def work(hook, cancel_token):
+            started.set()
+            while not cancel_token.wait(0.01):
+                hook({"status": "downloading"})
+            try:
+                hook({"status": "downloading"})
+            except DownloadCancelled:
+                outcome.append("cancelled")
+            return None, "cancelled"
+
+        first, second = CancelToken(), CancelToken()
+        errors = []
+
+        def call(token):
+            try:
+                self.group.do("k", work, None, token)
+            except DownloadCancelled:
+                errors.append(token)
+
+        threads = [threading.Thread(target=call, args=(t,)) for t in (first, second)]
+        threads[0].start()
+        started.wait(5)
+        threads[1].start()
+        time.sleep(0.05)
+        second.cancel()
+        threads[1].join(5)
+        self.assertEqual(errors, [second])
+        self.assertEqual(outcome, [])
+        first.cancel()
+        threads[0].join(5)
+        self.assertEqual(outcome, ["cancelled"])
+
+    def test_new_caller_does_not_join_an_abandoned_run(self):
+        started, stopping = threading.Event(), threading.Event()
+        finish = threading.Event()
+
+        def abandoned(hook, cancel_token):
+            started.set()
+            cancel_token.wait(5)
+            stopping.set()
+            # e.g. waiting for ffmpeg to exit
+            finish.wait(5)
+            return None, "cancelled"
+
+        token = CancelToken()
+        leader = threading.Thread(target=self.group.do, args=("k", abandoned, None, token))
+        leader.start()
+        started.wait(5)
+        token.cancel()
+        stopping.wait(5)
+
+        results = []
+        caller = threading.Thread(
+            target=lambda: results.append(
+                self.group.do("k", lambda hook, cancel_token: ("new.mp4", None))
+            )
+        )
+        caller.start()
+        time.sleep(0.1)
+        # The new run waits for the old one's lease instead of sharing its outcome
+        self.assertEqual(results, [])
+        finish.set()
+        leader.join(5)
+        caller.join(5)
+        self.assertEqual(results, [("new.mp4", None)])
+        self.assertFalse(self.group.in_flight("k"))
+
+
+if __name__ == "__main__":
+    unittest.main()
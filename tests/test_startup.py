@@ -0,0 +1,20 @@
+import subprocess
+import sys
+import unittest
+
+
+class LazyImportTests(unittest.TestCase):
+    def test_app_modules_do_not_import_yt_dlp_or_requests(self):
+        code = (
+            "import sys\n"
+            "import services.api, services.batch, services.cli, services.downloader\n"
+            "print(sorted(m for m in ('yt_dlp', 'requests') if m in sys.modules))\n"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual(output.strip(), "[]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from conftest import wait_for
+from services.cancel import CancelToken
+from services.jobs import JOB_CANCELLED, JOB_DONE, JobQueue
+from services.results import ResultStore
+from services.state import FileLeases, SQLiteStateBackend, StateBackend, _journal_mode
+
+
+class StateBackendTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # Two replicas sharing one state directory
+        self.first = SQLiteStateBackend(self.tmp.name)
+        self.second = SQLiteStateBackend(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_jobs_are_visible_to_other_replicas(self):
+        queue = JobQueue(workers=1, backend=self.first)
+        other = JobQueue(workers=1, backend=self.second)
+
+        job = wait_for(queue.submit(lambda progress_hook: ("/tmp/clip.mp4", None)))
+        self.assertEqual(job.status, JOB_DONE)
+        deadline = time.time() + 2
+        while time.time() < deadline:
+            record = other.lookup(job.id)
+            if record and record["status"] == JOB_DONE:
+                break
+            time.sleep(0.01)
+        self.assertEqual(record["result"], "/tmp/clip.mp4")
+        self.assertIsNone(other.lookup("unknown"))
+        # Finished jobs cannot be cancelled from anywhere
+        self.assertFalse(other.request_cancel(job.id))
+
+    def test_cancel_requested_through_another_replica(self):
+        with mock.patch("services.jobs.LEASE_CHECK_INTERVAL", 0.02):
+            queue = JobQueue(workers=1, backend=self.first)
+            other = JobQueue(workers=1, backend=self.second)
+
+            def work(progress_hook, cancel_token):
+                cancel_token.wait(5)
+                return None, "stopped"
+
+            job = queue.submit(work, cancel_token=CancelToken())
+            self.assertTrue(other.request_cancel(job.id))
+            wait_for(job)
+        self.assertEqual(job.status, JOB_CANCELLED)
+
+    def test_indexes_are_shared(self):
+        path = os.path.join(self.tmp.name, "clip.mp4")
+        with open(path, "wb") as f:
+            f.write(b"data")
+        ResultStore(backend=self.first).add("key", "video", path)
+        self.assertEqual(ResultStore(backend=self.second).lookup("key"), path)
+
+    def test_leases_are_exclusive_until_stale(self):
+        leases = FileLeases(os.path.join(self.tmp.name, "locks"))
+        self.assertTrue(self.first.acquire_lease("video", ttl=60))
+        self.assertFalse(self.second.acquire_lease("video", ttl=60))
+        self.first.release_lease("video")
+        self.assertTrue(self.second.acquire_lease("video", ttl=60))
+
+        # A holder that stopped renewing loses the lease
+        old = time.time() - 120
+        os.utime(leases.path_for("video"), (old, old))
+        self.assertTrue(self.first.acquire_lease("video", ttl=60))
+
+    def test_concurrent_takeovers_of_a_stale_lease_have_one_winner(self):
+        directory = os.path.join(self.tmp.name, "locks")
+        for _ in range(30):
+            holders = [FileLeases(directory) for _ in range(4)]
+            self.assertTrue(holders[0].acquire_lease("video", ttl=60))
+            old = time.time() - 120
+            os.utime(holders[0].path_for("video"), (old, old))
+
+            barrier = threading.Barrier(3)
+            won = []
+
+            def take(leases):
+                barrier.wait()
+                if leases.acquire_lease("video", ttl=60):
+                    won.append(leases)
+
+            threads = [threading.Thread(target=take, args=(h,)) for h in holders[1:]]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(5)
+            self.assertEqual(len(won), 1)
+            self.assertTrue(os.path.exists(holders[0].path_for("video")))
+            won[0].release_lease("video")
+
+    def test_expired_holder_cannot_touch_its_successors_lease(self):
+        directory = os.path.join(self.tmp.name, "locks")
+        old_holder, successor = FileLeases(directory), FileLeases(directory)
+        self.assertTrue(old_holder.acquire_lease("video", ttl=60))
+        path = old_holder.path_for("video")
+        old = time.time() - 120
+        os.utime(path, (old, old))
+        self.assertTrue(successor.acquire_lease("video", ttl=60))
+
+        os.utime(path, (old + 1, old + 1))
+        old_holder.renew_lease("video")
+        self.assertLess(os.stat(path).st_mtime, time.time() - 60)
+        old_holder.release_lease("video")
+        self.assertTrue(path.exists())
+        successor.release_lease("video")
+        self.assertFalse(path.exists())
+
+    def test_backends_must_implement_every_operation(self):
+        class Partial(StateBackend):
+            def database(self, name):
+                return name
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+    def test_journal_mode_is_validated(self):
+        self.assertEqual(_journal_mode("delete"), "DELETE")
+        self.assertEqual(_journal_mode("WAL; DROP TABLE jobs"), "WAL")
+
+
+if __name__ == "__main__":
+    unittest.main()
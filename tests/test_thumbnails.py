@@ -0,0 +1,83 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+from services.thumbnails import ThumbnailCache
+
+
+def make_png(width, height):
+    out = io.BytesIO()
+    Image.new("RGBA", (width, height), (200, 30, 30, 255)).save(out, "PNG")
+    return out.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    requests = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        ImageHandler.requests += 1
+        body = make_png(1280, 720) if self.path.startswith("/thumb") else b"not an image"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ThumbnailCacheTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        ImageHandler.requests = 0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fetches_once_and_downsizes(self):
+        cache = ThumbnailCache(self.tmp.name, width=320)
+        path = cache.get("youtube:abc", f"{self.base}/thumb/abc.png")
+        self.assertEqual(cache.get("youtube:abc", f"{self.base}/thumb/abc.png"), path)
+        self.assertEqual(ImageHandler.requests, 1)
+        with Image.open(path) as image:
+            self.assertEqual((image.format, image.size), ("JPEG", (320, 180)))
+
+    def test_least_recently_used_are_evicted_over_budget(self):
+        cache = ThumbnailCache(self.tmp.name, width=320)
+        first = cache.get("youtube:a", f"{self.base}/thumb/a.png")
+        cache.budget_bytes = os.path.getsize(first) * 2
+        second = cache.get("youtube:b", f"{self.base}/thumb/b.png")
+        os.utime(first, (1, 1))
+        os.utime(second, (2, 2))
+        third = cache.get("youtube:c", f"{self.base}/thumb/c.png")
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(second))
+        self.assertTrue(os.path.exists(third))
+
+    def test_undecodable_image_is_not_cached(self):
+        cache = ThumbnailCache(self.tmp.name)
+        self.assertIsNone(cache.get("youtube:x", f"{self.base}/broken"))
+        self.assertEqual(cache.stats()["entries"], 0)
+        # Not retried on every rerun
+        self.assertIsNone(cache.get("youtube:x", f"{self.base}/broken"))
+        self.assertEqual(ImageHandler.requests, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
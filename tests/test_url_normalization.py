@@ -1,6 +1,6 @@
 import unittest
 
-from services.downloader import normalize_video_url
+from services.downloader import canonical_video_key, normalize_video_url
 
 
 class NormalizeVideoUrlTests(unittest.TestCase):
@@ -37,5 +37,34 @@ class NormalizeVideoUrlTests(unittest.TestCase):
         self.assertEqual(normalize_video_url(url), url)
 
 
+class CanonicalVideoKeyTests(unittest.TestCase):
+    def test_youtube_spellings_share_a_key(self):
+        urls = [
+            "https://www.youtube.com/watch?v=abc123&feature=share",
+            "https://youtu.be/abc123?t=45",
+            "https://www.youtube.com/shorts/abc123",
+        ]
+        self.assertEqual({canonical_video_key(u) for u in urls}, {"youtube:abc123"})
+
+    def test_playlist_is_part_of_the_key(self):
+        url = "https://www.youtube.com/watch?v=abc123&list=PL42&index=3"
+        self.assertEqual(canonical_video_key(url), "youtube:abc123:list=PL42")
+
+    def test_facebook_ids(self):
+        self.assertEqual(
+            canonical_video_key("https://www.facebook.com/watch/?v=123456"),
+            "facebook:123456",
+        )
+        self.assertEqual(
+            canonical_video_key("https://www.facebook.com/reel/987654"),
+            "facebook:987654",
+        )
+
+    def test_unknown_urls_fall_back_to_hash(self):
+        key = canonical_video_key("https://example.com/media/clip.mp4")
+        self.assertTrue(key.startswith("generic:url-"))
+        self.assertEqual(key, canonical_video_key("https://example.com/media/clip.mp4"))
+
+
 if __name__ == "__main__":
     unittest.main()